@@ -0,0 +1,33 @@
+"""Fulltext search
+
+Revision ID: 5b9e2c4d7a10
+Revises: dac0ba41d317
+Create Date: 2026-10-18 17:10:32.418205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b9e2c4d7a10'
+down_revision: Union[str, None] = 'dac0ba41d317'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ft_cms_post_title', 'cms_post', ['title'], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+    op.create_index('ft_cms_post_keywords', 'cms_post', ['keywords'], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+    op.create_index('ft_user_account_nickname', 'user_account', ['nickname'], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+    op.create_index('ft_user_account_phone', 'user_account', ['phone'], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+    op.create_index('ft_user_account_email', 'user_account', ['email'], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+
+
+def downgrade() -> None:
+    op.drop_index('ft_user_account_email', table_name='user_account')
+    op.drop_index('ft_user_account_phone', table_name='user_account')
+    op.drop_index('ft_user_account_nickname', table_name='user_account')
+    op.drop_index('ft_cms_post_keywords', table_name='cms_post')
+    op.drop_index('ft_cms_post_title', table_name='cms_post')
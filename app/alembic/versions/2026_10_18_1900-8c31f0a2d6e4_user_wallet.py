@@ -0,0 +1,47 @@
+"""User wallet
+
+Revision ID: 8c31f0a2d6e4
+Revises: 5b9e2c4d7a10
+Create Date: 2026-10-18 19:00:08.731952
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c31f0a2d6e4'
+down_revision: Union[str, None] = '5b9e2c4d7a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_wallet',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False, comment='用户ID'),
+    sa.Column('balance', sa.DECIMAL(precision=10, scale=4), server_default='0', nullable=False, comment='余额'),
+    sa.Column('balance_gift', sa.DECIMAL(precision=10, scale=4), server_default='0', nullable=False, comment='赠送余额'),
+    sa.Column('point', sa.Integer(), server_default='0', nullable=False, comment='积分'),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True, comment='创建时间'),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'), nullable=True, comment='更新时间'),
+    sa.PrimaryKeyConstraint('user_id'),
+    comment='用户钱包',
+    mariadb_engine='InnoDB',
+    mysql_charset='utf8mb4',
+    mysql_collate='utf8mb4_unicode_ci',
+    mysql_engine='InnoDB'
+    )
+    # 以各流水表最后一条记录的 balance 初始化钱包
+    for table, field in (('user_balance', 'balance'), ('user_balance_gift', 'balance_gift'), ('user_point', 'point')):
+        op.execute(f'''
+            INSERT INTO user_wallet (user_id, {field})
+            SELECT t.user_id, t.balance FROM {table} t
+            INNER JOIN (SELECT user_id, MAX(id) AS id FROM {table} GROUP BY user_id) last ON t.id = last.id
+            ON DUPLICATE KEY UPDATE {field} = VALUES({field})
+        ''')
+
+
+def downgrade() -> None:
+    op.drop_table('user_wallet')
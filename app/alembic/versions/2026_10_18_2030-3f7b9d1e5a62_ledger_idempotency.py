@@ -0,0 +1,45 @@
+"""Ledger idempotency
+
+Revision ID: 3f7b9d1e5a62
+Revises: 8c31f0a2d6e4
+Create Date: 2026-10-18 20:30:12.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f7b9d1e5a62'
+down_revision: Union[str, None] = '8c31f0a2d6e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 与 app.tasks.finance.IDEMPOTENT_TYPES 保持一致
+IDEMPOTENT_TYPES = {
+    'user_balance': (1, -1),
+    'user_balance_gift': (2, -1),
+    'user_point': (1, 2, 3),
+}
+
+
+def upgrade() -> None:
+    for table, types in IDEMPOTENT_TYPES.items():
+        op.add_column(table, sa.Column('idempotent_id', sa.Integer(), nullable=True, comment='幂等关联ID'))
+        # 历史数据中重复入账的动账只保留最早一条的幂等关联ID, 其余为 NULL, 避免创建唯一键失败
+        op.execute(f'''
+            UPDATE {table} t
+            INNER JOIN (SELECT MIN(id) AS id FROM {table}
+                        WHERE type IN ({', '.join(str(value) for value in types)})
+                        GROUP BY user_id, type, related_id) first ON t.id = first.id
+            SET t.idempotent_id = t.related_id
+        ''')
+        op.create_index(f'uk_{table}_idempotent', table, ['user_id', 'type', 'idempotent_id'], unique=True)
+
+
+def downgrade() -> None:
+    for table in IDEMPOTENT_TYPES:
+        op.drop_index(f'uk_{table}_idempotent', table_name=table)
+        op.drop_column(table, 'idempotent_id')
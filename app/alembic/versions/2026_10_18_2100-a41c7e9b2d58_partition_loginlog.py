@@ -0,0 +1,51 @@
+"""Partition loginlog by month
+
+Revision ID: a41c7e9b2d58
+Revises: 3f7b9d1e5a62
+Create Date: 2026-10-18 21:00:41.507316
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41c7e9b2d58'
+down_revision: Union[str, None] = '3f7b9d1e5a62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 与 app.services.archive.PARTITIONS_AHEAD 保持一致
+PARTITIONS_AHEAD = 3
+
+
+def month_start(value: datetime, months: int = 0) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    # 分区键必须包含在主键中, 主键改为 (id, created_at)
+    op.execute('UPDATE user_loginlog SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL')
+    op.execute("ALTER TABLE user_loginlog MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP "
+               "COMMENT '创建时间', DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)")
+
+    # 从最早的数据所在月份到未来 PARTITIONS_AHEAD 个月, 每月一个分区, 之后的分区由归档任务创建
+    first = op.get_bind().execute(sa.text('SELECT MIN(created_at) FROM user_loginlog')).scalar()
+    now = datetime.now()
+    month = month_start(first or now)
+    definitions = []
+    while month <= month_start(now, PARTITIONS_AHEAD):
+        definitions.append(f"PARTITION p{month:%Y%m} VALUES LESS THAN (UNIX_TIMESTAMP('{month_start(month, 1)}'))")
+        month = month_start(month, 1)
+    definitions.append('PARTITION pmax VALUES LESS THAN MAXVALUE')
+    op.execute(f'ALTER TABLE user_loginlog PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) ({", ".join(definitions)})')
+
+
+def downgrade() -> None:
+    op.execute('ALTER TABLE user_loginlog REMOVE PARTITIONING')
+    op.execute("ALTER TABLE user_loginlog DROP PRIMARY KEY, ADD PRIMARY KEY (id), "
+               "MODIFY created_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间'")
@@ -0,0 +1,54 @@
+"""Finance rollup
+
+Revision ID: 6d2e8f4a1c93
+Revises: a41c7e9b2d58
+Create Date: 2026-10-18 21:40:27.164820
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2e8f4a1c93'
+down_revision: Union[str, None] = 'a41c7e9b2d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('finance_rollup',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False, comment='ID'),
+    sa.Column('source', sa.String(length=32), nullable=False, comment='数据来源: balance_recharge/point_recharge/balance/point'),
+    sa.Column('granularity', sa.String(length=8), nullable=False, comment='统计粒度: hour/day'),
+    sa.Column('bucket', sa.TIMESTAMP(), nullable=False, comment='时段开始时间'),
+    sa.Column('type', sa.SmallInteger(), server_default='0', nullable=False, comment='动账类型, 充值订单为0'),
+    sa.Column('payment_channel', sa.String(length=50), server_default='', nullable=False, comment='支付渠道, 流水为空'),
+    sa.Column('payment_status', sa.SmallInteger(), server_default='-1', nullable=False, comment='支付状态, 流水为-1'),
+    sa.Column('count', sa.Integer(), server_default='0', nullable=False, comment='笔数'),
+    sa.Column('amount', sa.DECIMAL(precision=16, scale=4), server_default='0', nullable=False, comment='金额合计, 充值订单为支付金额'),
+    sa.Column('quantity', sa.DECIMAL(precision=16, scale=4), server_default='0', nullable=False, comment='充值数量合计'),
+    sa.Column('gift', sa.DECIMAL(precision=16, scale=4), server_default='0', nullable=False, comment='赠送数量合计'),
+    sa.Column('last_id', sa.Integer(), server_default='0', nullable=False, comment='已汇总的最大流水ID, 仅流水按小时统计使用'),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'), nullable=True, comment='更新时间'),
+    sa.PrimaryKeyConstraint('id'),
+    comment='财务统计',
+    mariadb_engine='InnoDB',
+    mysql_charset='utf8mb4',
+    mysql_collate='utf8mb4_unicode_ci',
+    mysql_engine='InnoDB'
+    )
+    op.create_index('uk_finance_rollup', 'finance_rollup', ['source', 'granularity', 'bucket', 'type', 'payment_channel', 'payment_status'], unique=True)
+    for table in ('user_balance_recharge', 'user_point_recharge'):
+        op.create_index(f'ix_{table}_created_at', table, ['created_at'], unique=False)
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    for table in ('user_balance_recharge', 'user_point_recharge'):
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        op.drop_index(f'ix_{table}_created_at', table_name=table)
+    op.drop_index('uk_finance_rollup', table_name='finance_rollup')
+    op.drop_table('finance_rollup')
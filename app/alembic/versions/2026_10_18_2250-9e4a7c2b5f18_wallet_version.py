@@ -0,0 +1,26 @@
+"""Wallet version
+
+Revision ID: 9e4a7c2b5f18
+Revises: 6d2e8f4a1c93
+Create Date: 2026-10-18 22:50:41.503297
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4a7c2b5f18'
+down_revision: Union[str, None] = '6d2e8f4a1c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user_wallet', sa.Column('version', sa.BigInteger(), server_default='0', nullable=False, comment='版本号'))
+
+
+def downgrade() -> None:
+    op.drop_column('user_wallet', 'version')
@@ -0,0 +1,44 @@
+"""Fulltext stopword
+
+Revision ID: c7d41e8a2f63
+Revises: 9e4a7c2b5f18
+Create Date: 2026-10-19 03:30:12.604518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d41e8a2f63'
+down_revision: Union[str, None] = '9e4a7c2b5f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FULLTEXT_INDEXES = [
+    ('ft_cms_post_title', 'cms_post', 'title'),
+    ('ft_cms_post_keywords', 'cms_post', 'keywords'),
+    ('ft_user_account_nickname', 'user_account', 'nickname'),
+]
+
+
+def upgrade() -> None:
+    # 停用词表在建索引时确定, ngram 解析器会丢弃包含停用词(a、i、at 等)的词元, 拉丁字母关键字因此漏查
+    # 服务器也需配置 innodb_ft_enable_stopword=OFF, 否则重建表时会按默认停用词表重建索引
+    op.execute('SET SESSION innodb_ft_enable_stopword = OFF')
+    for name, table, column in FULLTEXT_INDEXES:
+        op.drop_index(name, table_name=table)
+        op.create_index(name, table, [column], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+    # 手机号和邮箱改回 LIKE 查询, 完整邮箱中的 @ 等字符在全文检索中只能作为分隔符
+    op.drop_index('ft_user_account_email', table_name='user_account')
+    op.drop_index('ft_user_account_phone', table_name='user_account')
+
+
+def downgrade() -> None:
+    op.create_index('ft_user_account_phone', 'user_account', ['phone'], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+    op.create_index('ft_user_account_email', 'user_account', ['email'], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+    op.execute('SET SESSION innodb_ft_enable_stopword = ON')
+    for name, table, column in FULLTEXT_INDEXES:
+        op.drop_index(name, table_name=table)
+        op.create_index(name, table, [column], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
@@ -14,6 +14,8 @@ from . import payment_settings
 from . import balance_recharge
 from . import wechat
 from . import cache
+from . import export
+from . import monitor
 
 __all__ = [
     'adspace',
@@ -31,4 +33,6 @@ __all__ = [
     'balance_recharge',
     'wechat',
     'cache',
+    'export',
+    'monitor',
 ]
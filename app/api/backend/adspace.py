@@ -12,7 +12,7 @@ from app.core.log import logger
 from app.core.security import check_permission
 from app.schemas.adspace import AdspaceForm, AdspaceItem, SearchQuery, AdspaceListResponse
 from app.schemas.schemas import ResponseSuccess
-from app.services import adspace
+from app.services import adspace, export
 
 router = APIRouter()
 
@@ -20,6 +20,8 @@ router = APIRouter()
 @router.get("/adspaces", response_model=AdspaceListResponse, dependencies=[Depends(check_permission('AdspaceList'))],
             summary="广告位列表")
 def lists(params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('adspace', params)
     return adspace.lists(params)
 
 
@@ -12,7 +12,7 @@ from app.core.log import logger
 from app.core.security import check_permission
 from app.schemas.balance_recharge import BalanceRechargeItem, SearchQuery, BalanceRechargeListResponse
 from app.schemas.schemas import ResponseSuccess
-from app.services import balance_recharge
+from app.services import balance_recharge, export
 
 router = APIRouter()
 
@@ -20,6 +20,8 @@ router = APIRouter()
 @router.get("/balance_recharges", response_model=BalanceRechargeListResponse,
             dependencies=[Depends(check_permission('BalanceRechargeList'))], summary="余额充值日志列表")
 def lists(params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('balance_recharge', params)
     return balance_recharge.lists(params)
 
 
@@ -35,9 +37,9 @@ def detail(trade_no: str):
 
 @router.post('/balance_recharges/{trade_no}/refund', response_model=ResponseSuccess,
              dependencies=[Depends(check_permission('BalanceRechargeList'))], summary='余额充值订单退款')
-def refund(trade_no: str):
+async def refund(trade_no: str):
     try:
-        balance_recharge.refund(trade_no)
+        await balance_recharge.refund(trade_no)
         return ResponseSuccess()
     except ValueError as e:
         logger.error(f'退款失败：{e}')
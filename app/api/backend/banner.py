@@ -12,7 +12,7 @@ from app.core.log import logger
 from app.core.security import check_permission
 from app.schemas.banner import BannerForm, BannerItem, SearchQuery, BannerListResponse
 from app.schemas.schemas import ResponseSuccess
-from app.services import banner
+from app.services import banner, export
 
 router = APIRouter()
 
@@ -20,6 +20,8 @@ router = APIRouter()
 @router.get("/banners", response_model=BannerListResponse, dependencies=[Depends(check_permission('BannerList'))],
             summary="广告资源列表")
 def lists(params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('banner', params)
     return banner.lists(params)
 
 
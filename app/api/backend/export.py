@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: export.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 14:40
+
+import os
+import traceback
+
+from fastapi import APIRouter, HTTPException, Depends, Body, status
+from fastapi.responses import FileResponse
+
+from app.core.log import logger
+from app.core.security import get_current_user_from_cache
+from app.schemas.schemas import ExportJobResponse
+from app.services import export
+
+router = APIRouter()
+
+
+def check_export_permission(resource: str, user_data: dict) -> None:
+    try:
+        permission = export.get_resource(resource).permission
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=f'{e}')
+    if permission not in user_data['permissions']:
+        logger.warning(
+            f'用户 (id={user_data["id"]}, nickname={user_data["nickname"]}) 尝试导出未授权的数据 {resource}')
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+
+def get_job_or_404(job_id: str, user_data: dict) -> dict:
+    try:
+        job = export.get_job(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f'{e}')
+    if not job:
+        raise HTTPException(status_code=404, detail='导出任务不存在或已过期')
+    check_export_permission(job['resource'], user_data)
+    return job
+
+
+@router.post("/exports/{resource}", response_model=ExportJobResponse, summary="提交后台导出任务")
+def submit(resource: str, params: dict = Body(default={}, description="与对应列表接口相同的查询参数"),
+           user_data: dict = Depends(get_current_user_from_cache)):
+    check_export_permission(resource, user_data)
+    try:
+        return export.submit_job(resource, params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f'{e}')
+    except Exception as e:
+        logger.error(f'提交导出任务失败：{e}')
+        logger.info(f'调用堆栈：{traceback.format_exc()}')
+        raise HTTPException(status_code=500, detail='提交导出任务失败')
+
+
+@router.get("/exports/{job_id}", response_model=ExportJobResponse, summary="查询后台导出任务状态")
+def detail(job_id: str, user_data: dict = Depends(get_current_user_from_cache)):
+    return get_job_or_404(job_id, user_data)
+
+
+@router.get("/exports/{job_id}/download", summary="下载后台导出文件")
+def download(job_id: str, user_data: dict = Depends(get_current_user_from_cache)):
+    job = get_job_or_404(job_id, user_data)
+    if job['status'] != 'done':
+        raise HTTPException(status_code=409, detail='导出任务尚未完成')
+    path = export.get_job_path(job)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail='导出文件不存在或已过期')
+    # FileResponse 按块读取文件发送，不会一次性载入内存
+    filename = f'{job["resource"]}_{job["job_id"]}.{job["format"]}'
+    return FileResponse(path, filename=filename)
@@ -8,33 +8,51 @@
 import traceback
 from typing import List
 
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 
 from app.core.log import logger
 from app.core.security import check_permission, get_current_user_from_cache
 from app.schemas.finance import SearchQuery, AdjustForm, PaymentAccountSearchQuery, \
     PointRechargeSettingItem, BalanceRechargeSettingItem, \
-    PointRechargeSettingListResponse, BalanceRechargeSettingListResponse
+    PointRechargeSettingListResponse, BalanceRechargeSettingListResponse, StatisticsQuery, StatisticsItem
 from app.schemas.schemas import ResponseSuccess
 from app.services import balance_recharge
+from app.services import export
 from app.services import finance
+from app.services import finance_rollup
 
 router = APIRouter()
 
 
+def with_cursor_header(response: Response, result: dict) -> list:
+    """流水列表保持返回数组, 游标分页时下一页游标通过响应头 X-Next-Cursor 返回"""
+    if result['next_cursor']:
+        response.headers['X-Next-Cursor'] = result['next_cursor']
+    return result['items']
+
+
 @router.get("/finance/balance", dependencies=[Depends(check_permission('UserList'))], summary="获取余额列表")
-def balance_list(params: SearchQuery = Depends()):
-    return finance.get_balance_list(params)
+async def balance_list(response: Response, params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('balance', params)
+    result = await finance.get_balance_list_async(params)
+    return with_cursor_header(response, result)
 
 
 @router.get("/finance/balance_gift", dependencies=[Depends(check_permission('UserList'))], summary="获取赠送余额列表")
-def balance_gift_list(params: SearchQuery = Depends()):
-    return finance.get_balance_gift_list(params)
+async def balance_gift_list(response: Response, params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('balance_gift', params)
+    result = await finance.get_balance_gift_list_async(params)
+    return with_cursor_header(response, result)
 
 
 @router.get("/finance/point", dependencies=[Depends(check_permission('UserList'))], summary="获取积分列表")
-def point_list(params: SearchQuery = Depends()):
-    return finance.get_point_list(params)
+async def point_list(response: Response, params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('point', params)
+    result = await finance.get_point_list_async(params)
+    return with_cursor_header(response, result)
 
 
 @router.post("/finance/adjust_balance", response_model=ResponseSuccess,
@@ -88,8 +106,8 @@ def adjust_point(params: AdjustForm, user_data: dict = Depends(get_current_user_
 
 
 @router.get("/finance/payment_account", dependencies=[Depends(check_permission('UserList'))], summary="支付账号列表")
-def get_payment_account_list(params: PaymentAccountSearchQuery = Depends()):
-    return finance.get_payment_account_list(params)
+def get_payment_account_list(response: Response, params: PaymentAccountSearchQuery = Depends()):
+    return with_cursor_header(response, finance.get_payment_account_list(params))
 
 
 @router.get("/finance/point_recharge_settings", response_model=PointRechargeSettingListResponse,
@@ -134,3 +152,22 @@ def update_balance_recharge_settings(settings: List[BalanceRechargeSettingItem])
         logger.error(f'更新余额充值设置失败：{e}')
         logger.info(f'调用堆栈：{traceback.format_exc()}')
         raise HTTPException(status_code=500, detail='更新余额充值设置失败')
+
+
+@router.get("/finance/statistics", response_model=List[StatisticsItem],
+            dependencies=[Depends(check_permission('FinanceStatistics'))], summary="财务统计(按时段)")
+def statistics(params: StatisticsQuery = Depends()):
+    """读取定时汇总的统计数据, 最近约1分钟的数据尚未汇总"""
+    try:
+        return finance_rollup.get_statistics(params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f'{e}')
+
+
+@router.get("/finance/statistics/summary", response_model=List[StatisticsItem],
+            dependencies=[Depends(check_permission('FinanceStatistics'))], summary="财务统计(合计)")
+def statistics_summary(params: StatisticsQuery = Depends()):
+    try:
+        return finance_rollup.get_statistics_summary(params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f'{e}')
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: monitor.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 15:50
+
+from fastapi import APIRouter, Depends, Query
+
+from app.core.pool_monitor import pool_monitor
+from app.core.security import check_permission
+from app.core.sql_profiler import statement_stats
+
+router = APIRouter()
+
+
+@router.get("/monitor/db_pool", dependencies=[Depends(check_permission('SystemMonitor'))],
+            summary="数据库连接池监控")
+def db_pool():
+    """
+    - wait: 获取连接的等待耗时, 持续升高或 timeouts 增长说明 DB_POOL_SIZE 偏小
+    - hold: 连接占用时长, 耗时长的借出通常是在事务中调用了外部接口
+    - leaks: 借出超过 DB_POOL_LEAK_SECONDS 仍未归还的连接及借出时的调用堆栈
+    """
+    return pool_monitor.to_dict()
+
+
+@router.get("/monitor/sql", dependencies=[Depends(check_permission('SystemMonitor'))], summary="SQL 执行统计")
+def sql_stats(limit: int = Query(20, ge=1, le=200, description="返回条数"),
+              order_by: str = Query('total', pattern='^(total|count|max)$', description="排序字段")):
+    """
+    - statements: 滚动窗口内按语句汇总的执行次数与耗时, 当前窗口没有数据时返回上一个窗口
+    - repeats: 单个请求内重复执行次数达到 SQL_REPEAT_THRESHOLD 的语句(N+1)
+    """
+    return statement_stats.top(limit, order_by)
@@ -12,7 +12,7 @@ from app.core.log import logger
 from app.core.security import check_permission
 from app.schemas.payment_channel import PaymentChannelForm, PaymentChannelItem, SearchQuery, PaymentChannelListResponse
 from app.schemas.schemas import ResponseSuccess
-from app.services import payment_channel
+from app.services import payment_channel, export
 
 router = APIRouter()
 
@@ -20,6 +20,8 @@ router = APIRouter()
 @router.get("/payment_channels", response_model=PaymentChannelListResponse,
             dependencies=[Depends(check_permission('PaymentSettings'))], summary="支付渠道列表")
 def lists(params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('payment_channel', params)
     return payment_channel.lists(params)
 
 
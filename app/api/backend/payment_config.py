@@ -13,7 +13,7 @@ from app.core.security import check_permission
 from app.schemas.payment_config import PaymentConfigForm, PaymentConfigStatusForm, PaymentConfigItem, SearchQuery, \
     PaymentConfigListResponse
 from app.schemas.schemas import ResponseSuccess
-from app.services import payment_config
+from app.services import payment_config, export
 
 router = APIRouter()
 
@@ -21,6 +21,8 @@ router = APIRouter()
 @router.get("/payment_configs", response_model=PaymentConfigListResponse,
             dependencies=[Depends(check_permission('PaymentSettings'))], summary="支付配置列表")
 def lists(params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('payment_config', params)
     return payment_config.lists(params)
 
 
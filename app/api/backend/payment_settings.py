@@ -10,6 +10,7 @@ import traceback
 from fastapi import APIRouter, HTTPException, Depends
 
 from app.core.log import logger
+from app.core.payment import payment_manager
 from app.core.security import check_permission
 from app.schemas.payment_settings import PaymentSettingsSortForm, PaymentSettingListResponse
 from app.schemas.schemas import ResponseSuccess
@@ -59,6 +60,7 @@ def alipay_root_cert(params: SystemOptionValueForm):
             lock=1,
             memo="支付宝根证书"
         ))
+        payment_manager.invalidate()
         return ResponseSuccess()
     except ValueError as e:
         logger.info(f'调用堆栈：{traceback.format_exc()}')
@@ -12,7 +12,7 @@ from app.core.log import logger
 from app.core.security import check_permission
 from app.schemas.post import PostForm, PostItem, SearchQuery, PostListResponse
 from app.schemas.schemas import ResponseSuccess
-from app.services import post
+from app.services import post, export
 
 router = APIRouter()
 
@@ -20,6 +20,8 @@ router = APIRouter()
 @router.get("/posts", response_model=PostListResponse, dependencies=[Depends(check_permission('PostList'))],
             summary="文章列表")
 def lists(params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('post', params)
     return post.lists(params)
 
 
@@ -12,7 +12,7 @@ from app.core.log import logger
 from app.core.security import check_permission
 from app.schemas.post_category import PostCategoryForm, PostCategoryItem, SearchQuery, PostCategoryListResponse
 from app.schemas.schemas import ResponseSuccess
-from app.services import post_category
+from app.services import post_category, export
 
 router = APIRouter()
 
@@ -20,6 +20,8 @@ router = APIRouter()
 @router.get("/post_categories", response_model=PostCategoryListResponse,
             dependencies=[Depends(check_permission('PostCategoryList'))], summary="文章分类列表")
 def lists(params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('post_category', params)
     return post_category.lists(params)
 
 
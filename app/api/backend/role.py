@@ -11,7 +11,7 @@ from fastapi import APIRouter, HTTPException, Depends
 
 from app.core.log import logger
 from app.core.security import check_permission
-from app.services import role
+from app.services import role, export
 
 from app.schemas.schemas import ResponseSuccess
 from app.schemas.role import RoleForm, RoleItem, SearchQuery, RoleListResponse
@@ -21,6 +21,8 @@ router = APIRouter()
 
 @router.get("/roles", response_model=RoleListResponse, dependencies=[Depends(check_permission('RoleList'))], summary="角色列表")
 def lists(params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('role', params)
     return role.lists(params)
 
 
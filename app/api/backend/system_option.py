@@ -13,7 +13,7 @@ from app.core.log import logger
 from app.core.security import check_permission
 from app.schemas.schemas import ResponseSuccess
 from app.schemas.system_option import SearchQuery, SystemOptionForm, SystemOptionItem, SystemOptionResponse
-from app.services import system_option
+from app.services import system_option, export
 
 router = APIRouter()
 
@@ -21,6 +21,8 @@ router = APIRouter()
 @router.get("/options", response_model=SystemOptionResponse, dependencies=[Depends(check_permission('SystemOption'))],
             summary="系统选项列表")
 def lists(params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('system_option', params)
     return system_option.lists(params)
 
 
@@ -12,7 +12,7 @@ from app.core.log import logger
 from app.core.security import check_permission
 from app.schemas.schemas import ResponseSuccess
 from app.schemas.user import UserForm, UserItem, SearchQuery, SimpleSearchQuery, UserListResponse, UserSimpleListResponse
-from app.services import user
+from app.services import user, export
 
 router = APIRouter()
 
@@ -20,6 +20,8 @@ router = APIRouter()
 @router.get("/users", response_model=UserListResponse, dependencies=[Depends(check_permission('UserList'))],
             summary="用户列表")
 def lists(params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('user', params)
     return user.lists(params)
 
 
@@ -31,8 +33,8 @@ def quick_search(params: SimpleSearchQuery = Depends()):
 
 @router.get("/users/{id}", response_model=UserItem, dependencies=[Depends(check_permission('UserList'))],
             summary="用户详情", )
-def detail(id: int):
-    current_model = user.get(id)
+async def detail(id: int):
+    current_model = await user.get_async(id)
     if not current_model:
         raise HTTPException(status_code=404, detail="用户不存在")
     return current_model
@@ -13,7 +13,7 @@ from app.core.log import logger
 from app.core.security import check_permission
 from app.schemas.schemas import ResponseSuccess
 from app.schemas.wechat import WechatForm, WechatItem, SearchQuery, WechatListResponse
-from app.services import wechat
+from app.services import wechat, export
 
 router = APIRouter()
 
@@ -21,6 +21,8 @@ router = APIRouter()
 @router.get("/wechats", response_model=WechatListResponse, dependencies=[Depends(check_permission('WechatList'))],
             summary="微信媒体平台列表")
 def lists(params: SearchQuery = Depends()):
+    if params.export == 1:
+        return export.stream_response('wechat', params)
     return wechat.lists(params)
 
 
@@ -16,10 +16,11 @@ from app.constants.constants import RESPONSE_WECHAT_SUCCESS, RESPONSE_WECHAT_FAI
     RESPONSE_ALIPAY_FAIL
 from app.core.log import logger
 from app.core.security import get_current_user_from_cache
-from app.schemas.balance_recharge import BalanceRechargePublicItem
 from app.schemas.finance import PaymentChannelType, RechargeForm, PayForm, ScanpayForm, \
-    BalanceRechargeSettingListResponse
+    BalanceRechargeSettingListResponse, OrderWaitQuery
 from app.services import balance_recharge
+from app.services import order_status
+from app.services import payment_notify
 
 router = APIRouter()
 
@@ -58,11 +59,10 @@ def unifiedorder(params: RechargeForm, request: Request, user_data: dict = Depen
         raise HTTPException(status_code=500, detail='余额充值下单失败')
 
 
-@router.get('/balance_recharges/{trade_no}/check', response_model=BalanceRechargePublicItem,
-            summary='余额充值检查订单支付结果')
-def check(trade_no: str, user_data: dict = Depends(get_current_user_from_cache)):
+@router.get('/balance_recharges/{trade_no}/check', summary='余额充值检查订单支付结果')
+async def check(trade_no: str, user_data: dict = Depends(get_current_user_from_cache)):
     try:
-        return balance_recharge.check_order(trade_no, user_data['id'])
+        return await order_status.get_status('balance', trade_no, user_data['id'])
     except ValueError as e:
         logger.info(f'调用堆栈：{traceback.format_exc()}')
         raise HTTPException(status_code=400, detail=f'{e}')
@@ -72,10 +72,38 @@ def check(trade_no: str, user_data: dict = Depends(get_current_user_from_cache))
         raise HTTPException(status_code=500, detail='检查余额充值结果失败')
 
 
+@router.get('/balance_recharges/{trade_no}/wait', summary='余额充值等待支付结果(长轮询)')
+async def wait(trade_no: str, params: OrderWaitQuery = Depends(),
+               user_data: dict = Depends(get_current_user_from_cache)):
+    try:
+        return await order_status.wait_status('balance', trade_no, user_data['id'], params.timeout)
+    except ValueError as e:
+        logger.info(f'调用堆栈：{traceback.format_exc()}')
+        raise HTTPException(status_code=400, detail=f'{e}')
+    except Exception as e:
+        logger.error(f'等待余额充值结果失败：{e}')
+        logger.info(f'调用堆栈：{traceback.format_exc()}')
+        raise HTTPException(status_code=500, detail='等待余额充值结果失败')
+
+
+@router.get('/balance_recharges/{trade_no}/events', summary='余额充值支付结果推送(SSE)')
+async def events(trade_no: str, params: OrderWaitQuery = Depends(),
+                 user_data: dict = Depends(get_current_user_from_cache)):
+    try:
+        return await order_status.event_response('balance', trade_no, user_data['id'], params.timeout)
+    except ValueError as e:
+        logger.info(f'调用堆栈：{traceback.format_exc()}')
+        raise HTTPException(status_code=400, detail=f'{e}')
+    except Exception as e:
+        logger.error(f'订阅余额充值结果失败：{e}')
+        logger.info(f'调用堆栈：{traceback.format_exc()}')
+        raise HTTPException(status_code=500, detail='订阅余额充值结果失败')
+
+
 @router.post('/balance_recharges/pay', summary='支付触达 - 选择支付方式')
-def pay(params: PayForm, user_data: dict = Depends(get_current_user_from_cache)):
+async def pay(params: PayForm, user_data: dict = Depends(get_current_user_from_cache)):
     try:
-        return balance_recharge.pay(params, user_data)
+        return await balance_recharge.pay(params, user_data)
     except ValueError as e:
         logger.info(f'调用堆栈：{traceback.format_exc()}')
         raise HTTPException(status_code=400, detail=f'{e}')
@@ -113,13 +141,15 @@ async def notify(payment_channel: str, request: Request):
                 params = dict(formdata)
             case (_):
                 raise HTTPException(status_code=400, detail=f'未知的支付渠道: {payment_channel}')
-        result = balance_recharge.notify(payment_channel, params, content)
+        result = await payment_notify.accept('balance', payment_channel, params, content)
         response = RESPONSE_WECHAT_SUCCESS if payment_channel == 'wechatpay' else RESPONSE_ALIPAY_SUCCESS
         if not result:
             response = RESPONSE_WECHAT_FAIL if payment_channel == 'wechatpay' else RESPONSE_ALIPAY_FAIL
         return PlainTextResponse(response, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
-        PlainTextResponse(RESPONSE_WECHAT_FAIL if payment_channel == 'wechatpay' else RESPONSE_ALIPAY_FAIL,
-                          status_code=200)
         logger.error(f'余额充值结果异步通知处理失败：{e}')
         logger.info(f'调用堆栈：{traceback.format_exc()}')
+        return PlainTextResponse(RESPONSE_WECHAT_FAIL if payment_channel == 'wechatpay' else RESPONSE_ALIPAY_FAIL,
+                                 status_code=200)
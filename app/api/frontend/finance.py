@@ -16,11 +16,14 @@ from app.constants.constants import RESPONSE_WECHAT_SUCCESS, RESPONSE_WECHAT_FAI
 from app.core.log import logger
 from app.core.security import get_current_user_from_cache
 from app.schemas.finance import RechargeForm, PayForm, ScanpayForm, PointRechargeSettingListResponse, \
-    BalanceRechargeSettingListResponse
+    BalanceRechargeSettingListResponse, BalancesItem, PaymentChannelType, OrderWaitQuery
 from app.schemas.payment_settings import PaymentSettingOutListResponse
 from app.services import balance_recharge
 from app.services import finance
+from app.services import order_status
+from app.services import payment_notify
 from app.services import payment_settings
+from app.services import wallet
 
 router = APIRouter()
 
@@ -31,6 +34,11 @@ def get_payment_settings():
     return payment_settings.get_payment_settings_from_cache()
 
 
+@router.get('/finance/balances', response_model=BalancesItem, summary='我的余额和积分 (from cache)')
+def balances(user_data: dict = Depends(get_current_user_from_cache)):
+    return wallet.get_balances(user_data['id'])
+
+
 @router.get('/finance/point/recharge_settings', response_model=PointRechargeSettingListResponse,
             summary='积分充值套餐列表')
 def point_setting():
@@ -79,9 +87,9 @@ def balance_unifiedorder(params: RechargeForm, request: Request,
 
 
 @router.get('/finance/point/check{trade_no}', summary='积分充值检查支付结果')
-def point_check(trade_no: str, user_data: dict = Depends(get_current_user_from_cache)):
+async def point_check(trade_no: str, user_data: dict = Depends(get_current_user_from_cache)):
     try:
-        return finance.point_check(trade_no, user_data['id'])
+        return await order_status.get_status('point', trade_no, user_data['id'])
     except ValueError as e:
         logger.info(f'调用堆栈：{traceback.format_exc()}')
         raise HTTPException(status_code=400, detail=f'{e}')
@@ -92,9 +100,9 @@ def point_check(trade_no: str, user_data: dict = Depends(get_current_user_from_c
 
 
 @router.get('/finance/balance/check{trade_no}', summary='余额充值检查支付结果')
-def balance_check(trade_no: str, user_data: dict = Depends(get_current_user_from_cache)):
+async def balance_check(trade_no: str, user_data: dict = Depends(get_current_user_from_cache)):
     try:
-        return finance.balance_check(trade_no, user_data['id'])
+        return await order_status.get_status('balance', trade_no, user_data['id'])
     except ValueError as e:
         logger.info(f'调用堆栈：{traceback.format_exc()}')
         raise HTTPException(status_code=400, detail=f'{e}')
@@ -104,10 +112,38 @@ def balance_check(trade_no: str, user_data: dict = Depends(get_current_user_from
         raise HTTPException(status_code=500, detail='检查余额充值结果失败')
 
 
+@router.get('/finance/point/wait/{trade_no}', summary='积分充值等待支付结果(长轮询)')
+async def point_wait(trade_no: str, params: OrderWaitQuery = Depends(),
+                     user_data: dict = Depends(get_current_user_from_cache)):
+    try:
+        return await order_status.wait_status('point', trade_no, user_data['id'], params.timeout)
+    except ValueError as e:
+        logger.info(f'调用堆栈：{traceback.format_exc()}')
+        raise HTTPException(status_code=400, detail=f'{e}')
+    except Exception as e:
+        logger.error(f'等待积分充值结果失败：{e}')
+        logger.info(f'调用堆栈：{traceback.format_exc()}')
+        raise HTTPException(status_code=500, detail='等待积分充值结果失败')
+
+
+@router.get('/finance/point/events/{trade_no}', summary='积分充值支付结果推送(SSE)')
+async def point_events(trade_no: str, params: OrderWaitQuery = Depends(),
+                       user_data: dict = Depends(get_current_user_from_cache)):
+    try:
+        return await order_status.event_response('point', trade_no, user_data['id'], params.timeout)
+    except ValueError as e:
+        logger.info(f'调用堆栈：{traceback.format_exc()}')
+        raise HTTPException(status_code=400, detail=f'{e}')
+    except Exception as e:
+        logger.error(f'订阅积分充值结果失败：{e}')
+        logger.info(f'调用堆栈：{traceback.format_exc()}')
+        raise HTTPException(status_code=500, detail='订阅积分充值结果失败')
+
+
 @router.post('/finance/point/scanpay', summary='积分充值扫码支付触达')
-def point_scanpay(params: ScanpayForm, user_data: dict = Depends(get_current_user_from_cache)):
+async def point_scanpay(params: ScanpayForm, user_data: dict = Depends(get_current_user_from_cache)):
     try:
-        return finance.point_scanpay(params, user_data)
+        return await finance.point_scanpay(params, user_data)
     except ValueError as e:
         logger.info(f'调用堆栈：{traceback.format_exc()}')
         raise HTTPException(status_code=400, detail=f'{e}')
@@ -118,9 +154,9 @@ def point_scanpay(params: ScanpayForm, user_data: dict = Depends(get_current_use
 
 
 @router.post('/finance/balance/scanpay', summary='余额充值扫码支付触达')
-def balance_scanpay(params: ScanpayForm, user_data: dict = Depends(get_current_user_from_cache)):
+async def balance_scanpay(params: ScanpayForm, user_data: dict = Depends(get_current_user_from_cache)):
     try:
-        return finance.balance_scanpay(params, user_data)
+        return await finance.balance_scanpay(params, user_data)
     except ValueError as e:
         logger.info(f'调用堆栈：{traceback.format_exc()}')
         raise HTTPException(status_code=400, detail=f'{e}')
@@ -147,21 +183,25 @@ def balance_scanpay(params: PayForm, user_data: dict = Depends(get_current_user_
 async def point_notify(payment_channel: str, request: Request):
     try:
         content = None
-        params = dict(request.query_params)
-        if payment_channel == 'wechat':
+        # 积分充值的通知地址使用 wechat 作为微信渠道名
+        if payment_channel in ('wechat', PaymentChannelType.WECHATPAY.value):
+            payment_channel = PaymentChannelType.WECHATPAY.value
             body = await request.body()
             content = body.decode("utf-8")
             params = xmltodict.parse(content)['xml']
+        else:
+            params = {**request.query_params, **await request.form()}
 
-        result = finance.point_notify(payment_channel, params, content)
+        result = await payment_notify.accept('point', payment_channel, params, content)
 
-        response = RESPONSE_WECHAT_SUCCESS if payment_channel == 'wechat' else RESPONSE_ALIPAY_SUCCESS
+        is_wechat = payment_channel == PaymentChannelType.WECHATPAY.value
+        response = RESPONSE_WECHAT_SUCCESS if is_wechat else RESPONSE_ALIPAY_SUCCESS
         if not result:
-            response = RESPONSE_WECHAT_FAIL if payment_channel == 'wechat' else RESPONSE_ALIPAY_FAIL
+            response = RESPONSE_WECHAT_FAIL if is_wechat else RESPONSE_ALIPAY_FAIL
 
         return PlainTextResponse(response, status_code=200)
     except Exception as e:
         logger.error(f'积分充值结果通知处理失败：{e}')
         logger.info(f'调用堆栈：{traceback.format_exc()}')
-        PlainTextResponse(RESPONSE_WECHAT_FAIL if payment_channel == 'wechat' else RESPONSE_ALIPAY_FAIL,
-                          status_code=200)
+        return PlainTextResponse(RESPONSE_WECHAT_FAIL if payment_channel == PaymentChannelType.WECHATPAY.value
+                                 else RESPONSE_ALIPAY_FAIL, status_code=200)
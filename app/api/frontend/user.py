@@ -11,26 +11,28 @@ from fastapi import APIRouter, HTTPException, Depends, Request
 
 from app.core.log import logger
 from app.core.security import get_current_user_from_cache
-from app.schemas.finance import PaymentAccountFrontendSearchQuery, PaymentAccountAddForm, PaymentAccountEditForm
+from app.schemas.finance import PaymentAccountFrontendSearchQuery, PaymentAccountAddForm, PaymentAccountEditForm, \
+    CheckinResult, CheckinCalendarQuery, CheckinCalendarItem
 from app.schemas.schemas import ResponseSuccess
-from app.schemas.user import UserPublicItem
+from app.schemas.user import UserMeItem
+from app.services import checkin as checkin_service
 from app.services import finance
+from app.services import wallet
 
 router = APIRouter()
 
 
-@router.get("/user/me", response_model=UserPublicItem, summary="我的详情")
+@router.get("/user/me", response_model=UserMeItem, summary="我的详情")
 def my_detail(user_data: dict = Depends(get_current_user_from_cache)):
-    return user_data
+    return {**user_data, **wallet.get_balances(user_data['id'])}
 
 
-@router.post("/user/checkin", response_model=ResponseSuccess, summary="用户签到")
+@router.post("/user/checkin", response_model=CheckinResult, summary="用户签到")
 def checkin(request: Request, user_data: dict = Depends(get_current_user_from_cache)):
     try:
         ip = request.client.host if request.client else None
         user_agent = str(request.headers.get('User-Agent'))
-        finance.checkin(user_data['id'], ip, user_agent)
-        return ResponseSuccess()
+        return checkin_service.checkin(user_data['id'], ip, user_agent)
     except ValueError as e:
         logger.info(f'调用堆栈：{traceback.format_exc()}')
         raise HTTPException(status_code=400, detail=f'{e}')
@@ -40,6 +42,14 @@ def checkin(request: Request, user_data: dict = Depends(get_current_user_from_ca
         raise HTTPException(status_code=500, detail='签到失败')
 
 
+@router.get("/user/checkin/calendar", response_model=CheckinCalendarItem, summary="签到日历")
+def checkin_calendar(params: CheckinCalendarQuery = Depends(), user_data: dict = Depends(get_current_user_from_cache)):
+    try:
+        return checkin_service.get_calendar(user_data['id'], params.month)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f'{e}')
+
+
 @router.get("/user/payment_account", summary="支付账号列表")
 def get_payment_account_list(params: PaymentAccountFrontendSearchQuery = Depends(),
                              user_data: dict = Depends(get_current_user_from_cache)):
@@ -38,3 +38,5 @@ api_router.include_router(backend.payment_settings.router, prefix="/backend", ta
 api_router.include_router(backend.balance_recharge.router, prefix="/backend", tags=['backend_balance_recharge'])
 api_router.include_router(backend.wechat.router, prefix="/backend", tags=['backend_wechat'])
 api_router.include_router(backend.cache.router, prefix="/backend", tags=['backend_cache'])
+api_router.include_router(backend.export.router, prefix="/backend", tags=['backend_export'])
+api_router.include_router(backend.monitor.router, prefix="/backend", tags=['backend_monitor'])
@@ -11,6 +11,7 @@ from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
 
 from app.constants.constants import REDIS_AUTH_TTL, REDIS_AUTH_USER_PREFIX
+from app.core import lookup
 from app.core.mysql import get_session
 from app.core.redis import get_redis
 from app.core.security import (AuthChecker, authenticate_user_by_password, create_access_token,
@@ -19,7 +20,6 @@ from app.core.security import (AuthChecker, authenticate_user_by_password, creat
                                verify_password,
                                get_current_user)
 from app.models.user import LoginlogModel
-from app.models.user import RoleModel
 from app.models.user import UserModel
 from app.schemas.auth import AuthSuccessResponse
 from app.schemas.schemas import ResponseSuccess
@@ -43,11 +43,9 @@ def authorize(request: Request, form: OAuth2PasswordRequestForm = Depends()):
     if user_data['role_id']:
         with get_session(read_only=True) as db:
             # 目前只支持单用户单角色模式
-            user_role = (db.query(RoleModel)
-                         .filter_by(id=user_data['role_id'])
-                         .first())
-            if user_role:
-                user_data['permissions'] = json.loads(user_role.permissions)
+            permissions = lookup.role_permissions_by_id.first(db, user_data['role_id'], lookup.ResultType.SCALAR)
+            if permissions:
+                user_data['permissions'] = json.loads(permissions)
 
     with get_redis() as redis:
         redis.set(f'{REDIS_AUTH_USER_PREFIX}{user_id_str}',
@@ -47,6 +47,9 @@ REDIS_PAYMENT_CHANNEL = 'payment_channel'
 # [hash] 支付配置
 REDIS_PAYMENT_CONFIG = 'payment_config'
 
+# 支付配置版本号, 修改支付配置或支付宝根证书后递增, 各进程据此清空缓存的支付实例
+REDIS_PAYMENT_CONFIG_VERSION = 'payment_config:version'
+
 # [hash] 微信媒体平台
 REDIS_WECHAT = 'wechat'
 
@@ -64,3 +67,69 @@ REDIS_POST_CATEGORY = 'post:category'
 
 # 接广告位ID, 存广告资源
 REDIS_AD_PREFIX = 'ad:'
+
+# 接用户ID, 用户写入后短时间内的只读查询走主库(读己之写)
+REDIS_DB_STICKY_PREFIX = 'db:sticky:'
+
+# 列表总数缓存, 接表名:版本号:查询指纹, 存总数
+REDIS_COUNT_PREFIX = 'count:'
+
+# 接表名, 存列表总数缓存的版本号, 表有新增或删除时递增
+REDIS_COUNT_VERSION_PREFIX = 'count:version:'
+
+# [hash] 接任务ID, 存后台导出任务状态
+REDIS_EXPORT_JOB_PREFIX = 'export:job:'
+
+# 后台导出任务状态及导出文件保留时长
+EXPORT_JOB_TTL = 86400
+
+# 接用户ID, 存用户最近使用的动账队列
+REDIS_FINANCE_ROUTE_PREFIX = 'finance:route:'
+
+# 接动账队列名, 批量动账模式下的动账消息流
+REDIS_FINANCE_STREAM_PREFIX = 'finance:stream:'
+
+# 接统计数据来源, 存充值订单已汇总到的更新时间
+REDIS_FINANCE_ROLLUP_WATERMARK = 'finance:rollup:watermark:'
+
+# [hash] 接用户ID, 存用户的余额、赠送余额、积分及钱包版本号
+REDIS_USER_BALANCES_PREFIX = 'user:balances:'
+
+# 接用户ID, 余额缓存未命中时回源数据库的互斥锁
+REDIS_USER_BALANCES_LOCK_PREFIX = 'user:balances:lock:'
+
+# 余额缓存保留时长
+REDIS_USER_BALANCES_TTL = 86400
+
+# [bitmap] 接用户ID, 每天一位记录签到, 偏移量为距 CHECKIN_EPOCH 的天数
+REDIS_CHECKIN_BITMAP_PREFIX = 'checkin:bitmap:'
+
+# [list] 待写入数据库的签到记录
+REDIS_CHECKIN_PENDING = 'checkin:pending'
+
+# 签到记录批量写库任务的互斥锁
+REDIS_CHECKIN_FLUSH_LOCK = 'checkin:flush:lock'
+
+# [stream] 待处理的支付异步通知原文
+REDIS_NOTIFY_STREAM = 'notify:stream'
+
+# [stream] 验签失败或多次处理失败的支付异步通知
+REDIS_NOTIFY_DEAD_STREAM = 'notify:stream:dead'
+
+# [set] 接订单类型:商户订单号, 存已接收的异步通知摘要, 用于丢弃支付网关的重复通知
+REDIS_NOTIFY_SEEN_PREFIX = 'notify:seen:'
+
+# [hash] 键为订单类型:商户订单号, 存入账提交后尚未投递成功的动账任务
+REDIS_NOTIFY_DISPATCH = 'notify:dispatch'
+
+# [zset] 接队列名, 延迟任务队列, 成员为任务ID, 分值为到期时间(毫秒)
+REDIS_DELAY_QUEUE_PREFIX = 'delay:queue:'
+
+# [hash] 接队列名, 延迟任务附带的数据
+REDIS_DELAY_PAYLOAD_PREFIX = 'delay:payload:'
+
+# [hash] 接订单类型:交易号, 存充值订单的用户ID和支付状态, 收银台等待支付结果时读取
+REDIS_ORDER_STATUS_PREFIX = 'order:status:'
+
+# [pub/sub] 接订单类型:交易号, 充值订单状态变化时发布新状态
+REDIS_ORDER_STATUS_CHANNEL_PREFIX = 'order:status:channel:'
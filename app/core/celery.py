@@ -27,7 +27,8 @@ app.conf.update(
     enable_utc=True,
     broker_connection_retry_on_startup=True,
     result_expires=300,
-    include=['app.tasks.wechat'],
+    include=['app.tasks.wechat', 'app.tasks.export', 'app.tasks.archive', 'app.tasks.finance_rollup',
+             'app.tasks.reconcile', 'app.tasks.checkin', 'app.tasks.delay_queue', 'app.tasks.payment_notify'],
     beat_schedule={
         'wechat_refresh_accesstoken': {
             'task': 'app.tasks.wechat.refresh_access_token',
@@ -35,5 +36,40 @@ app.conf.update(
             'schedule': crontab(minute=0, hour="*/1"),  # 每隔1小时执行一次
             'args': ()
         },
+        'clean_export_files': {
+            'task': 'app.tasks.export.clean_export_files',
+            'schedule': crontab(minute=30, hour=3),  # 每天凌晨3点30分执行
+            'args': ()
+        },
+        'rollup_finance': {
+            'task': 'app.tasks.finance_rollup.rollup_finance',
+            'schedule': crontab(),  # 每分钟执行一次
+            'args': ()
+        },
+        'flush_checkins': {
+            'task': 'app.tasks.checkin.flush_checkins',
+            'schedule': timedelta(seconds=10),  # 每隔10秒执行一次, 签到记录批量写库
+            'args': ()
+        },
+        'run_delay_queues': {
+            'task': 'app.tasks.delay_queue.run_delay_queues',
+            'schedule': timedelta(seconds=5),  # 每隔5秒执行一次, 处理到期的延迟任务(如关闭超时订单)
+            'args': ()
+        },
+        'redispatch_ledger_tasks': {
+            'task': 'app.tasks.payment_notify.redispatch_ledger_tasks',
+            'schedule': crontab(),  # 每分钟执行一次, 补投支付通知入账后投递失败的动账任务
+            'args': ()
+        },
+        'reconcile_ledgers': {
+            'task': 'app.tasks.reconcile.reconcile_ledgers',
+            'schedule': crontab(minute=0, hour=5),  # 每天凌晨5点执行, 在归档任务之后
+            'args': ()
+        },
+        'archive_tables': {
+            'task': 'app.tasks.archive.archive_tables',
+            'schedule': crontab(minute=0, hour=4),  # 每天凌晨4点执行, 创建后续分区并归档过期月份
+            'args': ()
+        },
     },
 )
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: count_cache.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 14:05
+
+import hashlib
+import itertools
+import os
+
+from redis.exceptions import RedisError
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.constants.constants import REDIS_COUNT_PREFIX, REDIS_COUNT_VERSION_PREFIX
+from app.core.log import logger
+from app.core.redis import get_redis
+
+# 列表总数缓存时间(秒)
+count_cache_ttl_env = os.getenv("COUNT_CACHE_TTL")
+COUNT_CACHE_TTL = int(count_cache_ttl_env) if count_cache_ttl_env else 30
+# 表版本号保留时间, 需远大于 COUNT_CACHE_TTL
+COUNT_VERSION_TTL = 86400
+# InnoDB 统计行数低于此值时直接精确统计, 小表的统计信息误差较大且 COUNT(*) 本身足够快
+ESTIMATE_MIN_ROWS = 10000
+
+
+def _fingerprint(query) -> str:
+    """按 SQL 语句与绑定参数生成查询指纹，相同过滤条件共享同一缓存"""
+    compiled = query.statement.compile()
+    raw = f'{compiled}|{sorted(compiled.params.items())!r}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _cache_key(table: str, suffix: str) -> str | None:
+    try:
+        with get_redis() as redis:
+            version = redis.get(f'{REDIS_COUNT_VERSION_PREFIX}{table}') or 0
+        return f'{REDIS_COUNT_PREFIX}{table}:{version}:{suffix}'
+    except RedisError as e:
+        logger.warning(f'读取行数缓存版本失败：{e}')
+        return None
+
+
+def _cache_get(key: str | None) -> int | None:
+    if key is None:
+        return None
+    try:
+        with get_redis() as redis:
+            total = redis.get(key)
+        return int(total) if total is not None else None
+    except RedisError as e:
+        logger.warning(f'读取行数缓存失败：{e}')
+        return None
+
+
+def _cache_set(key: str | None, total: int) -> None:
+    if key is None:
+        return
+    try:
+        with get_redis() as redis:
+            redis.set(key, total, ex=COUNT_CACHE_TTL)
+    except RedisError as e:
+        logger.warning(f'写入行数缓存失败：{e}')
+
+
+def cached_count(query, model) -> int:
+    """带缓存的 COUNT(*)，缓存按表版本号隔离，表有新增或删除时版本号递增使缓存失效"""
+    key = _cache_key(model.__tablename__, _fingerprint(query))
+    total = _cache_get(key)
+    if total is None:
+        total = query.count()
+        _cache_set(key, total)
+    return total
+
+
+def estimated_count(query, model) -> int:
+    """
+    近似总数：未设置任何过滤条件时使用 InnoDB 表统计信息，避免全表 COUNT(*) 扫描
+    有过滤条件或小表时回退到 cached_count
+    """
+    if query.whereclause is not None:
+        return cached_count(query, model)
+
+    table = model.__tablename__
+    key = _cache_key(table, 'estimated')
+    total = _cache_get(key)
+    if total is None:
+        total = query.session.execute(
+            text('SELECT TABLE_ROWS FROM information_schema.TABLES '
+                 'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table'), {'table': table}).scalar()
+        if total is None or total < ESTIMATE_MIN_ROWS:
+            return cached_count(query, model)
+        _cache_set(key, total)
+    return total
+
+
+def invalidate(*tables: str) -> None:
+    """递增表版本号，使该表所有已缓存的总数失效，绕过 ORM 写入(原生 SQL/批量插入)时需手动调用"""
+    try:
+        with get_redis() as redis:
+            pipe = redis.pipeline(transaction=False)
+            for table in tables:
+                pipe.incr(f'{REDIS_COUNT_VERSION_PREFIX}{table}')
+                pipe.expire(f'{REDIS_COUNT_VERSION_PREFIX}{table}', COUNT_VERSION_TTL)
+            pipe.execute()
+    except RedisError as e:
+        logger.warning(f'行数缓存失效失败：{e}')
+
+
+def mark_changed(session: Session, *tables: str) -> None:
+    """登记会话中发生新增或删除的表，提交后统一失效"""
+    session.info.setdefault('count_cache_tables', set()).update(tables)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_tables(session, flush_context):
+    tables = [getattr(obj, '__tablename__', None) for obj in itertools.chain(session.new, session.deleted)]
+    mark_changed(session, *[table for table in tables if table])
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_tables(session):
+    tables = session.info.pop('count_cache_tables', None)
+    if tables:
+        invalidate(*tables)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_tables(session):
+    session.info.pop('count_cache_tables', None)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: delay_queue.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/19 01:20
+
+"""
+延迟任务队列
+
+每个队列一个 Redis 有序集合，成员为任务ID，分值为到期时间(毫秒时间戳)，任务附带的数据保存在同名 hash 中：
+1. 重复调度同一任务ID只会更新到期时间，可用于推迟任务
+2. 到期任务按批领取，领取时在 Lua 脚本中把分值改为租约到期时间，处理进程崩溃时租约到期后重新领取
+3. 处理成功后只在分值仍为本次租约时删除任务，处理期间被重新调度的任务不会被删除
+4. 处理函数返回需要重试的任务及延迟秒数，处理函数抛出异常时整批在租约到期后重试
+各业务创建 DelayQueue 并用 on_due 注册处理函数，由 app.tasks.delay_queue.run_delay_queues 定时处理所有队列
+"""
+
+import json
+import time
+from typing import Callable
+
+from app.constants.constants import REDIS_DELAY_QUEUE_PREFIX, REDIS_DELAY_PAYLOAD_PREFIX
+from app.core.log import logger
+from app.core.redis import get_redis
+
+# KEYS[1] 有序集合，KEYS[2] 任务数据，ARGV 依次为当前时间、最大领取数、租约到期时间
+CLAIM_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due == 0 then
+    return {{}, {}}
+end
+for _, member in ipairs(due) do
+    redis.call('ZADD', KEYS[1], ARGV[3], member)
+end
+return {due, redis.call('HMGET', KEYS[2], unpack(due))}
+"""
+
+# KEYS[1] 有序集合，KEYS[2] 任务数据，ARGV[1] 租约到期时间，其余为任务ID
+ACK_SCRIPT = """
+local removed = 0
+for i = 2, #ARGV do
+    if tonumber(redis.call('ZSCORE', KEYS[1], ARGV[i])) == tonumber(ARGV[1]) then
+        redis.call('ZREM', KEYS[1], ARGV[i])
+        redis.call('HDEL', KEYS[2], ARGV[i])
+        removed = removed + 1
+    end
+end
+return removed
+"""
+
+# 已注册的队列, 队列名 -> DelayQueue
+queues = {}
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class DelayQueue:
+    def __init__(self, name: str, batch_size: int = 100, lease_seconds: int = 60):
+        self.name = name
+        self.key = f'{REDIS_DELAY_QUEUE_PREFIX}{name}'
+        self.payload_key = f'{REDIS_DELAY_PAYLOAD_PREFIX}{name}'
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.handler = None
+        queues[name] = self
+
+    def on_due(self, handler: Callable[[dict], dict | None]):
+        """
+        注册处理函数，参数为 {任务ID: 任务数据}，一次最多 batch_size 个
+        返回 {任务ID: 延迟秒数} 表示这些任务稍后重试，其余任务视为处理完成
+        """
+        self.handler = handler
+        return handler
+
+    def schedule(self, job_id: str, delay: float, payload: dict = None) -> None:
+        """调度任务在 delay 秒后执行，已存在时更新到期时间，payload 为空时保留原有数据"""
+        with get_redis() as redis:
+            pipe = redis.pipeline(transaction=True)
+            pipe.zadd(self.key, {job_id: _now_ms() + int(delay * 1000)})
+            if payload is not None:
+                pipe.hset(self.payload_key, job_id, json.dumps(payload, default=str))
+            pipe.execute()
+
+    def schedule_many(self, delays: dict, only_later: bool = False) -> None:
+        """批量调度，delays 为 {任务ID: 延迟秒数}，不修改任务数据，only_later 时已存在的任务只推迟不提前"""
+        if not delays:
+            return
+        now = _now_ms()
+        with get_redis() as redis:
+            redis.zadd(self.key, {job_id: now + int(delay * 1000) for job_id, delay in delays.items()}, gt=only_later)
+
+    def cancel(self, job_id: str) -> None:
+        with get_redis() as redis:
+            pipe = redis.pipeline(transaction=True)
+            pipe.zrem(self.key, job_id)
+            pipe.hdel(self.payload_key, job_id)
+            pipe.execute()
+
+    def size(self) -> int:
+        with get_redis() as redis:
+            return redis.zcard(self.key)
+
+    def claim(self) -> tuple[int, dict]:
+        """领取到期任务，返回 (租约到期时间, {任务ID: 任务数据})"""
+        now = _now_ms()
+        lease = now + self.lease_seconds * 1000
+        with get_redis() as redis:
+            job_ids, payloads = redis.eval(CLAIM_SCRIPT, 2, self.key, self.payload_key, now, self.batch_size, lease)
+        return lease, {job_id: json.loads(payload) if payload else None for job_id, payload in zip(job_ids, payloads)}
+
+    def ack(self, lease: int, job_ids) -> int:
+        job_ids = list(job_ids)
+        if not job_ids:
+            return 0
+        with get_redis() as redis:
+            return redis.eval(ACK_SCRIPT, 2, self.key, self.payload_key, lease, *job_ids)
+
+    def run_due(self, max_seconds: float = None) -> int:
+        """处理到期任务直到没有到期任务或超过 max_seconds，返回处理完成的任务数"""
+        if self.handler is None:
+            raise ValueError(f'延迟队列未注册处理函数: {self.name}')
+        started = time.monotonic()
+        done = 0
+        while max_seconds is None or time.monotonic() - started < max_seconds:
+            lease, jobs = self.claim()
+            if not jobs:
+                break
+            try:
+                retries = self.handler(jobs) or {}
+            except Exception as e:
+                logger.error(f'延迟任务处理失败({self.name})，{self.lease_seconds} 秒后重试：{e}')
+                break
+            for job_id, delay in retries.items():
+                self.schedule(job_id, delay)
+            done += self.ack(lease, [job_id for job_id in jobs if job_id not in retries])
+            if len(jobs) < self.batch_size:
+                break
+        return done
+
+
+def run_all(max_seconds: float = None) -> dict:
+    """处理所有已注册队列的到期任务，返回 {队列名: 处理完成的任务数}"""
+    return {name: queue.run_due(max_seconds) for name, queue in queues.items() if queue.handler}
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: lookup.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 18:10
+
+"""
+热点单行查询
+
+每次调用 db.query(...).filter_by(...) 都要重新构造 Query、生成缓存键并装配 ORM 实例。
+这里的语句在导入时构造一次，使用 bindparam 传值，执行时直接命中 SQLAlchemy 编译缓存；
+不需要 ORM 实例时可以返回元组或字典，省去实例装配与身份映射开销。
+"""
+
+from enum import Enum
+
+from sqlalchemy import select, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.finance import BalanceRechargeModel
+from app.models.system_option import SystemOptionModel
+from app.models.user import UserModel, RoleModel
+
+
+class ResultType(Enum):
+    """查询结果类型"""
+    MODEL = 'model'  # ORM 实例
+    ROW = 'row'  # 命名元组 Row
+    DICT = 'dict'  # 字典
+    SCALAR = 'scalar'  # 单列值, 仅 columns 只有一列时适用
+
+
+class Lookup:
+    """按单列等值查询单行"""
+
+    def __init__(self, model, column, columns: list = None):
+        self.model = model
+        where = column == bindparam('value')
+        self._model_stmt = select(model).where(where).limit(1)
+        self._row_stmt = select(*(columns or model.__table__.columns)).where(where).limit(1)
+
+    def _statement(self, result_type: ResultType):
+        return self._model_stmt if result_type == ResultType.MODEL else self._row_stmt
+
+    @staticmethod
+    def _fetch(result, result_type: ResultType):
+        if result_type == ResultType.MODEL or result_type == ResultType.SCALAR:
+            return result.scalar()
+        if result_type == ResultType.DICT:
+            row = result.mappings().first()
+            return dict(row) if row is not None else None
+        return result.first()
+
+    def first(self, db: Session, value, result_type: ResultType = ResultType.MODEL):
+        result = db.execute(self._statement(result_type), {'value': value})
+        return self._fetch(result, result_type)
+
+    async def first_async(self, db: AsyncSession, value, result_type: ResultType = ResultType.MODEL):
+        result = await db.execute(self._statement(result_type), {'value': value})
+        return self._fetch(result, result_type)
+
+
+user_by_id = Lookup(UserModel, UserModel.id)
+role_by_id = Lookup(RoleModel, RoleModel.id)
+# 登录时只需要角色的权限列表
+role_permissions_by_id = Lookup(RoleModel, RoleModel.id, [RoleModel.permissions])
+balance_recharge_by_id = Lookup(BalanceRechargeModel, BalanceRechargeModel.id)
+balance_recharge_by_trade_no = Lookup(BalanceRechargeModel, BalanceRechargeModel.trade_no)
+system_option_by_name = Lookup(SystemOptionModel, SystemOptionModel.option_name)
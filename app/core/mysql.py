@@ -5,14 +5,24 @@
 # Email: easelify@gmail.com
 # Time: 2024/05/15 21:12
 
+import itertools
 import os
-from contextlib import contextmanager
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import scoped_session, sessionmaker
 
+from app.constants.constants import REDIS_DB_STICKY_PREFIX
+from app.core import count_cache  # noqa: F401 注册列表总数缓存失效监听
+from app.core import sql_profiler  # noqa: F401 注册 SQL 性能分析监听
 from app.core.log import logger
+from app.core.pool_monitor import pool_monitor, MonitoredQueuePool, MonitoredAsyncQueuePool
+from app.core.redis import get_redis, get_async_redis
 
 load_dotenv()
 
@@ -32,26 +42,240 @@ MYSQL_CONFIG = {'host': os.getenv("DB_HOST"), 'port': int(db_port_env) if db_por
     'user': os.getenv("DB_USER"), 'password': os.getenv("DB_PWD"), 'database': os.getenv("DB_NAME"),
     'charset': os.getenv("DB_CHARSET"), }
 
+# 只读副本列表, DB_HOST_RO 支持逗号分隔多个地址, 例如: 10.0.0.2,10.0.0.3
+REPLICA_HOSTS = [host.strip() for host in (os.getenv("DB_HOST_RO") or MYSQL_CONFIG['host'] or '').split(',') if
+                 host.strip()]
+# 复制延迟超过此秒数的副本将被摘除
+replica_max_lag_env = os.getenv("DB_REPLICA_MAX_LAG")
+REPLICA_MAX_LAG = int(replica_max_lag_env) if replica_max_lag_env else 5
+# 副本健康检测间隔(秒), 每个进程在选择副本时按此间隔在后台线程中检测
+replica_probe_interval_env = os.getenv("DB_REPLICA_PROBE_INTERVAL")
+REPLICA_PROBE_INTERVAL = int(replica_probe_interval_env) if replica_probe_interval_env else 10
+# 用户写入后, 在此秒数内的只读查询仍走主库, 保证读己之写
+sticky_seconds_env = os.getenv("DB_STICKY_SECONDS")
+STICKY_SECONDS = int(sticky_seconds_env) if sticky_seconds_env else 5
 
-def get_url(read_only: bool = False) -> str:
+
+def get_url(read_only: bool = False, is_async: bool = False, host: str = None) -> str:
     if '@' in MYSQL_CONFIG["password"]:
         raise ValueError("MySQL 密码不能包含 '@' 字符")
-    if read_only:
-        MYSQL_CONFIG["host"] = os.getenv("DB_HOST_RO")
-    return 'mysql+pymysql://{user}:{password}@{host}:{port}/{database}?charset={charset}'.format(**MYSQL_CONFIG)
+    # 使用副本拼接连接串，避免只读地址污染全局配置
+    config = dict(MYSQL_CONFIG)
+    if host is not None:
+        config["host"] = host
+    elif read_only:
+        config["host"] = REPLICA_HOSTS[0]
+    config["driver"] = 'aiomysql' if is_async else 'pymysql'
+    return 'mysql+{driver}://{user}:{password}@{host}:{port}/{database}?charset={charset}'.format(**config)
+
+
+def _create_engine(url: str, name: str):
+    engine = create_engine(url, poolclass=MonitoredQueuePool, pool_pre_ping=True, pool_timeout=30, pool_recycle=-1,
+                           pool_size=pool_size, max_overflow=pool_size * 2, )
+    pool_monitor.attach(engine, name)
+    return engine
+
 
+def _create_async_engine(url: str, name: str):
+    engine = create_async_engine(url, poolclass=MonitoredAsyncQueuePool, pool_pre_ping=True, pool_timeout=30,
+                                 pool_recycle=-1, pool_size=pool_size, max_overflow=pool_size * 2, )
+    pool_monitor.attach(engine, name)
+    return engine
 
-write_engine = create_engine(get_url(read_only=False), pool_pre_ping=True, pool_timeout=30, pool_recycle=-1,
-    pool_size=pool_size, max_overflow=pool_size * 2, )
-read_engine = create_engine(get_url(read_only=True), pool_pre_ping=True, pool_timeout=30, pool_recycle=-1,
-    pool_size=pool_size, max_overflow=pool_size * 2, )
+
+write_engine = _create_engine(get_url(read_only=False), 'write')
 WriteSessionFactory = sessionmaker(bind=write_engine, autoflush=False, autocommit=False)
 WriteSession = scoped_session(WriteSessionFactory)
-ReadSessionFactory = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
-ReadSession = scoped_session(ReadSessionFactory)
 
+class LazyAsyncEngine:
+    """
+    原生 asyncio 连接池，协程等待 MySQL 响应时不占用 Starlette 线程池
+    首次获取会话时才创建，Celery 等只执行同步查询的进程不会创建
+    """
+
+    def __init__(self, url: str, name: str):
+        self.url = url
+        self.name = name
+        self.engine = None
+        self.session_factory = None
+
+    def get_session_factory(self) -> async_sessionmaker:
+        if self.session_factory is None:
+            self.engine = _create_async_engine(self.url, self.name)
+            # expire_on_commit=False: 提交后返回的模型仍可直接序列化，避免在协程外触发隐式懒加载
+            self.session_factory = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)
+        return self.session_factory
+
+    async def dispose(self) -> None:
+        if self.engine is not None:
+            await self.engine.dispose()
+
+
+async_write = LazyAsyncEngine(get_url(read_only=False, is_async=True), 'async_write')
+
+
+class Replica:
+    """只读副本，持有同步连接池，异步连接池在首次使用时创建"""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.healthy = True
+        self.lag = 0
+        self.engine = _create_engine(get_url(host=host), f'read:{host}')
+        self.session_factory = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)
+        self.session = scoped_session(self.session_factory)
+        self.async_engine = LazyAsyncEngine(get_url(host=host, is_async=True), f'async_read:{host}')
 
-def get_db(read_only: bool = False):
+    def __repr__(self):
+        return f"<Replica(host='{self.host}', healthy={self.healthy}, lag={self.lag})>"
+
+
+class ReplicaRouter:
+    """
+    只读查询路由
+    1. 在健康副本间轮询分发只读查询
+    2. 选择副本时按 REPLICA_PROBE_INTERVAL 在后台线程中探测复制延迟，Web 与 Celery 等所有进程各自探测，
+       摘除不可用或延迟过高的副本，全部不可用时回退主库
+    3. 用户写入后的短时间窗口内，该用户的只读查询走主库
+    """
+
+    def __init__(self, hosts: list[str]):
+        self.replicas = [Replica(host) for host in hosts]
+        self._cycle = itertools.cycle(self.replicas)
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # fork 时其他线程可能持有锁, 探测线程也不会被复制, 子进程中重新创建并尽快探测
+        self._lock = threading.Lock()
+        self._probing = False
+        self._probed_at = float('-inf')
+
+    def _probe_if_due(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._probing or now - self._probed_at < REPLICA_PROBE_INTERVAL:
+                return
+            self._probing = True
+            self._probed_at = now
+        threading.Thread(target=self._probe_in_background, name='mysql-replica-probe', daemon=True).start()
+
+    def _probe_in_background(self) -> None:
+        try:
+            self.probe()
+        finally:
+            self._probing = False
+
+    def choose(self) -> Replica | None:
+        # 探测在后台执行, 不阻塞本次查询, 首次探测完成前按健康处理
+        self._probe_if_due()
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = next(self._cycle)
+                if replica.healthy:
+                    return replica
+        return None
+
+    @staticmethod
+    def _replica_status(conn):
+        try:
+            return conn.execute(text('SHOW REPLICA STATUS')).mappings().first()
+        except ProgrammingError as e:
+            # MySQL 8.0.22 之前的版本及 MariaDB 不支持 SHOW REPLICA STATUS(1064 语法错误)
+            if getattr(e.orig, 'args', (None,))[0] != 1064:
+                raise
+            return conn.execute(text('SHOW SLAVE STATUS')).mappings().first()
+
+    def probe(self) -> None:
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as conn:
+                    status = self._replica_status(conn)
+                if status is None:
+                    # 非复制节点(例如开发环境直接指向主库)，视为无延迟
+                    lag = 0
+                else:
+                    # MySQL 8.0.22 之前的版本字段名为 Seconds_Behind_Master
+                    lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+                healthy = lag is not None and lag <= REPLICA_MAX_LAG
+            except Exception as e:
+                logger.warning(f'只读副本({replica.host})健康检测失败：{e}')
+                lag, healthy = None, False
+
+            if healthy != replica.healthy:
+                logger.warning(f'只读副本({replica.host})状态变更: healthy={healthy}, lag={lag}')
+            replica.healthy, replica.lag = healthy, lag
+
+    @staticmethod
+    def mark_sticky(user_id: int) -> None:
+        """标记用户刚刚发生写入，窗口期内的只读查询将路由到主库"""
+        if not user_id:
+            return
+        try:
+            with get_redis() as redis:
+                redis.set(f'{REDIS_DB_STICKY_PREFIX}{user_id}', 1, ex=STICKY_SECONDS)
+        except Exception as e:
+            logger.warning(f'写入主库粘滞标记失败：{e}')
+
+    @staticmethod
+    def is_sticky(user_id: int) -> bool:
+        if not user_id:
+            return False
+        try:
+            with get_redis() as redis:
+                return redis.exists(f'{REDIS_DB_STICKY_PREFIX}{user_id}') > 0
+        except Exception as e:
+            # 无法确认时走主库，宁可多一次主库查询也不读到旧数据
+            logger.warning(f'读取主库粘滞标记失败：{e}')
+            return True
+
+    @staticmethod
+    async def is_sticky_async(user_id: int) -> bool:
+        if not user_id:
+            return False
+        try:
+            async with get_async_redis() as redis:
+                return await redis.exists(f'{REDIS_DB_STICKY_PREFIX}{user_id}') > 0
+        except Exception as e:
+            logger.warning(f'读取主库粘滞标记失败：{e}')
+            return True
+
+    def get_scoped_session(self, read_only: bool, user_id: int = 0) -> scoped_session:
+        if not read_only or self.is_sticky(user_id):
+            return WriteSession
+        replica = self.choose()
+        return replica.session if replica is not None else WriteSession
+
+    async def get_async_session_factory(self, read_only: bool, user_id: int = 0) -> async_sessionmaker:
+        if not read_only or await self.is_sticky_async(user_id):
+            return async_write.get_session_factory()
+        replica = self.choose()
+        engine = replica.async_engine if replica is not None else async_write
+        return engine.get_session_factory()
+
+    def get_session_factory(self, read_only: bool) -> sessionmaker:
+        if not read_only:
+            return WriteSessionFactory
+        replica = self.choose()
+        return replica.session_factory if replica is not None else WriteSessionFactory
+
+
+replica_router = ReplicaRouter(REPLICA_HOSTS)
+
+# 兼容旧代码，指向第一个只读副本
+read_engine = replica_router.replicas[0].engine
+ReadSession = replica_router.replicas[0].session
+
+
+async def dispose_async_engines() -> None:
+    """关闭已创建的异步连接池"""
+    await async_write.dispose()
+    for replica in replica_router.replicas:
+        await replica.async_engine.dispose()
+
+
+def get_db(read_only: bool = False, user_id: int = 0):
     """
     依赖注入适用，在函数中使用时，需要使用 `db: Session = Depends(get_db)` 声明依赖。
     ```python
@@ -60,8 +284,9 @@ def get_db(read_only: bool = False):
     ```
     """
     db = None
+    scoped = replica_router.get_scoped_session(read_only, user_id)
     try:
-        db = WriteSession() if not read_only else ReadSession()
+        db = scoped()
         yield db
     except Exception as e:
         # https://docs.sqlalchemy.org/en/13/faq/sessions.html#this-session-s-transaction-has-been-rolled-back-due-to-a-previous-exception-during-flush-or-similar
@@ -69,18 +294,20 @@ def get_db(read_only: bool = False):
         logger.error(f"get_db(read_only={read_only}) 数据库操作发生异常，事务已回滚：{e}")
         raise
     finally:
-        if db is not None and db.is_active:
-            if not read_only:
-                WriteSession.remove()
-            else:
-                ReadSession.remove()
+        # remove 会关闭会话并归还连接, 无论会话处于何种状态都必须调用
+        scoped.remove()
 
 
 @contextmanager
-def get_session(read_only: bool = False):
+def get_session(read_only: bool = False, user_id: int = 0):
+    """
+    获取数据库会话
+    read_only=True 时在健康副本间分发, 传入 user_id 时若该用户刚发生写入则改走主库
+    """
     session = None
+    scoped = replica_router.get_scoped_session(read_only, user_id)
     try:
-        session = WriteSession() if not read_only else ReadSession()
+        session = scoped()
         yield session
     except Exception as e:
         # https://docs.sqlalchemy.org/en/13/faq/sessions.html#this-session-s-transaction-has-been-rolled-back-due-to-a-previous-exception-during-flush-or-similar
@@ -88,8 +315,48 @@ def get_session(read_only: bool = False):
         logger.error(f"get_session(read_only={read_only}) 数据库操作发生异常，事务已回滚：{e}")
         raise
     finally:
-        if session is not None and session.is_active:
-            if not read_only:
-                WriteSession.remove()
-            else:
-                ReadSession.remove()
+        # remove 会关闭会话并归还连接, 无论会话处于何种状态都必须调用
+        scoped.remove()
+
+
+@contextmanager
+def get_stream_session(read_only: bool = True):
+    """
+    获取独立(非线程绑定)的数据库会话，用于流式读取
+    StreamingResponse 会在线程池的不同线程中迭代同步生成器，scoped_session 按线程隔离，不能跨线程使用
+    """
+    session = replica_router.get_session_factory(read_only)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+async def get_async_db(read_only: bool = False, user_id: int = 0):
+    """
+    异步依赖注入适用，仅用于 `async def` 路由。
+    ```python
+    async def func(db: AsyncSession = Depends(get_async_db)):
+        pass
+    ```
+    """
+    session_factory = await replica_router.get_async_session_factory(read_only, user_id)
+    async with session_factory() as db:
+        try:
+            yield db
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"get_async_db(read_only={read_only}) 数据库操作发生异常，事务已回滚：{e}")
+            raise
+
+
+@asynccontextmanager
+async def get_async_session(read_only: bool = False, user_id: int = 0) -> AsyncSession:
+    session_factory = await replica_router.get_async_session_factory(read_only, user_id)
+    async with session_factory() as session:
+        try:
+            yield session
+        except Exception as e:
+            await session.rollback()
+            logger.error(f"get_async_session(read_only={read_only}) 数据库操作发生异常，事务已回滚：{e}")
+            raise
@@ -7,37 +7,80 @@
 
 import os
 import json
-import multiprocessing
+import threading
+import time
 from wechatpy import WeChatPay
 from app.schemas.config import Settings
 from alipay import AliPay, DCAliPay
 
+from app.core.log import logger
 from app.core.redis import get_redis
 
-from app.constants.constants import REDIS_PAYMENT_CONFIG, REDIS_SYSTEM_OPTIONS_AUTOLOAD
+from app.constants.constants import REDIS_PAYMENT_CONFIG, REDIS_PAYMENT_CONFIG_VERSION, REDIS_SYSTEM_OPTIONS_AUTOLOAD
+
+# 每个进程检查支付配置版本号的间隔秒数, 其他进程修改配置后最多延迟此时间生效
+payment_config_check_env = os.getenv("PAYMENT_CONFIG_CHECK_SECONDS")
+PAYMENT_CONFIG_CHECK_SECONDS = float(payment_config_check_env) if payment_config_check_env else 10
 
 
 class PaymentManager:
+    '''
+    支付实例注册表，每个进程各自缓存支付实例
+    读取已缓存的实例不加锁，只有创建实例时使用进程内的锁；支付配置修改后递增 Redis 中的版本号，
+    各进程定期检查版本号，变化时清空本进程的缓存
+    '''
     settings = Settings()
-    instances = {}
 
     def __init__(self):
-        manager = multiprocessing.Manager()
-        self._lock = manager.Lock()
+        self._reset()
+        # fork 出的子进程(uvicorn/Celery worker)不继承父进程的锁状态和支付实例
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._instances = {}
+        self._version = None
+        self._checked_at = 0.0
 
     def get_instance(self, channel_key: str, appid: str = None):
         '''TODO: 按支付渠道返回对应的支付实例，方便类型提示'''
         if not appid:
             appid = self._get_default_appid(channel_key)
 
-        key = f"{channel_key}_{appid}_{os.getpid()}"
+        self._check_version()
+        key = (channel_key, appid)
+        instance = self._instances.get(key)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(key)
+                if instance is None:
+                    instance = self._create_instance(channel_key, appid)
+                    self._instances[key] = instance
+        return instance
+
+    def invalidate(self):
+        '''支付配置修改后调用，清空本进程的缓存并通知其他进程'''
+        with self._lock:
+            self._instances = {}
+        with get_redis() as redis:
+            redis.incr(REDIS_PAYMENT_CONFIG_VERSION)
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._checked_at < PAYMENT_CONFIG_CHECK_SECONDS:
+            return
+        self._checked_at = now
         try:
-            self._lock.acquire()
-            if key not in self.instances:
-                self.instances[key] = self._create_instance(channel_key, appid)
-        finally:
-            self._lock.release()
-        return self.instances[key]
+            with get_redis() as redis:
+                version = redis.get(REDIS_PAYMENT_CONFIG_VERSION)
+        except Exception as e:
+            logger.warning(f'读取支付配置版本号失败：{e}')
+            return
+        if version != self._version:
+            with self._lock:
+                self._instances = {}
+                self._version = version
 
     def _get_default_appid(self, channel_key: str):
         default_config = getattr(
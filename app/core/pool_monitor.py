@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: pool_monitor.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 15:20
+
+"""
+数据库连接池监控
+1. 获取连接的等待耗时、等待超时次数
+2. 当前借出连接数、溢出连接使用量
+3. 每个连接从借出到归还的占用时长
+4. 借出超过阈值仍未归还的连接视为疑似泄漏，记录借出时的调用堆栈
+"""
+
+import os
+import threading
+import time
+import traceback
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+from app.core.log import logger
+
+# 连接借出超过此秒数未归还时视为疑似泄漏
+pool_leak_seconds_env = os.getenv("DB_POOL_LEAK_SECONDS")
+POOL_LEAK_SECONDS = int(pool_leak_seconds_env) if pool_leak_seconds_env else 30
+# 是否在借出连接时记录调用堆栈, 用于定位泄漏或长时间占用连接的代码, 每次借出都有开销, 默认关闭
+POOL_TRACE = os.getenv("DB_POOL_TRACE", "0") == "1"
+# 堆栈记录的最大帧数
+POOL_TRACE_DEPTH = 20
+
+# 耗时分布桶上限(秒), 最后一个桶统计超过最大上限的次数
+DURATION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+
+class DurationStats:
+    """耗时统计: 次数、总耗时、最大值与分布"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+    def to_dict(self) -> dict:
+        labels = [f'le_{bound}' for bound in DURATION_BUCKETS] + ['gt_max']
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count * 1000, 3) if self.count else 0,
+            'max_ms': round(self.max * 1000, 3),
+            'buckets': dict(zip(labels, self.buckets)),
+        }
+
+
+def _capture_stack() -> list[str]:
+    """只保留项目代码的调用帧，忽略 SQLAlchemy 等第三方库"""
+    frames = traceback.extract_stack()[:-1]
+    frames = [frame for frame in frames if '/app/' in frame.filename and 'pool_monitor' not in frame.filename]
+    return [f'{frame.filename}:{frame.lineno} {frame.name}' for frame in frames[-POOL_TRACE_DEPTH:]]
+
+
+class PoolStats:
+    """单个连接池的统计数据"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self._lock = threading.Lock()
+        self.wait = DurationStats()
+        self.hold = DurationStats()
+        self.timeouts = 0
+        self.checkouts = 0
+        self.max_checked_out = 0
+        self.max_overflow_used = 0
+        # id(connection_record) -> 借出信息
+        self.active: dict[int, dict] = {}
+        # 已告警过的借出记录, 避免重复打印
+        self._reported: set[int] = set()
+
+    def record_wait(self, seconds: float, timeout: bool = False) -> None:
+        with self._lock:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self.wait.add(seconds)
+
+    def on_checkout(self, connection_record) -> None:
+        info = {
+            'checkout_at': time.monotonic(),
+            'thread': threading.current_thread().name,
+            'stack': _capture_stack() if POOL_TRACE else [],
+        }
+        with self._lock:
+            self.checkouts += 1
+            self.active[id(connection_record)] = info
+            checked_out = len(self.active)
+            if checked_out > self.max_checked_out:
+                self.max_checked_out = checked_out
+            overflow = self._overflow_used()
+            if overflow > self.max_overflow_used:
+                self.max_overflow_used = overflow
+
+    def on_checkin(self, connection_record) -> None:
+        key = id(connection_record)
+        with self._lock:
+            info = self.active.pop(key, None)
+            self._reported.discard(key)
+        if info is not None:
+            self.hold.add(time.monotonic() - info['checkout_at'])
+
+    def _overflow_used(self) -> int:
+        if self.pool is None or not hasattr(self.pool, 'overflow'):
+            return 0
+        return max(self.pool.overflow(), 0)
+
+    def leaks(self, threshold: float = POOL_LEAK_SECONDS) -> list[dict]:
+        now = time.monotonic()
+        with self._lock:
+            items = list(self.active.items())
+        result = []
+        for key, info in items:
+            held = now - info['checkout_at']
+            if held >= threshold:
+                result.append({'id': key, 'held_seconds': round(held, 3), 'thread': info['thread'],
+                               'stack': info['stack']})
+        return sorted(result, key=lambda item: item['held_seconds'], reverse=True)
+
+    def report_leaks(self) -> None:
+        for leak in self.leaks():
+            if leak['id'] in self._reported:
+                continue
+            self._reported.add(leak['id'])
+            stack = '\n'.join(leak['stack']) or '(未开启 DB_POOL_TRACE)'
+            logger.warning(f'连接池({self.name})中的连接已借出 {leak["held_seconds"]} 秒未归还，'
+                           f'线程: {leak["thread"]}，借出堆栈：\n{stack}')
+
+    def to_dict(self) -> dict:
+        pool = self.pool
+        with self._lock:
+            checked_out = len(self.active)
+            data = {
+                'name': self.name,
+                'pool_size': pool.size() if pool is not None else 0,
+                'max_overflow': getattr(pool, '_max_overflow', 0),
+                'checked_out': checked_out,
+                'checked_in': pool.checkedin() if pool is not None else 0,
+                'overflow_used': self._overflow_used(),
+                'max_checked_out': self.max_checked_out,
+                'max_overflow_used': self.max_overflow_used,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait': self.wait.to_dict(),
+                'hold': self.hold.to_dict(),
+            }
+        data['leaks'] = self.leaks()
+        return data
+
+
+class _MonitoredPoolMixin:
+    """统计 _do_get 耗时，即从请求连接到拿到连接的等待时间，SQLAlchemy 没有对应的事件"""
+
+    stats: PoolStats = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection_record = super()._do_get()
+        except PoolTimeoutError:
+            if self.stats is not None:
+                self.stats.record_wait(time.perf_counter() - start, timeout=True)
+            raise
+        if self.stats is not None:
+            self.stats.record_wait(time.perf_counter() - start)
+        return connection_record
+
+    def recreate(self):
+        # engine.dispose() 会重建连接池，统计对象随之转移
+        pool = super().recreate()
+        pool.stats = self.stats
+        if self.stats is not None:
+            self.stats.pool = pool
+        return pool
+
+
+class MonitoredQueuePool(_MonitoredPoolMixin, QueuePool):
+    pass
+
+
+class MonitoredAsyncQueuePool(_MonitoredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class PoolMonitor:
+    def __init__(self):
+        self.pools: dict[str, PoolStats] = {}
+
+    def attach(self, engine, name: str) -> None:
+        """为引擎注册监控，engine 可以是同步或异步引擎"""
+        sync_engine = getattr(engine, 'sync_engine', engine)
+        stats = PoolStats(name)
+        stats.pool = sync_engine.pool
+        sync_engine.pool.stats = stats
+        self.pools[name] = stats
+
+        @event.listens_for(sync_engine, 'checkout')
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            stats.on_checkout(connection_record)
+
+        @event.listens_for(sync_engine, 'checkin')
+        def on_checkin(dbapi_connection, connection_record):
+            stats.on_checkin(connection_record)
+
+    def report_leaks(self) -> None:
+        for stats in self.pools.values():
+            stats.report_leaks()
+
+    def to_dict(self) -> dict:
+        return {
+            'leak_seconds': POOL_LEAK_SECONDS,
+            'trace': POOL_TRACE,
+            'pools': [stats.to_dict() for stats in self.pools.values()],
+        }
+
+
+pool_monitor = PoolMonitor()
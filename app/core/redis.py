@@ -6,9 +6,10 @@
 # Time: 2024/05/15 21:12
 
 import os
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
 
 import redis
+import redis.asyncio
 from dotenv import load_dotenv
 from redis import Connection
 
@@ -24,6 +25,7 @@ max_connections = int(redis_pull_size_env) if redis_pull_size_env else 5
 REDIS_CONFIG = {'host': os.getenv("REDIS_HOST"), 'port': int(redis_port_env) if redis_port_env else 6379,
     'password': os.getenv("REDIS_PWD"), 'db': int(redis_db_env) if redis_db_env else 0, 'decode_responses': True}
 pool = redis.ConnectionPool(Connection, max_connections, **REDIS_CONFIG)
+async_pool = redis.asyncio.ConnectionPool(max_connections=max_connections, **REDIS_CONFIG)
 
 
 @contextmanager
@@ -32,6 +34,45 @@ def get_redis():
     yield r
 
 
+@asynccontextmanager
+async def get_async_redis():
+    """异步 Redis 客户端，仅用于 `async def` 路由和服务"""
+    r = redis.asyncio.Redis(connection_pool=async_pool)
+    yield r
+
+
+# KEYS[1] 消息流，ARGV[1] 消费组，删除该组已确认的消息：
+# 最早的待确认消息之前的消息均已确认，没有待确认消息时最后投递的消息之前的消息均已确认
+TRIM_ACKED_SCRIPT = """
+local min_id = redis.call('XPENDING', KEYS[1], ARGV[1])[2]
+if not min_id then
+    for _, info in ipairs(redis.call('XINFO', 'GROUPS', KEYS[1])) do
+        local fields = {}
+        for i = 1, #info, 2 do
+            fields[info[i]] = info[i + 1]
+        end
+        if fields['name'] == ARGV[1] then
+            min_id = fields['last-delivered-id']
+        end
+    end
+end
+if not min_id then
+    return 0
+end
+return redis.call('XTRIM', KEYS[1], 'MINID', '~', min_id)
+"""
+# 消费者裁剪消息流的间隔秒数
+STREAM_TRIM_SECONDS = 10
+
+
+def trim_acked(r, stream: str, group: str) -> int:
+    """
+    裁剪消息流中已被消费组确认的消息，返回删除的条数
+    写入时不按长度裁剪，积压时按长度裁剪会删除已投递但尚未确认的消息
+    """
+    return r.eval(TRIM_ACKED_SCRIPT, 1, stream, group)
+
+
 def get_redis_url(db_index: int = -1) -> str:
     usr = os.getenv("REDIS_USR")
     pwd = os.getenv("REDIS_PWD")
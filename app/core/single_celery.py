@@ -5,15 +5,40 @@
 # Email: qiuyutang@qq.com
 # Time: 2024/5/24 16:36
 
+import bisect
+import hashlib
+import json
 import os
+from typing import NamedTuple
 from dotenv import load_dotenv
 from celery import Celery
-from app.core.redis import get_redis_url
+from app.constants.constants import REDIS_FINANCE_ROUTE_PREFIX, REDIS_FINANCE_STREAM_PREFIX
+from app.core.log import logger
+from app.core.redis import get_redis_url, get_redis
 
 load_dotenv()
 db_index = int(os.getenv('REDIS_DB_FINANCE')) if os.getenv(
     'REDIS_DB_FINANCE') else 1
 redis_url = get_redis_url(db_index=db_index)
+# 动账余额由钱包行锁保证正确，不再依赖单进程串行
+worker_concurrency_env = os.getenv('FINANCE_WORKER_CONCURRENCY')
+worker_concurrency = int(worker_concurrency_env) if worker_concurrency_env else 1
+# 动账队列分区数, 每个分区由一个单并发 worker 消费
+partitions_env = os.getenv('FINANCE_PARTITIONS')
+FINANCE_PARTITIONS = int(partitions_env) if partitions_env else 1
+# 分区数调整后, 用户在此秒数内没有新的动账才切换到新分区, 期间继续使用旧分区以保证顺序
+route_ttl_env = os.getenv('FINANCE_ROUTE_TTL')
+FINANCE_ROUTE_TTL = int(route_ttl_env) if route_ttl_env else 600
+FINANCE_QUEUE_PREFIX = 'single_worker_queue_'
+# 批量动账模式, 动账写入各分区的 Redis Stream, 由 app.finance_batch_worker 攒批入库
+FINANCE_BATCH = os.getenv('FINANCE_BATCH') == '1'
+# 每批最多处理的动账条数
+batch_size_env = os.getenv('FINANCE_BATCH_SIZE')
+FINANCE_BATCH_SIZE = int(batch_size_env) if batch_size_env else 200
+# 不足一批时最多等待的毫秒数
+batch_linger_env = os.getenv('FINANCE_BATCH_LINGER_MS')
+FINANCE_BATCH_LINGER_MS = int(batch_linger_env) if batch_linger_env else 50
+FINANCE_STREAM_GROUP = 'finance_batch'
 app_single = Celery('single_worker', broker=redis_url, backend=redis_url)
 
 app_single.conf.update(
@@ -24,6 +49,80 @@ app_single.conf.update(
     enable_utc=True,
     broker_connection_retry_on_startup=True,
     task_default_queue='single_worker_queue',
-    worker_concurrency=1,
+    worker_concurrency=worker_concurrency,
     include=['app.tasks.finance'],
 )
+
+
+class HashRing:
+    """一致性哈希环，分区数变化时只有约 1/N 的用户需要迁移"""
+
+    def __init__(self, nodes: list[str], replicas: int = 160):
+        self._ring = sorted((self._hash(f'{node}#{i}'), node) for node in nodes for i in range(replicas))
+        self._keys = [key for key, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+    def get(self, key) -> str:
+        index = bisect.bisect(self._keys, self._hash(str(key))) % len(self._keys)
+        return self._ring[index][1]
+
+
+FINANCE_QUEUES = [f'{FINANCE_QUEUE_PREFIX}{i}' for i in range(FINANCE_PARTITIONS)]
+finance_ring = HashRing(FINANCE_QUEUES)
+
+# KEYS[1] 用户的队列路由，ARGV 依次为哈希分区、路由保留秒数、当前所有分区
+# 上次使用的队列仍是当前分区时继续使用，已被移除的分区没有 worker 启动，改用哈希分区
+ROUTE_SCRIPT = """
+local queue = ARGV[1]
+local previous = redis.call('GET', KEYS[1])
+if previous and previous ~= queue then
+    for i = 3, #ARGV do
+        if ARGV[i] == previous then
+            queue = previous
+            break
+        end
+    end
+end
+redis.call('SET', KEYS[1], queue, 'EX', ARGV[2])
+return queue
+"""
+
+
+def get_finance_queue(user_id: int) -> str:
+    """
+    按用户ID选择动账队列，同一用户始终进入同一队列，由单并发 worker 按顺序消费
+    用户最近使用的队列记录在 Redis 中，增加分区后，仍有未消费任务的用户继续使用旧队列，
+    空闲超过 FINANCE_ROUTE_TTL 后再切换到新队列，避免同一用户的任务在新旧队列中乱序；
+    减少分区后，路由到已移除分区的用户立即切换到哈希分区，读取和写入路由在同一个 Lua 脚本中完成
+    """
+    queue = finance_ring.get(user_id)
+    try:
+        with get_redis() as redis:
+            queue = redis.eval(ROUTE_SCRIPT, 1, f'{REDIS_FINANCE_ROUTE_PREFIX}{user_id}', queue, FINANCE_ROUTE_TTL,
+                               *FINANCE_QUEUES)
+    except Exception as e:
+        logger.warning(f'读取动账队列路由失败，使用哈希分区：{e}')
+    return queue
+
+
+def get_finance_stream(queue: str) -> str:
+    return f'{REDIS_FINANCE_STREAM_PREFIX}{queue}'
+
+
+class StreamMessage(NamedTuple):
+    """批量动账模式下的投递结果, 与 AsyncResult 一样通过 id 引用"""
+    id: str
+
+
+def dispatch(task, data: dict):
+    """投递动账任务到用户所属分区"""
+    queue = get_finance_queue(data['user_id'])
+    if not FINANCE_BATCH:
+        return task.apply_async(args=[data], queue=queue)
+    with get_redis() as redis:
+        message_id = redis.xadd(get_finance_stream(queue),
+                                {'task': task.name.rsplit('.', 1)[-1], 'data': json.dumps(data, default=str)})
+    return StreamMessage(message_id)
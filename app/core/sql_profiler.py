@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: sql_profiler.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 16:30
+
+"""
+SQL 性能分析
+1. 统计每个请求执行的语句数量、总耗时，以及重复执行的相同语句(N+1)
+2. 超过阈值的慢查询输出 EXPLAIN 执行计划
+3. 按语句汇总滚动窗口内的执行次数与耗时，提供 Top N 报告，可按比例抽样
+生产环境默认关闭，需要时设置 SQL_PROFILER=1 开启
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.log import logger
+
+RUNTIME_MODE = os.getenv("RUNTIME_MODE")
+sql_profiler_env = os.getenv("SQL_PROFILER")
+SQL_PROFILER = sql_profiler_env == "1" if sql_profiler_env else RUNTIME_MODE != "PROD"
+# 慢查询阈值(毫秒)
+sql_slow_ms_env = os.getenv("SQL_SLOW_MS")
+SQL_SLOW_MS = int(sql_slow_ms_env) if sql_slow_ms_env else 200
+# 单个请求内相同语句执行次数达到此值时视为 N+1
+sql_repeat_threshold_env = os.getenv("SQL_REPEAT_THRESHOLD")
+SQL_REPEAT_THRESHOLD = int(sql_repeat_threshold_env) if sql_repeat_threshold_env else 5
+# 汇总统计的滚动窗口(秒)
+sql_stats_window_env = os.getenv("SQL_STATS_WINDOW")
+SQL_STATS_WINDOW = int(sql_stats_window_env) if sql_stats_window_env else 3600
+# 计入汇总统计的语句比例(0~1), 汇总统计中的次数和耗时为抽样值
+sql_stats_sample_env = os.getenv("SQL_STATS_SAMPLE")
+SQL_STATS_SAMPLE = float(sql_stats_sample_env) if sql_stats_sample_env else 1.0
+# 汇总统计、N+1 统计和 EXPLAIN 记录最多保留的语句数量, 超过时淘汰最久未出现的语句
+SQL_STATS_MAX_STATEMENTS = 2000
+# 同一条语句的 EXPLAIN 最少间隔(秒)
+EXPLAIN_INTERVAL = 600
+# 非生产环境在响应头中返回本次请求的 SQL 统计
+SQL_PROFILER_HEADERS = RUNTIME_MODE != "PROD"
+
+EXPLAIN_PREFIXES = ('select', 'update', 'delete', 'insert', 'replace')
+_whitespace = re.compile(r'\s+')
+_placeholders = r'\((?:%\(\w+\)s|%s|\?)(?:, (?:%\(\w+\)s|%s|\?))*\)'
+# IN 列表和多行 VALUES 的长度随参数变化, 合并为同一条语句
+_in_list = re.compile(rf'\bIN {_placeholders}', re.IGNORECASE)
+_values_rows = re.compile(rf'(\bVALUES {_placeholders})(?:, ?{_placeholders})+', re.IGNORECASE)
+
+
+def normalize(statement: str) -> str:
+    statement = _whitespace.sub(' ', statement).strip()
+    statement = _in_list.sub('IN (...)', statement)
+    return _values_rows.sub(r'\1, ...', statement)
+
+
+def _touch(items: OrderedDict, key: str, default):
+    """读取或新建条目并移到末尾, 超过 SQL_STATS_MAX_STATEMENTS 时淘汰最久未出现的条目"""
+    item = items.get(key)
+    if item is None:
+        if len(items) >= SQL_STATS_MAX_STATEMENTS:
+            items.popitem(last=False)
+        item = items[key] = default
+    else:
+        items.move_to_end(key)
+    return item
+
+
+class RequestProfile:
+    """单个请求的 SQL 统计"""
+
+    def __init__(self, path: str = ''):
+        self.path = path
+        self.count = 0
+        self.total = 0.0
+        self.statements: dict[str, int] = {}
+
+    def add(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def repeated(self, threshold: int = SQL_REPEAT_THRESHOLD) -> list[tuple[str, int]]:
+        items = [(statement, count) for statement, count in self.statements.items() if count >= threshold]
+        return sorted(items, key=lambda item: item[1], reverse=True)
+
+    def max_repeat(self) -> int:
+        return max(self.statements.values(), default=0)
+
+    def headers(self) -> list[tuple[bytes, bytes]]:
+        return [
+            (b'x-sql-count', str(self.count).encode()),
+            (b'x-sql-time-ms', f'{self.total * 1000:.2f}'.encode()),
+            (b'x-sql-max-repeat', str(self.max_repeat()).encode()),
+        ]
+
+
+_current_profile: ContextVar[RequestProfile | None] = ContextVar('sql_profile', default=None)
+
+
+class StatementStats:
+    """滚动窗口内按语句汇总的执行统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.window_start = time.time()
+        self.stats: OrderedDict[str, list] = OrderedDict()
+        self.previous: OrderedDict[str, list] = OrderedDict()
+        self.previous_start = None
+        # 一个请求内重复执行次数达到阈值的语句 -> [出现次数, 单请求最大重复次数, 最近路径]
+        self.repeats: OrderedDict[str, list] = OrderedDict()
+        self._explained: OrderedDict[str, float] = OrderedDict()
+
+    def _rotate(self, now: float) -> None:
+        if now - self.window_start < SQL_STATS_WINDOW:
+            return
+        self.previous, self.previous_start = self.stats, self.window_start
+        self.stats, self.repeats = OrderedDict(), OrderedDict()
+        self.window_start = now
+
+    def add(self, statement: str, seconds: float) -> None:
+        with self._lock:
+            self._rotate(time.time())
+            item = _touch(self.stats, statement, [0, 0.0, 0.0])
+            item[0] += 1
+            item[1] += seconds
+            if seconds > item[2]:
+                item[2] = seconds
+
+    def add_repeats(self, profile: RequestProfile) -> None:
+        with self._lock:
+            for statement, count in profile.repeated():
+                item = _touch(self.repeats, statement, [0, 0, ''])
+                item[0] += 1
+                item[1] = max(item[1], count)
+                item[2] = profile.path
+
+    def should_explain(self, statement: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(statement, -EXPLAIN_INTERVAL) < EXPLAIN_INTERVAL:
+                return False
+            _touch(self._explained, statement, now)
+            self._explained[statement] = now
+            return True
+
+    def top(self, limit: int = 20, order_by: str = 'total') -> dict:
+        index = {'count': 0, 'total': 1, 'max': 2}.get(order_by, 1)
+        with self._lock:
+            self._rotate(time.time())
+            stats = self.stats if self.stats or not self.previous else self.previous
+            window_start = self.window_start if stats is self.stats else self.previous_start
+            items = sorted(stats.items(), key=lambda item: item[1][index], reverse=True)[:limit]
+            repeats = sorted(self.repeats.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return {
+            'window_start': window_start,
+            'window_seconds': SQL_STATS_WINDOW,
+            'statements': [{'statement': statement, 'count': count, 'total_ms': round(total * 1000, 3),
+                            'avg_ms': round(total / count * 1000, 3), 'max_ms': round(max_ * 1000, 3)}
+                           for statement, (count, total, max_) in items],
+            'repeats': [{'statement': statement, 'requests': requests, 'max_repeat': max_repeat, 'path': path}
+                        for statement, (requests, max_repeat, path) in repeats],
+        }
+
+
+statement_stats = StatementStats()
+
+
+def _explain(conn, statement: str, parameters) -> None:
+    try:
+        result = conn.exec_driver_sql(f'EXPLAIN {statement}', parameters,
+                                      execution_options={'sql_profiler_skip': True})
+        plan = [dict(row) for row in result.mappings()]
+        logger.warning(f'慢查询执行计划：{plan}')
+    except Exception as e:
+        logger.info(f'慢查询 EXPLAIN 失败：{e}')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._sql_profiler_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not SQL_PROFILER or context is None or context.execution_options.get('sql_profiler_skip'):
+        return
+    start = getattr(context, '_sql_profiler_start', None)
+    if start is None:
+        return
+    seconds = time.perf_counter() - start
+    normalized = normalize(statement)
+
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.add(normalized, seconds)
+    if SQL_STATS_SAMPLE >= 1 or random.random() < SQL_STATS_SAMPLE:
+        statement_stats.add(normalized, seconds)
+
+    if seconds * 1000 < SQL_SLOW_MS:
+        return
+    path = f'{profile.path} ' if profile is not None else ''
+    logger.warning(f'{path}慢查询({seconds * 1000:.2f}ms)：{normalized}，参数：{parameters}')
+    # 流式结果集未读完前同一连接不能执行其他语句, EXPLAIN 使用未合并参数的原语句
+    if (not executemany and not context.execution_options.get('stream_results')
+            and normalized.lower().startswith(EXPLAIN_PREFIXES) and statement_stats.should_explain(normalized)):
+        _explain(conn, _whitespace.sub(' ', statement).strip(), parameters)
+
+
+class SQLProfilerMiddleware:
+    """
+    ASGI 中间件，为每个请求建立 SQL 统计上下文
+    需要最后注册，使其位于最外层，内层中间件和线程池中执行的同步路由都会继承该上下文
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not SQL_PROFILER:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(f'{scope["method"]} {scope["path"]}')
+        token = _current_profile.set(profile)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start' and SQL_PROFILER_HEADERS:
+                # 流式响应在发送响应头之后执行的语句不计入响应头，仍计入日志
+                message.setdefault('headers', [])
+                message['headers'] = list(message['headers']) + profile.headers()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
+            repeated = profile.repeated()
+            if repeated:
+                statement_stats.add_repeats(profile)
+                details = '；'.join(f'{count} 次: {statement}' for statement, count in repeated)
+                logger.warning(f'{profile.path} 疑似 N+1 查询，共执行 {profile.count} 条语句，重复语句：{details}')
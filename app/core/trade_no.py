@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: trade_no.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/19 03:00
+
+"""
+按时间递增的交易号
+
+uuid4 交易号在唯一索引上随机插入，造成页分裂和缓冲池换入换出，改为按时间递增的交易号，新记录总是写入索引末尾。
+交易号共 29 位，由三段定长字段组成，按字符串排序即按生成时间排序：
+1. 毫秒时间 17 位，本地时间 yyyymmddHHMMSSfff，对账时可直接看出下单时间
+2. 进程号 8 位十六进制，由主机名和 PID 哈希得到，fork 后在子进程中重新计算
+3. 毫秒内序号 4 位十六进制，每个进程每毫秒最多 65536 个，用完时借用下一毫秒
+同一进程内严格递增，时钟回拨时沿用上次的时间继续递增；不同进程之间按毫秒有序
+"""
+
+import hashlib
+import os
+import socket
+import threading
+import time
+
+# 每毫秒的序号上限
+SEQUENCE_LIMIT = 0x10000
+
+
+def _worker_id() -> str:
+    return hashlib.blake2b(f'{socket.gethostname()}:{os.getpid()}'.encode(), digest_size=4).hexdigest()
+
+
+class TradeNoGenerator:
+    def __init__(self):
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # fork 时其他线程可能持有锁, 子进程中重新创建
+        self._lock = threading.Lock()
+        self.worker_id = _worker_id()
+        self._last_ms = 0
+        self._sequence = 0
+        # 当前秒的时间前缀缓存, (秒, yyyymmddHHMMSS)
+        self._second = (None, '')
+
+    def _prefix(self, ms: int) -> str:
+        second = ms // 1000
+        if self._second[0] != second:
+            self._second = (second, time.strftime('%Y%m%d%H%M%S', time.localtime(second)))
+        return f'{self._second[1]}{ms % 1000:03d}'
+
+    def next(self) -> str:
+        with self._lock:
+            ms = time.time_ns() // 1_000_000
+            if ms > self._last_ms:
+                self._last_ms = ms
+                self._sequence = 0
+            else:
+                # 同一毫秒内或时钟回拨
+                self._sequence += 1
+                if self._sequence >= SEQUENCE_LIMIT:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return f'{self._prefix(self._last_ms)}{self.worker_id}{self._sequence:04x}'
+
+
+generator = TradeNoGenerator()
+
+
+def new_trade_no() -> str:
+    """生成充值订单交易号"""
+    return generator.next()
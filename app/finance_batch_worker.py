@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: finance_batch_worker.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 20:10
+
+"""
+批量动账 worker, 每个分区运行一个实例
+用法：python -m app.finance_batch_worker --partition 0
+"""
+
+import argparse
+
+from app.core.single_celery import FINANCE_BATCH_SIZE, FINANCE_BATCH_LINGER_MS, FINANCE_QUEUE_PREFIX
+from app.tasks.finance_batch import LedgerBatchWorker
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='批量动账 worker')
+    parser.add_argument('--partition', type=int, required=True, help='分区序号')
+    parser.add_argument('--batch-size', type=int, default=FINANCE_BATCH_SIZE)
+    parser.add_argument('--linger-ms', type=int, default=FINANCE_BATCH_LINGER_MS)
+    args = parser.parse_args()
+
+    LedgerBatchWorker(f'{FINANCE_QUEUE_PREFIX}{args.partition}', args.batch_size, args.linger_ms).run()
@@ -42,6 +42,7 @@ class ${model}ListResponse(BaseModel):
     """响应数据模型"""
     total: int
     items: List[${model}Item]
+    next_cursor: Optional[str] = None
 
 
 class ${model}PublicListResponse(BaseModel):
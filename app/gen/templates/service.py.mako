@@ -13,6 +13,7 @@ from app.core.mysql import get_session
 from app.models.${module_name} import ${model_name}
 from app.schemas.schemas import StatusType, MysqlBoolType
 from app.schemas.${snake_name} import ${model}Form, SearchQuery
+from app.utils.pagination import paginate
 
 
 def get(id: int) -> ${model_name} | None:
@@ -24,15 +25,9 @@ def get(id: int) -> ${model_name} | None:
 
 
 def lists(params: SearchQuery) -> dict:
-    total = -1
-    export = True if params.export == 1 else False
     with get_session(read_only=True) as db:
         query = db.query(${model_name}).order_by(desc('id'))
-        if not export:
-            total = query.count()
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return {"total": total, "items": query.all()}
+        return paginate(query, ${model_name}, params)
 
 
 def add(params: ${model}Form) -> None:
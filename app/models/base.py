@@ -5,6 +5,7 @@
 # Email: easelify@gmail.com
 # Time: 2024/05/16 11:18
 
+from sqlalchemy.dialects.mysql import insert
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -32,6 +33,38 @@ class BaseMixin:
             return result
         return {}
 
+    @classmethod
+    def bulk_upsert(cls, db, rows: list[dict], chunk_size: int = 1000, update_fields: list[str] = None) -> int:
+        """
+        批量写入，主键或唯一索引冲突时更新
+        使用 INSERT ... ON DUPLICATE KEY UPDATE，每批通过 executemany 合并为一条多行 INSERT，不经过 ORM 工作单元
+        rows 中每行的字段必须一致，update_fields 默认为除主键外的全部写入字段，事务由调用方提交
+        """
+        if not rows:
+            return 0
+        table = cls.__table__
+        fields = [c.key for c in table.columns if c.key in rows[0]]
+        if update_fields is None:
+            update_fields = [key for key in fields if not table.columns[key].primary_key]
+
+        stmt = insert(table)
+        if update_fields:
+            stmt = stmt.on_duplicate_key_update({key: stmt.inserted[key] for key in update_fields})
+        else:
+            # 没有需要更新的字段时，冲突行保持不变
+            primary_key = table.primary_key.columns.values()[0].key
+            stmt = stmt.on_duplicate_key_update({primary_key: stmt.inserted[primary_key]})
+
+        affected = 0
+        for start in range(0, len(rows), chunk_size):
+            chunk = [{key: row.get(key) for key in fields} for row in rows[start:start + chunk_size]]
+            affected += db.execute(stmt, chunk).rowcount
+
+        # 绕过了 ORM 工作单元，手动登记以便提交后失效列表总数缓存
+        from app.core.count_cache import mark_changed
+        mark_changed(db, cls.__tablename__)
+        return affected
+
 
 # 导入所有模型，以支持 alembic 自动追踪
 from app.models import user, finance, cms, system_option, payment_settings, wechat
@@ -5,7 +5,7 @@
 # Email: easelify@gmail.com
 # Time: 2024/05/17 12:39
 
-from sqlalchemy import text, Column, Integer, SmallInteger, String, DECIMAL, TIMESTAMP
+from sqlalchemy import text, Index, Column, Integer, SmallInteger, String, DECIMAL, TIMESTAMP
 from sqlalchemy.dialects.mysql import MEDIUMTEXT
 
 from app.models.base import Base, BaseMixin
@@ -37,13 +37,18 @@ class PostCategoryModel(Base, BaseMixin):
 
 class PostModel(Base, BaseMixin):
     __tablename__ = 'cms_post'
-    __table_args__ = {
-        'mysql_charset': 'utf8mb4',
-        'mysql_collate': 'utf8mb4_unicode_ci',
-        'mysql_engine': 'InnoDB',
-        'mariadb_engine': 'InnoDB',
-        'comment': '文章'
-    }
+    __table_args__ = (
+        # 全文索引, 使用 ngram 解析器支持中文, 替代 LIKE '%keyword%' 全表扫描, 需关闭停用词后创建
+        Index('ft_cms_post_title', 'title', mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+        Index('ft_cms_post_keywords', 'keywords', mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+        {
+            'mysql_charset': 'utf8mb4',
+            'mysql_collate': 'utf8mb4_unicode_ci',
+            'mysql_engine': 'InnoDB',
+            'mariadb_engine': 'InnoDB',
+            'comment': '文章'
+        }
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True, comment='ID')
     pid = Column(Integer, server_default='0', index=True, comment='上级ID')
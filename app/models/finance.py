@@ -5,7 +5,8 @@
 # Email: easelify@gmail.com
 # Time: 2024/05/17 11:45
 
-from sqlalchemy import text, Text, Index, Column, Integer, SmallInteger, String, DECIMAL, TIMESTAMP
+from sqlalchemy import text, Text, Index, Column, Integer, BigInteger, SmallInteger, String, DECIMAL, TIMESTAMP, select
+from sqlalchemy.dialects.mysql import insert
 
 from app.models.base import Base, BaseMixin
 
@@ -14,6 +15,7 @@ class BalanceModel(Base, BaseMixin):
     __tablename__ = 'user_balance'
     __table_args__ = (
         Index(None, 'user_id', 'type'),
+        Index('uk_user_balance_idempotent', 'user_id', 'type', 'idempotent_id', unique=True),
         Index(None, 'user_id', 'created_at'),
         {
             'mysql_charset': 'utf8mb4',
@@ -29,6 +31,9 @@ class BalanceModel(Base, BaseMixin):
     user_id = Column(Integer, nullable=False, comment='用户ID')
     # related_id 与 type 字段一起可确认关联模型，单独看此字段没有意义
     related_id = Column(Integer, server_default='0', index=True, comment='关联ID')
+    # 需要幂等的动账类型(充值、退款等与订单一一对应的动账)等于 related_id, 其余为 NULL,
+    # 与 user_id、type 组成唯一键, 重复动账插入时触发唯一键冲突
+    idempotent_id = Column(Integer, comment='幂等关联ID')
     amount = Column(DECIMAL(10, 4), nullable=False, comment='动账金额')
     balance = Column(DECIMAL(10, 4), nullable=False, comment='当前余额')
     ip = Column(String(50), comment='IP')
@@ -47,6 +52,7 @@ class BalanceGiftModel(Base, BaseMixin):
     __tablename__ = 'user_balance_gift'
     __table_args__ = (
         Index(None, 'user_id', 'type'),
+        Index('uk_user_balance_gift_idempotent', 'user_id', 'type', 'idempotent_id', unique=True),
         Index(None, 'user_id', 'created_at'),
         {
             'mysql_charset': 'utf8mb4',
@@ -62,6 +68,9 @@ class BalanceGiftModel(Base, BaseMixin):
     user_id = Column(Integer, nullable=False, comment='用户ID')
     # related_id 与 type 字段一起可确认关联模型，单独看此字段没有意义
     related_id = Column(Integer, server_default='0', index=True, comment='关联ID')
+    # 需要幂等的动账类型(充值、退款等与订单一一对应的动账)等于 related_id, 其余为 NULL,
+    # 与 user_id、type 组成唯一键, 重复动账插入时触发唯一键冲突
+    idempotent_id = Column(Integer, comment='幂等关联ID')
     amount = Column(DECIMAL(10, 4), nullable=False, comment='动账金额')
     balance = Column(DECIMAL(10, 4), nullable=False, comment='当前余额')
     ip = Column(String(50), comment='IP')
@@ -80,6 +89,7 @@ class PointModel(Base, BaseMixin):
     __tablename__ = 'user_point'
     __table_args__ = (
         Index(None, 'user_id', 'type'),
+        Index('uk_user_point_idempotent', 'user_id', 'type', 'idempotent_id', unique=True),
         Index(None, 'user_id', 'created_at'),
         {
             'mysql_charset': 'utf8mb4',
@@ -95,6 +105,9 @@ class PointModel(Base, BaseMixin):
     user_id = Column(Integer, nullable=False, comment='用户ID')
     # related_id 与 type 字段一起可确认关联模型，单独看此字段没有意义
     related_id = Column(Integer, server_default='0', index=True, comment='关联ID')
+    # 需要幂等的动账类型(充值、退款等与订单一一对应的动账)等于 related_id, 其余为 NULL,
+    # 与 user_id、type 组成唯一键, 重复动账插入时触发唯一键冲突
+    idempotent_id = Column(Integer, comment='幂等关联ID')
     amount = Column(Integer, nullable=False, comment='动账点数')
     balance = Column(Integer, nullable=False, comment='当前余额')
     ip = Column(String(50), comment='IP')
@@ -109,6 +122,45 @@ class PointModel(Base, BaseMixin):
         return f"<PointModel(id={self.id}, user_id={self.user_id}, balance={self.balance})>"
 
 
+class WalletModel(Base, BaseMixin):
+    __tablename__ = 'user_wallet'
+    __table_args__ = {
+        'mysql_charset': 'utf8mb4',
+        'mysql_collate': 'utf8mb4_unicode_ci',
+        'mysql_engine': 'InnoDB',
+        'mariadb_engine': 'InnoDB',
+        'comment': '用户钱包'
+    }
+
+    # 每个用户一行, 与流水在同一事务中原子更新, 流水表的 balance 字段为动账后的快照
+    user_id = Column(Integer, primary_key=True, autoincrement=False, comment='用户ID')
+    balance = Column(DECIMAL(10, 4), nullable=False, server_default='0', comment='余额')
+    balance_gift = Column(DECIMAL(10, 4), nullable=False, server_default='0', comment='赠送余额')
+    point = Column(Integer, nullable=False, server_default='0', comment='积分')
+    # 每次动账加 1, 余额缓存据此丢弃旧值
+    version = Column(BigInteger, nullable=False, server_default='0', comment='版本号')
+    created_at = Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'), comment='创建时间')
+    updated_at = Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+                        comment='更新时间')
+
+    @classmethod
+    def increase(cls, db, user_id: int, field: str, amount) -> int | float:
+        """
+        原子增减钱包字段(balance/balance_gift/point)并返回动账后的值，需与流水写入在同一事务中提交
+        INSERT ... ON DUPLICATE KEY UPDATE 同时处理首次动账，语句对该用户的钱包行加排他锁直到事务结束，
+        同一用户的并发动账在此排队，不同用户互不影响
+        """
+        column = getattr(cls, field)
+        stmt = insert(cls).values(user_id=user_id, version=1, **{field: amount})
+        stmt = stmt.on_duplicate_key_update({field: column + stmt.inserted[field], 'version': cls.version + 1})
+        db.execute(stmt)
+        return db.execute(select(column).where(cls.user_id == user_id)).scalar_one()
+
+    def __repr__(self):
+        return f"<WalletModel(user_id={self.user_id}, balance={self.balance}, balance_gift={self.balance_gift}, " \
+               f"point={self.point}, version={self.version})>"
+
+
 class PaymentAccountModel(Base, BaseMixin):
     __tablename__ = 'user_payment_account'
     __table_args__ = (
@@ -218,6 +270,9 @@ class BalanceRechargeModel(Base, BaseMixin):
     __tablename__ = 'user_balance_recharge'
     __table_args__ = (
         Index(None, 'user_id', 'payment_status'),
+        # 财务统计按创建时间分时段汇总, 按更新时间找出状态有变化的时段
+        Index('ix_user_balance_recharge_created_at', 'created_at'),
+        Index('ix_user_balance_recharge_updated_at', 'updated_at'),
         {
             'mysql_charset': 'utf8mb4',
             'mysql_collate': 'utf8mb4_unicode_ci',
@@ -267,6 +322,9 @@ class PointRechargeModel(Base, BaseMixin):
     __tablename__ = 'user_point_recharge'
     __table_args__ = (
         Index(None, 'user_id', 'payment_status'),
+        # 财务统计按创建时间分时段汇总, 按更新时间找出状态有变化的时段
+        Index('ix_user_point_recharge_created_at', 'created_at'),
+        Index('ix_user_point_recharge_updated_at', 'updated_at'),
         {
             'mysql_charset': 'utf8mb4',
             'mysql_collate': 'utf8mb4_unicode_ci',
@@ -311,3 +369,37 @@ class PointRechargeModel(Base, BaseMixin):
 
     def __repr__(self):
         return f"<PointRechargeModel(id={self.id}, user_id={self.user_id}, amount={self.amount})>"
+
+
+class FinanceRollupModel(Base, BaseMixin):
+    __tablename__ = 'finance_rollup'
+    __table_args__ = (
+        Index('uk_finance_rollup', 'source', 'granularity', 'bucket', 'type', 'payment_channel', 'payment_status',
+              unique=True),
+        {
+            'mysql_charset': 'utf8mb4',
+            'mysql_collate': 'utf8mb4_unicode_ci',
+            'mysql_engine': 'InnoDB',
+            'mariadb_engine': 'InnoDB',
+            'comment': '财务统计'
+        }
+    )
+
+    # 由 app.services.finance_rollup 定时汇总, 充值订单按支付渠道和状态、流水按动账类型分组
+    id = Column(Integer, primary_key=True, autoincrement=True, comment='ID')
+    source = Column(String(32), nullable=False, comment='数据来源: balance_recharge/point_recharge/balance/point')
+    granularity = Column(String(8), nullable=False, comment='统计粒度: hour/day')
+    bucket = Column(TIMESTAMP, nullable=False, comment='时段开始时间')
+    type = Column(SmallInteger, nullable=False, server_default='0', comment='动账类型, 充值订单为0')
+    payment_channel = Column(String(50), nullable=False, server_default='', comment='支付渠道, 流水为空')
+    payment_status = Column(SmallInteger, nullable=False, server_default='-1', comment='支付状态, 流水为-1')
+    count = Column(Integer, nullable=False, server_default='0', comment='笔数')
+    amount = Column(DECIMAL(16, 4), nullable=False, server_default='0', comment='金额合计, 充值订单为支付金额')
+    quantity = Column(DECIMAL(16, 4), nullable=False, server_default='0', comment='充值数量合计')
+    gift = Column(DECIMAL(16, 4), nullable=False, server_default='0', comment='赠送数量合计')
+    last_id = Column(Integer, nullable=False, server_default='0', comment='已汇总的最大流水ID, 仅流水按小时统计使用')
+    updated_at = Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+                        comment='更新时间')
+
+    def __repr__(self):
+        return f"<FinanceRollupModel(source={self.source}, granularity={self.granularity}, bucket={self.bucket})>"
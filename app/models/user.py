@@ -57,13 +57,17 @@ class PermissionModel(Base, BaseMixin):
 
 class UserModel(Base, BaseMixin):
     __tablename__ = 'user_account'
-    __table_args__ = {
-        'mysql_charset': 'utf8mb4',
-        'mysql_collate': 'utf8mb4_unicode_ci',
-        'mysql_engine': 'InnoDB',
-        'mariadb_engine': 'InnoDB',
-        'comment': '用户'
-    }
+    __table_args__ = (
+        # 全文索引, 使用 ngram 解析器支持中文, 需关闭停用词(innodb_ft_enable_stopword=OFF)后创建
+        Index('ft_user_account_nickname', 'nickname', mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+        {
+            'mysql_charset': 'utf8mb4',
+            'mysql_collate': 'utf8mb4_unicode_ci',
+            'mysql_engine': 'InnoDB',
+            'mariadb_engine': 'InnoDB',
+            'comment': '用户'
+        }
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True, comment='ID')
     pid = Column(Integer, server_default='0', index=True, comment='所属上级')
@@ -149,7 +153,8 @@ class LoginlogModel(Base, BaseMixin):
     ip = Column(String(50), comment='IP地址')
     user_agent = Column(String(500), comment='浏览器信息')
     memo = Column(String(255), comment='备注')
-    created_at = Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'), comment='创建时间')
+    # 表按 created_at 月度分区, 数据库主键为 (id, created_at), 见 app.services.archive
+    created_at = Column(TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'), comment='创建时间')
 
     def __repr__(self):
         return f"<LoginlogModel(id={self.id}, nickname='{self.nickname}')>"
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: notify_worker.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/19 00:30
+
+"""
+支付异步通知 worker, 可运行多个实例
+用法：python -m app.notify_worker --processes 4
+"""
+
+import argparse
+
+from app.services.payment_notify import NOTIFY_BATCH_SIZE, NOTIFY_BATCH_LINGER_MS, NOTIFY_VERIFY_PROCESSES
+from app.tasks.payment_notify import NotifyWorker
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='支付异步通知 worker')
+    parser.add_argument('--batch-size', type=int, default=NOTIFY_BATCH_SIZE)
+    parser.add_argument('--linger-ms', type=int, default=NOTIFY_BATCH_LINGER_MS)
+    parser.add_argument('--processes', type=int, default=NOTIFY_VERIFY_PROCESSES, help='验签进程数')
+    args = parser.parse_args()
+
+    NotifyWorker(args.batch_size, args.linger_ms, args.processes).run()
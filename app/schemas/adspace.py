@@ -41,6 +41,7 @@ class AdspaceListResponse(BaseModel):
     """响应数据模型"""
     total: int
     items: List[AdspaceItem]
+    next_cursor: Optional[str] = None
 
 
 class AdspacePublicListResponse(BaseModel):
@@ -69,6 +69,7 @@ class BalanceRechargeListResponse(BaseModel):
     """响应数据模型"""
     total: int
     items: List[BalanceRechargeItem]
+    next_cursor: Optional[str] = None
 
 
 class BalanceRechargePublicListResponse(BaseModel):
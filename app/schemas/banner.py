@@ -58,6 +58,7 @@ class BannerListResponse(BaseModel):
     """响应数据模型"""
     total: int
     items: List[BannerItem]
+    next_cursor: Optional[str] = None
 
 
 class BannerPublicListResponse(BaseModel):
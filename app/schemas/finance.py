@@ -73,6 +73,8 @@ class PaymentChannelType(Enum):
 class SearchQuery(PaginationParams):
     user_id: Optional[int] = 0
     type: Optional[int] = 0
+    created_start: Optional[datetime] = None
+    created_end: Optional[datetime] = None
 
 
 class AdjustForm(BaseModel):
@@ -176,6 +178,13 @@ class BalanceRechargeSettingListResponse(BaseModel):
     items: List[BalanceRechargeSettingItem]
 
 
+class BalancesItem(BaseModel):
+    """用户余额、赠送余额和积分"""
+    balance: float = Field(0, description="余额")
+    balance_gift: float = Field(0, description="赠送余额")
+    point: int = Field(0, description="积分")
+
+
 class RechargeForm(BaseModel):
     """充值表单，余额和积分充值共用此表单"""
     sku_id: int = Field(ge=0, description="充值套餐id，从0开始, 来至充值设置")
@@ -208,3 +217,59 @@ class ScanpayForm(BaseModel):
         if value not in ['alipay', 'wechat']:
             raise ValueError('客户端类型错误')
         return value
+
+
+class OrderWaitQuery(BaseModel):
+    timeout: int = Field(25, ge=1, le=60, description="最长等待秒数, 超时后返回当前状态(SSE 结束连接)")
+
+
+class RollupSource(Enum):
+    """财务统计数据来源"""
+    BALANCE_RECHARGE = 'balance_recharge'  # 余额充值订单
+    POINT_RECHARGE = 'point_recharge'  # 积分充值订单
+    BALANCE = 'balance'  # 余额流水
+    POINT = 'point'  # 积分流水
+
+
+class RollupGranularity(Enum):
+    HOUR = 'hour'
+    DAY = 'day'
+
+
+class StatisticsQuery(BaseModel):
+    source: RollupSource = Field(description="数据来源")
+    granularity: Optional[RollupGranularity] = Field(RollupGranularity.DAY, description="统计粒度")
+    start: datetime = Field(description="开始时间(含)")
+    end: datetime = Field(description="结束时间(不含)")
+    type: Optional[int] = Field(None, description="动账类型, 仅流水有效")
+    payment_channel: Optional[str] = Field(None, description="支付渠道, 仅充值订单有效")
+    payment_status: Optional[int] = Field(None, description="支付状态, 仅充值订单有效")
+
+
+class StatisticsItem(BaseModel):
+    bucket: Optional[datetime] = Field(None, description="时段开始时间, 汇总接口为空")
+    type: int = Field(description="动账类型, 充值订单为0")
+    payment_channel: str = Field(description="支付渠道, 流水为空")
+    payment_status: int = Field(description="支付状态, 流水为-1")
+    count: int = Field(description="笔数")
+    amount: float = Field(description="金额合计, 充值订单为支付金额")
+    quantity: float = Field(description="充值数量合计")
+    gift: float = Field(description="赠送数量合计")
+
+
+class CheckinResult(BaseModel):
+    points: int = Field(description="获得积分")
+    keep_days: int = Field(description="连续签到天数")
+    total_days: int = Field(description="累计签到天数")
+
+
+class CheckinCalendarQuery(BaseModel):
+    month: Optional[str] = Field(None, pattern=r'^\d{4}-(0[1-9]|1[0-2])$', description="月份 YYYY-MM, 默认本月")
+
+
+class CheckinCalendarItem(BaseModel):
+    month: str = Field(description="月份 YYYY-MM")
+    days: List[int] = Field(description="当月已签到的日期")
+    checked_today: bool = Field(description="今天是否已签到")
+    keep_days: int = Field(description="连续签到天数")
+    total_days: int = Field(description="累计签到天数")
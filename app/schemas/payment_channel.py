@@ -44,6 +44,7 @@ class PaymentChannelListResponse(BaseModel):
     """响应数据模型"""
     total: int
     items: List[PaymentChannelItem]
+    next_cursor: Optional[str] = None
 
 
 class PaymentChannelPublicListResponse(BaseModel):
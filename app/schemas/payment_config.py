@@ -67,6 +67,7 @@ class PaymentConfigListResponse(BaseModel):
     """响应数据模型"""
     total: int
     items: List[PaymentConfigItem]
+    next_cursor: Optional[str] = None
 
 
 class PaymentConfigPublicListResponse(BaseModel):
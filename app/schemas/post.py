@@ -59,6 +59,7 @@ class PostListResponse(BaseModel):
     """响应数据模型"""
     total: int
     items: List[PostItem]
+    next_cursor: Optional[str] = None
 
 
 class PostPublicListResponse(BaseModel):
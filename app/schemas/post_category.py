@@ -42,6 +42,7 @@ class PostCategoryListResponse(BaseModel):
     """响应数据模型"""
     total: int
     items: List[PostCategoryItem]
+    next_cursor: Optional[str] = None
 
 
 class PostCategoryPublicListResponse(BaseModel):
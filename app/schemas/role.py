@@ -39,6 +39,7 @@ class RoleListResponse(BaseModel):
     """响应数据模型"""
     total: int
     items: List[RoleItem]
+    next_cursor: Optional[str] = None
 
 
 class RolePublicListResponse(BaseModel):
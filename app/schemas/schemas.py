@@ -6,10 +6,10 @@
 # Time: 2024/05/19 10:06
 
 from enum import Enum
-from typing import Optional
+from typing import Annotated, Optional
 
 from fastapi import Query
-from pydantic import BaseModel
+from pydantic import AfterValidator, BaseModel
 
 
 class StatusType(Enum):
@@ -34,10 +34,37 @@ class ClientType(Enum):
     IOS_APP = 'ios_app'
 
 
+class ExportFormat(Enum):
+    """导出文件格式"""
+    CSV = 'csv'
+    XLSX = 'xlsx'
+
+
+def _validate_cursor(value: str) -> str:
+    # pagination 依赖本模块, 在函数内导入避免循环导入
+    from app.utils.pagination import decode_cursor
+
+    decode_cursor(value)
+    return value
+
+
 class PaginationParams(BaseModel):
     page: Optional[int] = Query(1, ge=1, description="页码")
     size: Optional[int] = Query(10, ge=1, le=100, description="每页条数")
     export: Optional[int] = Query(0, ge=0, le=1, description="是否导出数据")
+    # 在参数校验阶段解码, 无效游标返回 422 而不是在查询时抛出异常
+    cursor: Optional[Annotated[str, AfterValidator(_validate_cursor)]] = Query(
+        None, description="游标分页: 首页传空字符串, 之后传上一页返回的 next_cursor, 传入时忽略 page 且不统计总数")
+    export_format: Optional[ExportFormat] = Query(ExportFormat.CSV, description="导出文件格式, export=1 时有效")
+
+
+class ExportJobResponse(BaseModel):
+    job_id: str
+    resource: str
+    format: str
+    status: str = 'pending'
+    rows: Optional[int] = 0
+    error: Optional[str] = None
 
 
 class ResponseSuccess(BaseModel):
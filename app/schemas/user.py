@@ -102,10 +102,18 @@ class UserPublicItem(BaseModel):
     join_at: Optional[datetime] = Field(None, description='注册时间')
 
 
+class UserMeItem(UserPublicItem):
+    """当前用户数据模型, 附带余额和积分"""
+    balance: float = Field(0, description='余额')
+    balance_gift: float = Field(0, description='赠送余额')
+    point: int = Field(0, description='积分')
+
+
 class UserListResponse(BaseModel):
     """响应数据模型"""
     total: int
     items: List[UserItem]
+    next_cursor: Optional[str] = None
 
 
 class UserPublicListResponse(BaseModel):
@@ -56,6 +56,7 @@ class WechatListResponse(BaseModel):
     """响应数据模型"""
     total: int
     items: List[WechatItem]
+    next_cursor: Optional[str] = None
 
 
 class WechatPublicListResponse(BaseModel):
@@ -11,6 +11,7 @@ from app.core.mysql import get_session
 from app.models.cms import AdspaceModel
 from app.schemas.adspace import AdspaceForm, SearchQuery
 from app.schemas.schemas import StatusType
+from app.utils.pagination import paginate
 
 
 def get(id: int) -> AdspaceModel | None:
@@ -21,16 +22,15 @@ def get(id: int) -> AdspaceModel | None:
         return None
 
 
+def build_query(db, params: SearchQuery):
+    """构建广告位查询，列表与导出共用"""
+    return db.query(AdspaceModel).order_by(desc('id'))
+
+
 def lists(params: SearchQuery) -> dict:
-    total = -1
-    export = True if params.export == 1 else False
     with get_session(read_only=True) as db:
-        query = db.query(AdspaceModel).order_by(desc('id'))
-        if not export:
-            total = query.count()
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return {"total": total, "items": query.all()}
+        query = build_query(db, params)
+        return paginate(query, AdspaceModel, params)
 
 
 def add(params: AdspaceForm) -> None:
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: archive.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 21:00
+
+"""
+只追加的大表按月归档
+
+超过 ARCHIVE_MONTHS 个月的数据按月导出为 runtime/archive/<表名>/<年月>.parquet(或 .csv.gz)后从 MySQL 删除：
+1. 按月 RANGE 分区的表(登录日志)直接删除整个分区，并提前创建未来几个月的分区
+2. 流水表有 (user_id, type, idempotent_id) 唯一键，MySQL 要求分区键包含在所有唯一键中，无法按时间分区，
+   归档后按主键分段删除
+流水删除后其幂等键随之删除，动账幂等只在 ARCHIVE_MONTHS 个月内有效，重放更早的动账任务会重复入账；
+余额以 user_wallet 为准，不能再用最后一条流水的 balance 作为当前余额
+"""
+
+import gzip
+import os
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select, delete, func, text, Integer, SmallInteger, DECIMAL, TIMESTAMP
+
+from app.constants.constants import RUNTIME_PATH
+from app.core.log import logger
+from app.core.mysql import get_session, get_stream_session
+from app.models.finance import BalanceModel, BalanceGiftModel, PointModel
+from app.models.user import LoginlogModel
+
+# 归档文件存放目录
+ARCHIVE_PATH = os.path.join(RUNTIME_PATH, 'archive')
+
+# MySQL 中保留的月数(不含当月)，更早的数据归档
+archive_months_env = os.getenv("ARCHIVE_MONTHS")
+ARCHIVE_MONTHS = int(archive_months_env) if archive_months_env else 12
+
+# 归档文件格式: parquet / csv
+ARCHIVE_FORMAT = os.getenv("ARCHIVE_FORMAT") or 'parquet'
+
+# 分区表提前创建的月份数
+PARTITIONS_AHEAD = 3
+
+# 导出时每次拉取、删除时每次删除的行数
+ARCHIVE_CHUNK_SIZE = 20000
+
+FILE_SUFFIXES = {'parquet': '.parquet', 'csv': '.csv.gz'}
+
+
+class ArchiveTable(NamedTuple):
+    model: type
+    # True: 按月 RANGE 分区，归档后删除分区；False: 归档后按主键分段删除
+    partitioned: bool
+
+
+ARCHIVE_TABLES = {
+    'user_balance': ArchiveTable(BalanceModel, False),
+    'user_balance_gift': ArchiveTable(BalanceGiftModel, False),
+    'user_point': ArchiveTable(PointModel, False),
+    'user_loginlog': ArchiveTable(LoginlogModel, True),
+}
+
+
+class ArchiveMonth(NamedTuple):
+    # 年月，如 202401
+    label: str
+    # 起始时间，为 None 时包含更早的全部数据(第一个分区)
+    start: Optional[datetime]
+    end: datetime
+    partition: Optional[str] = None
+
+
+def month_start(value: datetime, months: int = 0) -> datetime:
+    """value 所在月份偏移 months 个月后的第一天零点"""
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def archive_cutoff(now: datetime = None) -> datetime:
+    """早于此时间的数据应已归档"""
+    return month_start(now or datetime.now(), -ARCHIVE_MONTHS)
+
+
+def is_archived_range(created_start: Optional[datetime]) -> bool:
+    """查询起始时间早于归档分界时需要同时查询归档文件"""
+    return created_start is not None and created_start < archive_cutoff()
+
+
+def _partition_name(month: datetime) -> str:
+    return f'p{month:%Y%m}'
+
+
+def _list_partitions(db, table: str) -> list[tuple[str, str]]:
+    """返回 [(分区名, 上界表达式), ...]，按分区顺序排列，表未分区时返回空列表"""
+    rows = db.execute(text(
+        'SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS '
+        'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL '
+        'ORDER BY PARTITION_ORDINAL_POSITION'), {'table': table}).all()
+    return [(row[0], row[1]) for row in rows]
+
+
+def ensure_partitions(db, table: str, now: datetime = None) -> list[str]:
+    """从 pmax 中拆分出当月至未来 PARTITIONS_AHEAD 个月的分区，返回新建的分区名"""
+    existing = {name for name, _ in _list_partitions(db, table)}
+    if 'pmax' not in existing:
+        logger.warning(f'{table} 未按月分区，跳过创建分区')
+        return []
+    now = now or datetime.now()
+    created = []
+    definitions = []
+    for i in range(PARTITIONS_AHEAD + 1):
+        month = month_start(now, i)
+        name = _partition_name(month)
+        if name in existing:
+            continue
+        created.append(name)
+        definitions.append(f"PARTITION {name} VALUES LESS THAN (UNIX_TIMESTAMP('{month_start(month, 1)}'))")
+    if definitions:
+        definitions.append('PARTITION pmax VALUES LESS THAN MAXVALUE')
+        db.execute(text(f'ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ({", ".join(definitions)})'))
+        logger.info(f'{table} 新建分区 {", ".join(created)}')
+    return created
+
+
+def _pending_months(db, table: str, info: ArchiveTable, cutoff: datetime) -> list[ArchiveMonth]:
+    """列出早于 cutoff 需要归档的月份"""
+    model = info.model
+    if info.partitioned:
+        months = []
+        start = None
+        for name, _ in _list_partitions(db, table):
+            if name == 'pmax':
+                break
+            month = datetime.strptime(name[1:], '%Y%m')
+            end = month_start(month, 1)
+            if end > cutoff:
+                break
+            months.append(ArchiveMonth(name[1:], start, end, name))
+            start = end
+        return months
+
+    first = db.execute(select(func.min(model.created_at))).scalar()
+    months = []
+    month = month_start(first) if first else cutoff
+    while month < cutoff:
+        months.append(ArchiveMonth(f'{month:%Y%m}', month, month_start(month, 1)))
+        month = month_start(month, 1)
+    return months
+
+
+def _month_condition(model, month: ArchiveMonth):
+    conditions = [model.created_at < month.end]
+    if month.start is not None:
+        conditions.append(model.created_at >= month.start)
+    return conditions
+
+
+def _arrow_schema(model):
+    import pyarrow as pa
+
+    fields = []
+    for column in model.__table__.columns:
+        if isinstance(column.type, (Integer, SmallInteger)):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, DECIMAL):
+            arrow_type = pa.decimal128(column.type.precision, column.type.scale)
+        elif isinstance(column.type, TIMESTAMP):
+            arrow_type = pa.timestamp('s')
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.key, arrow_type))
+    return pa.schema(fields)
+
+
+def archive_file(table: str, label: str, archive_format: str = None) -> str:
+    return os.path.join(ARCHIVE_PATH, table, f'{label}{FILE_SUFFIXES[archive_format or ARCHIVE_FORMAT]}')
+
+
+def _write_month(table: str, info: ArchiveTable, month: ArchiveMonth) -> int:
+    """导出一个月的数据到归档文件，先写临时文件再改名，返回行数"""
+    import pandas as pd
+
+    model = info.model
+    path = archive_file(table, month.label)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.part'
+    columns = [column.key for column in model.__table__.columns]
+    stmt = select(*model.__table__.columns).where(*_month_condition(model, month)).order_by(model.id)
+    rows = 0
+    # 归档后会删除数据，从主库读取，避免从库延迟导致漏导
+    with get_stream_session(read_only=False) as db:
+        result = db.execute(stmt.execution_options(yield_per=ARCHIVE_CHUNK_SIZE))
+        if ARCHIVE_FORMAT == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = _arrow_schema(model)
+            with pq.ParquetWriter(tmp_path, schema, compression='zstd') as writer:
+                for chunk in result.partitions():
+                    writer.write_table(pa.Table.from_pylist([dict(zip(columns, row)) for row in chunk], schema))
+                    rows += len(chunk)
+        else:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as f:
+                for chunk in result.partitions():
+                    pd.DataFrame(chunk, columns=columns).to_csv(f, header=rows == 0, index=False)
+                    rows += len(chunk)
+    os.replace(tmp_path, path)
+    return rows
+
+
+def _purge_month(table: str, info: ArchiveTable, month: ArchiveMonth) -> None:
+    model = info.model
+    with get_session() as db:
+        if month.partition:
+            db.execute(text(f'ALTER TABLE {table} DROP PARTITION {month.partition}'))
+            return
+        min_id, max_id = db.execute(select(func.min(model.id), func.max(model.id)).where(
+            *_month_condition(model, month))).one()
+        if min_id is None:
+            return
+        # 分段删除，避免大事务长时间持锁和主从延迟
+        for start_id in range(min_id, max_id + 1, ARCHIVE_CHUNK_SIZE):
+            db.execute(delete(model).where(model.id >= start_id, model.id < start_id + ARCHIVE_CHUNK_SIZE,
+                                           *_month_condition(model, month)))
+            db.commit()
+
+
+def archive_table(table: str, now: datetime = None) -> int:
+    """归档一张表，返回归档的行数"""
+    info = ARCHIVE_TABLES[table]
+    model = info.model
+    cutoff = archive_cutoff(now)
+    with get_session() as db:
+        if info.partitioned:
+            ensure_partitions(db, table, now)
+        months = _pending_months(db, table, info, cutoff)
+
+    total = 0
+    for month in months:
+        with get_session() as db:
+            expected = db.execute(select(func.count()).select_from(model).where(
+                *_month_condition(model, month))).scalar()
+        if expected:
+            rows = _write_month(table, info, month)
+            # 导出期间不应再有该月份的新数据写入，行数不一致时保留数据，下次重新归档
+            if rows != expected:
+                logger.error(f'{table} {month.label} 归档行数不一致: 导出 {rows} 行, 应为 {expected} 行')
+                continue
+            total += rows
+        _purge_month(table, info, month)
+        logger.info(f'{table} {month.label} 已归档 {expected} 行')
+    return total
+
+
+def archive_all(now: datetime = None) -> dict:
+    result = {}
+    for table in ARCHIVE_TABLES:
+        try:
+            result[table] = archive_table(table, now)
+        except Exception as e:
+            logger.error(f'{table} 归档失败：{e}')
+    return result
+
+
+def has_archive(table: str) -> bool:
+    directory = os.path.join(ARCHIVE_PATH, table)
+    return os.path.isdir(directory) and any(name.endswith(tuple(FILE_SUFFIXES.values()))
+                                            for name in os.listdir(directory))
+
+
+def _read_file(model, path: str, filters: dict):
+    import pandas as pd
+
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, filters=[(key, '==', value) for key, value in filters.items()] or None,
+                               dtype_backend='numpy_nullable')
+    columns = model.__table__.columns
+    # 金额按字符串读取，避免转为浮点数
+    df = pd.read_csv(path, compression='gzip', dtype={c.key: str for c in columns if isinstance(c.type, DECIMAL)},
+                     parse_dates=[c.key for c in columns if isinstance(c.type, TIMESTAMP)])
+    for key, value in filters.items():
+        df = df[df[key] == value]
+    return df
+
+
+def read_archive(table: str, filters: dict, created_start: datetime = None, created_end: datetime = None,
+                 before_id: int = 0, limit: int = 10, offset: int = 0) -> list[dict]:
+    """
+    按 id 倒序读取归档数据，filters 为等值条件，before_id 大于 0 时只返回 id 小于该值的数据
+    按月份从新到旧读取文件，取够 offset + limit 条即停止
+    """
+    directory = os.path.join(ARCHIVE_PATH, table)
+    if not os.path.isdir(directory):
+        return []
+    files = sorted((name for name in os.listdir(directory) if name.endswith(tuple(FILE_SUFFIXES.values()))),
+                   reverse=True)
+    rows = []
+    for name in files:
+        month = datetime.strptime(name[:6], '%Y%m')
+        if created_end and month > created_end:
+            continue
+        if created_start and month_start(month, 1) <= created_start:
+            break
+        df = _read_file(ARCHIVE_TABLES[table].model, os.path.join(directory, name), filters)
+        if created_start:
+            df = df[df['created_at'] >= created_start]
+        if created_end:
+            df = df[df['created_at'] <= created_end]
+        if before_id > 0:
+            df = df[df['id'] < before_id]
+        df = df.sort_values('id', ascending=False)
+        # NaN/NaT 转为 None
+        rows += df.astype(object).where(df.notna(), None).to_dict('records')
+        if len(rows) >= offset + limit:
+            break
+    return rows[offset:offset + limit]
@@ -5,73 +5,80 @@
 # Time: 2024-08-23 22:09
 
 
+import asyncio
 import json
 import time
-import uuid
 from datetime import datetime
 from typing import Optional
 from urllib.parse import urlencode
 
-from sqlalchemy.sql.expression import desc, text
+from sqlalchemy.sql.expression import desc
 
 from app.constants.constants import REDIS_SYSTEM_OPTIONS_AUTOLOAD
+from app.core import gateway
+from app.core import lookup
 from app.core.log import logger
-from app.core.mysql import get_session
+from app.core.mysql import get_session, replica_router
 from app.core.payment import payment_manager
 from app.core.redis import get_redis
-from app.models.finance import BalanceModel, BalanceGiftModel, BalanceRechargeModel
+from app.core.single_celery import dispatch
+from app.core.trade_no import new_trade_no
+from app.models.finance import BalanceRechargeModel, WalletModel
 from app.schemas.balance_recharge import BalanceRechargeForm
 from app.schemas.balance_recharge import SearchQuery
 from app.schemas.config import Settings
 from app.schemas.finance import BalanceType, PaymentStatusType, RechargeForm, PayForm, PaymentChannelType
 from app.schemas.schemas import ClientType
+from app.services import order_close
+from app.services import order_status
 from app.tasks.finance import handle_balance, handle_balance_gift
+from app.utils.pagination import paginate
 
 
 def get(id: Optional[int] = 0, trade_no: Optional[str] = None) -> BalanceRechargeModel | None:
     with get_session(read_only=True) as db:
         if id > 0:
-            return db.query(BalanceRechargeModel).filter(BalanceRechargeModel.id == id).first()
+            return lookup.balance_recharge_by_id.first(db, id)
         elif trade_no is not None:
-            return db.query(BalanceRechargeModel).filter(BalanceRechargeModel.trade_no == trade_no).first()
+            return lookup.balance_recharge_by_trade_no.first(db, trade_no)
         else:
             raise ValueError('id 和 trade_no 至少传入一项')
 
 
+def build_query(db, params: SearchQuery):
+    """构建充值订单查询，列表与导出共用"""
+    query = db.query(BalanceRechargeModel).order_by(desc('id'))
+    if params.user_id:
+        query = query.filter(
+            BalanceRechargeModel.user_id == params.user_id)
+    if params.trade_no:
+        query = query.filter(
+            BalanceRechargeModel.trade_no.like(f'%{params.trade_no}%'))
+    if isinstance(params.payment_status, PaymentStatusType):
+        query = query.filter(
+            BalanceRechargeModel.payment_status == params.payment_status.value)
+    if isinstance(params.payment_channel, PaymentChannelType):
+        query = query.filter(
+            BalanceRechargeModel.payment_channel == params.payment_channel.value)
+    if isinstance(params.created_start, datetime):
+        query = query.filter(
+            BalanceRechargeModel.created_at >= params.created_start)
+    if isinstance(params.created_end, datetime):
+        query = query.filter(
+            BalanceRechargeModel.created_at <= params.created_end)
+    if isinstance(params.payment_start, datetime):
+        query = query.filter(
+            BalanceRechargeModel.payment_time >= params.payment_start)
+    if isinstance(params.payment_end, datetime):
+        query = query.filter(
+            BalanceRechargeModel.payment_time <= params.payment_end)
+    return query
+
+
 def lists(params: SearchQuery) -> dict:
-    total = -1
-    export = True if params.export == 1 else False
     with get_session(read_only=True) as db:
-        query = db.query(BalanceRechargeModel).order_by(desc('id'))
-        if params.user_id:
-            query = query.filter(
-                BalanceRechargeModel.user_id == params.user_id)
-        if params.trade_no:
-            query = query.filter(
-                BalanceRechargeModel.trade_no.like(f'%{params.trade_no}%'))
-        if isinstance(params.payment_status, PaymentStatusType):
-            query = query.filter(
-                BalanceRechargeModel.payment_status == params.payment_status.value)
-        if isinstance(params.payment_channel, PaymentChannelType):
-            query = query.filter(
-                BalanceRechargeModel.payment_channel == params.payment_channel.value)
-        if isinstance(params.created_start, datetime):
-            query = query.filter(
-                BalanceRechargeModel.created_at >= params.created_start)
-        if isinstance(params.created_end, datetime):
-            query = query.filter(
-                BalanceRechargeModel.created_at <= params.created_end)
-        if isinstance(params.payment_start, datetime):
-            query = query.filter(
-                BalanceRechargeModel.payment_time >= params.payment_start)
-        if isinstance(params.payment_end, datetime):
-            query = query.filter(
-                BalanceRechargeModel.payment_time <= params.payment_end)
-        if not export:
-            total = query.count()
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return {"total": total, "items": query.all()}
+        query = build_query(db, params)
+        return paginate(query, BalanceRechargeModel, params, estimate=True)
 
 
 def add(params: BalanceRechargeForm) -> None:
@@ -116,8 +123,8 @@ def get_recharge_settings() -> list:
 
 
 def check_order(trade_no: str, user_id: int) -> BalanceRechargeModel:
-    with get_session(read_only=True) as db:
-        current_model = db.query(BalanceRechargeModel).filter_by(trade_no=trade_no).first()
+    with get_session(read_only=True, user_id=user_id) as db:
+        current_model = lookup.balance_recharge_by_trade_no.first(db, trade_no)
         if current_model is None or current_model.user_id != user_id:
             raise ValueError('订单不存在')
     return current_model
@@ -148,7 +155,7 @@ def unifiedorder(params: RechargeForm, user_id: int, user_ip: str) -> dict:
         sku['origin_price'] = params.price
         sku['amount'] = params.price * sku["exchange_rate"]
 
-    trade_no = str(uuid.uuid4()).replace('-', '')
+    trade_no = new_trade_no()
     with get_session() as db:
         new_order = BalanceRechargeModel()
         new_order.from_dict({
@@ -162,6 +169,10 @@ def unifiedorder(params: RechargeForm, user_id: int, user_ip: str) -> dict:
         })
         db.add(new_order)
         db.commit()
+    order_close.schedule_close('balance', trade_no)
+    order_status.init('balance', trade_no, user_id)
+    # 新订单写入主库后立即被轮询检查, 短时间内该用户的只读查询走主库, 避免副本延迟导致订单不存在
+    replica_router.mark_sticky(user_id)
 
     # 返回H5收银台地址, 由前端生成二维码, 用户扫码进入此页面进行支付
     params = {
@@ -178,8 +189,8 @@ def unifiedorder(params: RechargeForm, user_id: int, user_ip: str) -> dict:
     }
 
 
-def pay(params: PayForm, user_data: dict) -> dict:
-    """TODO: 定义返回数据模型"""
+def _prepare_pay(params: PayForm, user_data: dict) -> tuple:
+    """检查订单状态并记录 OPENID, 返回 (支付金额, 用户IP, 配置, 支付实例)"""
     with get_session() as db:
         order_model = db.query(BalanceRechargeModel).filter_by(trade_no=params.trade_no).first()
         if order_model is None or order_model.user_id != user_data[
@@ -189,22 +200,35 @@ def pay(params: PayForm, user_data: dict) -> dict:
         price = order_model.price
         user_ip = order_model.user_ip
 
-        # 更新订单创建时间, 防止被关单进程关闭此订单, 非抢购，无需此操作
+        # 关单任务推迟到本次支付的有效期之后, 无需更新订单创建时间
         # order_model.created_at = datetime.now()
 
         if params.openid is not None:
             order_model.back_memo = f'OPENID:{params.openid}'
         db.commit()
+    # 微信支付使用默认支付配置, 与 pay 中获取的支付实例一致
+    appid = params.appid if params.channel == PaymentChannelType.ALIPAY.value else None
+    order_close.schedule_close('balance', params.trade_no, params.channel, appid)
+    # 读取配置文件和创建支付实例都是同步调用, 一并在线程中完成
+    if params.channel == PaymentChannelType.ALIPAY.value:
+        client = payment_manager.get_instance('alipay', params.appid)
+    else:
+        client = payment_manager.get_instance('wechat')
+    return price, user_ip, Settings(), client
+
+
+async def pay(params: PayForm, user_data: dict) -> dict:
+    """TODO: 定义返回数据模型"""
+    price, user_ip, settings, client = await asyncio.to_thread(_prepare_pay, params, user_data)
 
-    settings = Settings()
     if params.channel == 'wechatpay':
         # TODO: 待测试
         openid = params.openid if params.openid and params.openid.lower(
         ) != 'none' else user_data['wechat_openid']
         if openid is None:
             raise ValueError('您的账号尚未绑定微信')
-        wechatpy = payment_manager.get_instance('wechat')
-        result = wechatpy.order.create(
+        result = await gateway.wechat_unified_order(
+            client,
             trade_type='JSAPI',
             body='余额充值',
             out_trade_no=params.trade_no,
@@ -237,8 +261,7 @@ def pay(params: PayForm, user_data: dict) -> dict:
                 raise ValueError('不支持的客户端类型')
 
         product_code = 'FAST_INSTANT_TRADE_PAY'
-        alipay = payment_manager.get_instance('alipay', params.appid)
-        order_string = alipay.client_api(
+        order_string = client.client_api(
             api_name,
             biz_content={
                 "out_trade_no": params.trade_no,
@@ -249,101 +272,36 @@ def pay(params: PayForm, user_data: dict) -> dict:
             return_url=return_url,
             notify_url=f"{settings.ENDPOINT.pay.rstrip('/')}/api/v1/frontend/balance_recharges/alipay/notify"
         )
-        return {'url': f"{alipay._gateway}?{order_string}"}
-
-
-def notify(payment_channel: str, params: dict, content: str = None) -> bool:
-    """TODO: 1. 赠送余额入账"""
-    logger.info(f'收到异步通知: {payment_channel}', extra=params)
-    if payment_channel == PaymentChannelType.ALIPAY.value:
-        signature = params.pop('sign')
-        appid = params.get('app_id', None)
-        alipay = payment_manager.get_instance('alipay', appid=appid)
-        try:
-            success = alipay.verify(params, signature)
-        except:
-            logger.error(f'签名验证失败: {payment_channel}', extra=params)
-            return False
-        if not success:
-            logger.error(f'签名验证失败: {payment_channel}', extra=params)
-            return False
-        is_ok = True if params["trade_status"] in (
-            "TRADE_SUCCESS", "TRADE_FINISHED") else False
-    elif payment_channel == PaymentChannelType.WECHATPAY.value:
-        # 如果是微信小程序支付, appid 返回的是小程序的 appid, 由于已经做了缓存适配，可以直接使用 appid 参数
-        appid = params.get('appid', None)
-        wechatpy = payment_manager.get_instance('wechat', appid=appid)
-        try:
-            params = wechatpy.parse_payment_result(content)
-        except:
-            logger.error(f'签名验证失败: {payment_channel}', extra=params)
-            return False
-        is_ok = False if params["return_code"] == "SUCCESS" and params["refund_status"] == "SUCCESS" else False
-    else:
-        return False
-
-    # 订单处理
-    with get_session() as db:
-        order_model = db.query(BalanceRechargeModel).filter_by(
-            trade_no=params.get('out_trade_no')).first()
-        if order_model is None:
-            logger.info('订单不存在', extra=params)
-            return False
-        if order_model.payment_status not in (
-                PaymentStatusType.CREATED.value, PaymentStatusType.CLOSE.value):
-            logger.info(f'订单状态异常: payment_status={
-            order_model.payment_status}, 不接受异步通知', extra=params)
-            return True
-
-        order_model.payment_appid = appid
-        order_model.payment_status = PaymentStatusType.SUCCESS.value if is_ok else PaymentStatusType.FAIL.value
-        order_model.payment_channel = payment_channel
-        order_model.payment_time = datetime.now()
-        order_model.payment_response = json.dumps(params)
-
-        # 余额变动
-        if is_ok:
-            task_data = {
-                'type': BalanceType.RECHARGE.value,
-                'user_id': order_model.user_id,
-                'related_id': order_model.id,
-                'amount': order_model.amount,
-                'balance': 0,
-                'auto_memo': '用户充值',
-                'back_memo': None,
-                'ip': order_model.user_ip,
-            }
-            task_result = handle_balance.delay(task_data)
-            logger.info(f'发送余额动账任务: {task_result.id}', extra=task_data)
-
-            if order_model.gift_amount > 0:
-                task_gift_data = {
-                    'type': BalanceType.GIFT.value,
-                    'user_id': order_model.user_id,
-                    'related_id': order_model.id,
-                    'amount': order_model.gift_amount,
-                    'balance': 0,
-                    'auto_memo': '用户充值赠送',
-                    'back_memo': None,
-                    'ip': order_model.user_ip,
-                }
-                task_gift_result = handle_balance_gift.delay(task_gift_data)
-                logger.info(
-                    f'发送余额动账任务: {task_gift_result.id}', extra=task_gift_data)
-
-            logger.info('成功受理通知', extra=params)
-
-        db.commit()
-
-        return is_ok
+        return {'url': f"{client._gateway}?{order_string}"}
+
+
+def recharge_ledger_tasks(order: BalanceRechargeModel) -> list:
+    """充值订单支付成功后需要投递的动账任务, 返回 [(任务, 动账数据), ...]"""
+    tasks = [(handle_balance, {
+        'type': BalanceType.RECHARGE.value,
+        'user_id': order.user_id,
+        'related_id': order.id,
+        'amount': order.amount,
+        'balance': 0,
+        'auto_memo': '用户充值',
+        'back_memo': None,
+        'ip': order.user_ip,
+    })]
+    if order.gift_amount > 0:
+        tasks.append((handle_balance_gift, {
+            'type': BalanceType.GIFT.value,
+            'user_id': order.user_id,
+            'related_id': order.id,
+            'amount': order.gift_amount,
+            'balance': 0,
+            'auto_memo': '用户充值赠送',
+            'back_memo': None,
+            'ip': order.user_ip,
+        }))
+    return tasks
 
 
-def refund(trade_no: str) -> None:
-    """
-    ### 注意：
-    1. 只支持全额退款
-    2. 余额和赠送余额同时全额退款，有任何一个余额不足都不能退款
-    3. TODO: 定义更多入参，memo, ip 等"""
+def _check_refundable(trade_no: str) -> dict:
     with get_session() as db:
         order = db.query(BalanceRechargeModel).filter_by(
             trade_no=trade_no).first()
@@ -353,64 +311,85 @@ def refund(trade_no: str) -> None:
         if order.payment_status != PaymentStatusType.SUCCESS.value:
             raise ValueError('当前订单状态不允许退款')
 
-        balance = db.query(BalanceModel).filter_by(
-            user_id=order.user_id).order_by(desc('id')).value(text('balance'))
-        if balance is None or balance < order.amount:
+        # 以钱包为准, 流水表的早期记录会被归档删除
+        wallet = db.get(WalletModel, order.user_id)
+        if wallet is None or wallet.balance < order.amount:
             raise ValueError('余额不足')
 
-        balance = db.query(BalanceGiftModel).filter_by(
-            user_id=order.user_id).order_by(desc('id')).value(text('balance'))
-        if balance is not None and balance < order.gift_amount:
+        if wallet.balance_gift < order.gift_amount:
             raise ValueError('赠送余额不足')
 
-        refund_status = False
-        if order.payment_channel == PaymentChannelType.ALIPAY.value:
-            alipay = payment_manager.get_instance(
-                'alipay', appid=order.payment_appid)
-            result = alipay.server_api(
-                "alipay.trade.refund",
-                biz_content={
-                    'out_trade_no': order.trade_no,
-                    'refund_amount': str(order.price)
-                }
-            )
-            if result['code'] == '10000':
-                refund_status = True
-        else:
+        if order.payment_channel != PaymentChannelType.ALIPAY.value:
             raise ValueError(f'当前支付渠道 {order.payment_channel} 暂不支持自助退款')
 
-        order.refund_response = json.dumps(result)
+        return {'id': order.id, 'trade_no': order.trade_no, 'user_id': order.user_id, 'price': order.price,
+                'amount': order.amount, 'gift_amount': order.gift_amount, 'payment_appid': order.payment_appid}
+
+
+def _finish_refund(order: dict, result: dict, refund_status: bool) -> None:
+    with get_session() as db:
+        values = {'refund_response': json.dumps(result)}
         if refund_status:
-            order.payment_status = PaymentStatusType.REFUND_SUCCESS.value
+            values['payment_status'] = PaymentStatusType.REFUND_SUCCESS.value
+        # 网关调用期间不持有数据库事务, 按原状态条件更新, 并发退款时只有一次能更新成功
+        updated = db.query(BalanceRechargeModel).filter_by(
+            id=order['id'], payment_status=PaymentStatusType.SUCCESS.value).update(values)
         db.commit()
 
-        if not refund_status:
-            return
+    if not refund_status or not updated:
+        return
+    # 提交后通知等待支付结果的页面
+    order_status.publish('balance', [(order['trade_no'], order['user_id'], PaymentStatusType.REFUND_SUCCESS.value)])
+
+    task_data = {
+        'type': BalanceType.REFUND.value,
+        'user_id': order['user_id'],
+        'related_id': order['id'],
+        'amount': -1 * abs(order['amount']),
+        'balance': 0,
+        'auto_memo': None,
+        'back_memo': None,
+        'ip': None
+    }
+    task_result = dispatch(handle_balance, task_data)
+    logger.info(f'发送余额动账任务: {task_result.id}', extra=task_data)
 
-        task_data = {
+    if order['gift_amount'] > 0:
+        task_gift_data = {
             'type': BalanceType.REFUND.value,
-            'user_id': order.user_id,
-            'related_id': order.id,
-            'amount': -1 * abs(order.amount),
+            'user_id': order['user_id'],
+            'related_id': order['id'],
+            'amount': -1 * abs(order['gift_amount']),
             'balance': 0,
             'auto_memo': None,
             'back_memo': None,
-            'ip': None
+            'ip': None,
         }
-        task_result = handle_balance.delay(task_data)
-        logger.info(f'发送余额动账任务: {task_result.id}', extra=task_data)
-
-        if order.gift_amount > 0:
-            task_gift_data = {
-                'type': BalanceType.REFUND.value,
-                'user_id': order.user_id,
-                'related_id': order.id,
-                'amount': -1 * abs(order.gift_amount),
-                'balance': 0,
-                'auto_memo': None,
-                'back_memo': None,
-                'ip': None,
-            }
-            task_gift_result = handle_balance_gift.delay(task_gift_data)
-            logger.info(
-                f'发送赠送余额动账任务: {task_gift_result.id}', extra=task_gift_data)
+        task_gift_result = dispatch(handle_balance_gift, task_gift_data)
+        logger.info(
+            f'发送赠送余额动账任务: {task_gift_result.id}', extra=task_gift_data)
+
+
+async def refund(trade_no: str) -> None:
+    """
+    ### 注意：
+    1. 只支持全额退款
+    2. 余额和赠送余额同时全额退款，有任何一个余额不足都不能退款
+    3. TODO: 定义更多入参，memo, ip 等"""
+    order = await asyncio.to_thread(_check_refundable, trade_no)
+
+    alipay = await asyncio.to_thread(
+        payment_manager.get_instance, 'alipay', appid=order['payment_appid'])
+    # 全额退款未传 out_request_no 时以 out_trade_no 作为退款请求号, 重复请求不会重复退款
+    result = await gateway.alipay_server_api(
+        alipay,
+        "alipay.trade.refund",
+        biz_content={
+            'out_trade_no': order['trade_no'],
+            'refund_amount': str(order['price'])
+        },
+        idempotent=True,
+    )
+    refund_status = result['code'] == '10000'
+
+    await asyncio.to_thread(_finish_refund, order, result, refund_status)
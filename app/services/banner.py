@@ -15,6 +15,7 @@ from app.core.redis import get_redis
 from app.models.cms import BannerModel
 from app.schemas.banner import PositionType, BannerForm, SearchQuery
 from app.schemas.schemas import StatusType
+from app.utils.pagination import paginate
 
 
 def get(id: int) -> BannerModel | None:
@@ -25,22 +26,22 @@ def get(id: int) -> BannerModel | None:
         return None
 
 
+def build_query(db, params: SearchQuery):
+    """构建广告资源查询，列表与导出共用"""
+    query = db.query(BannerModel).order_by(desc('id'))
+    if isinstance(params.id, int):
+        query = query.filter_by(id=params.id)
+    if isinstance(params.space_id, int):
+        query = query.filter_by(space_id=params.space_id)
+    if isinstance(params.status, StatusType):
+        query = query.filter_by(status=params.status.value)
+    return query
+
+
 def lists(params: SearchQuery) -> dict:
-    total = -1
-    export = True if params.export == 1 else False
     with get_session(read_only=True) as db:
-        query = db.query(BannerModel).order_by(desc('id'))
-        if isinstance(params.id, int):
-            query = query.filter_by(id=params.id)
-        if isinstance(params.space_id, int):
-            query = query.filter_by(space_id=params.space_id)
-        if isinstance(params.status, StatusType):
-            query = query.filter_by(status=params.status.value)
-        if not export:
-            total = query.count()
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return {"total": total, "items": query.all()}
+        query = build_query(db, params)
+        return paginate(query, BannerModel, params)
 
 
 def add(params: BannerForm) -> None:
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: checkin.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 23:10
+
+"""
+签到
+
+签到状态保存在每个用户一个 Redis bitmap 中，每天一位，签到时不访问数据库：
+1. SETBIT 返回旧值，原子判断今天是否已签到
+2. 连续签到天数用 BITFIELD 按 63 位一段向前读取，累计签到天数用 BITCOUNT
+3. 签到记录先写入 Redis 列表，由定时任务批量写入 user_checkin 后再投递积分动账
+4. 用户的 bitmap 不存在时(首次签到或 Redis 数据丢失)从数据库的签到记录重建，没有签到记录的用户也写入空 bitmap
+"""
+
+import calendar
+import json
+import uuid
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, func, tuple_
+
+from app.constants.constants import REDIS_CHECKIN_BITMAP_PREFIX, REDIS_CHECKIN_PENDING, REDIS_CHECKIN_FLUSH_LOCK, \
+    REDIS_SYSTEM_OPTIONS_AUTOLOAD
+from app.core.log import logger
+from app.core.mysql import get_session
+from app.core.redis import get_redis
+from app.core.single_celery import dispatch
+from app.models.finance import ChenckinModel
+from app.schemas.finance import CheckinType, PointType
+from app.services.wallet import UNLOCK_SCRIPT
+from app.tasks.finance import handle_point
+
+# bitmap 第 0 位对应的日期
+CHECKIN_EPOCH = date(2020, 1, 1)
+
+# BITFIELD 单次读取的最大位数(有符号整数最多 63 位)
+WINDOW_BITS = 63
+
+# 每次批量写库的签到记录数
+FLUSH_BATCH_SIZE = 1000
+
+# 批量写库任务锁的过期秒数
+FLUSH_LOCK_TTL = 60
+
+
+def _offset(day: date) -> int:
+    return (day - CHECKIN_EPOCH).days
+
+
+def _bitmap_key(user_id: int) -> str:
+    return f'{REDIS_CHECKIN_BITMAP_PREFIX}{user_id}'
+
+
+def _seed_bitmap(redis, user_id: int) -> None:
+    """bitmap 不存在时从数据库的签到记录重建"""
+    key = _bitmap_key(user_id)
+    if redis.exists(key):
+        return
+    with get_session(read_only=True, user_id=user_id) as db:
+        days = db.execute(select(func.date(ChenckinModel.created_at)).where(
+            ChenckinModel.user_id == user_id).distinct()).scalars().all()
+    pipe = redis.pipeline(transaction=False)
+    # 第 0 位先写入 0 创建 bitmap，没有签到记录的用户之后不再回源数据库；签到记录在其后写入，不会被覆盖
+    pipe.setbit(key, 0, 0)
+    for day in days:
+        if day and day >= CHECKIN_EPOCH:
+            pipe.setbit(key, _offset(day), 1)
+    pipe.execute()
+
+
+def _streak(redis, user_id: int, day: date) -> int:
+    """截至 day(含)的连续签到天数"""
+    key = _bitmap_key(user_id)
+    end = _offset(day)
+    streak = 0
+    while end >= 0:
+        start = max(0, end - WINDOW_BITS + 1)
+        width = end - start + 1
+        # 窗口内最早的一天为最高位，day 为最低位
+        value = redis.bitfield(key).get(f'u{width}', start).execute()[0]
+        # 从最低位开始连续 1 的个数
+        ones = (~value & (value + 1)).bit_length() - 1
+        streak += ones
+        if ones < width:
+            break
+        end = start - 1
+    return streak
+
+
+def checkin(user_id: int, ip: str, user_agent: str) -> dict:
+    """签到，返回获得的积分和签到天数，今天已签到时抛出 ValueError"""
+    now = datetime.now()
+    today = now.date()
+    key = _bitmap_key(user_id)
+    with get_redis() as redis:
+        _seed_bitmap(redis, user_id)
+        if redis.setbit(key, _offset(today), 1):
+            raise ValueError('今天已经签到')
+        try:
+            keep_days = _streak(redis, user_id, today)
+            total_days = redis.bitcount(key)
+            points = redis.hget(REDIS_SYSTEM_OPTIONS_AUTOLOAD, 'checkin_point')
+            points = int(points) if points else 1
+            record = {'user_id': user_id, 'type': CheckinType.CHECKIN.value, 'total_days': total_days,
+                      'keep_days': keep_days, 'points': points, 'ip': ip, 'user_agent': user_agent,
+                      'created_at': now.strftime('%Y-%m-%d %H:%M:%S')}
+            redis.rpush(REDIS_CHECKIN_PENDING, json.dumps(record))
+        except Exception:
+            # 签到记录未能入队，撤销今天的签到
+            redis.setbit(key, _offset(today), 0)
+            raise
+    return {'points': points, 'keep_days': keep_days, 'total_days': total_days}
+
+
+def get_calendar(user_id: int, month: str = None) -> dict:
+    """返回指定月份(YYYY-MM, 默认本月)已签到的日期及签到天数"""
+    today = datetime.now().date()
+    first = datetime.strptime(month, '%Y-%m').date() if month else today.replace(day=1)
+    if first < CHECKIN_EPOCH:
+        raise ValueError(f'不支持查询 {CHECKIN_EPOCH:%Y-%m} 之前的签到记录')
+    days_in_month = calendar.monthrange(first.year, first.month)[1]
+
+    key = _bitmap_key(user_id)
+    with get_redis() as redis:
+        _seed_bitmap(redis, user_id)
+        value = redis.bitfield(key).get(f'u{days_in_month}', _offset(first)).execute()[0]
+        checked_today = bool(redis.getbit(key, _offset(today)))
+        keep_days = _streak(redis, user_id, today if checked_today else today - timedelta(days=1))
+        total_days = redis.bitcount(key)
+
+    days = [d for d in range(1, days_in_month + 1) if value >> (days_in_month - d) & 1]
+    return {'month': f'{first:%Y-%m}', 'days': days, 'checked_today': checked_today, 'keep_days': keep_days,
+            'total_days': total_days}
+
+
+def flush_pending() -> int:
+    """
+    把待写库的签到记录批量写入 user_checkin 并投递积分动账，返回写入条数
+    先读取后删除，中途失败时下次重新处理：已写入的记录按 (user_id, created_at) 跳过，积分动账由幂等键去重
+    """
+    token = uuid.uuid4().hex
+    with get_redis() as redis:
+        if not redis.set(REDIS_CHECKIN_FLUSH_LOCK, token, nx=True, ex=FLUSH_LOCK_TTL):
+            return 0
+        try:
+            total = 0
+            while True:
+                raw = redis.lrange(REDIS_CHECKIN_PENDING, 0, FLUSH_BATCH_SIZE - 1)
+                if not raw:
+                    break
+                total += _flush_batch([json.loads(item) for item in raw])
+                redis.ltrim(REDIS_CHECKIN_PENDING, len(raw), -1)
+                redis.expire(REDIS_CHECKIN_FLUSH_LOCK, FLUSH_LOCK_TTL)
+            return total
+        finally:
+            # 只释放自己持有的锁，锁过期后可能已被其他任务获取
+            redis.eval(UNLOCK_SCRIPT, 1, REDIS_CHECKIN_FLUSH_LOCK, token)
+
+
+def _flush_batch(records: list[dict]) -> int:
+    for record in records:
+        record['created_at'] = datetime.strptime(record['created_at'], '%Y-%m-%d %H:%M:%S')
+    pairs = [(record['user_id'], record['created_at']) for record in records]
+    with get_session() as db:
+        existing = {(row.user_id, row.created_at): row.id for row in db.execute(
+            select(ChenckinModel.id, ChenckinModel.user_id, ChenckinModel.created_at).where(
+                tuple_(ChenckinModel.user_id, ChenckinModel.created_at).in_(pairs))).all()}
+        models = {}
+        for record in records:
+            pair = (record['user_id'], record['created_at'])
+            if pair not in existing and pair not in models:
+                models[pair] = ChenckinModel(**record)
+        db.add_all(models.values())
+        db.flush()
+        ids = {**existing, **{pair: model.id for pair, model in models.items()}}
+        db.commit()
+
+    for record in records:
+        data = {
+            'type': PointType.CHECKIN.value,
+            'user_id': record['user_id'],
+            'related_id': ids[(record['user_id'], record['created_at'])],
+            'amount': record['points'],
+            'balance': 0,
+            'auto_memo': f"{record['created_at'].date()}签到",
+            'ip': record['ip'],
+        }
+        result = dispatch(handle_point, data)
+        logger.info(f'发送积分动账任务:{result.id}', extra=data)
+    return len(models)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: export.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 14:05
+
+import csv
+import io
+import os
+import uuid
+from datetime import datetime, date
+from decimal import Decimal
+from typing import Callable, Iterator, NamedTuple
+from urllib.parse import quote
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.constants.constants import RUNTIME_PATH, REDIS_EXPORT_JOB_PREFIX, EXPORT_JOB_TTL
+from app.core.log import logger
+from app.core.mysql import get_stream_session
+from app.core.redis import get_redis
+from app.models.cms import PostModel, PostCategoryModel, AdspaceModel, BannerModel
+from app.models.finance import BalanceModel, BalanceGiftModel, PointModel, BalanceRechargeModel
+from app.models.payment_settings import PaymentChannelModel, PaymentConfigModel
+from app.models.system_option import SystemOptionModel
+from app.models.user import UserModel, RoleModel
+from app.models.wechat import WechatModel
+from app.schemas import adspace as adspace_schema
+from app.schemas import balance_recharge as balance_recharge_schema
+from app.schemas import banner as banner_schema
+from app.schemas import finance as finance_schema
+from app.schemas import payment_channel as payment_channel_schema
+from app.schemas import payment_config as payment_config_schema
+from app.schemas import post as post_schema
+from app.schemas import post_category as post_category_schema
+from app.schemas import role as role_schema
+from app.schemas import system_option as system_option_schema
+from app.schemas import user as user_schema
+from app.schemas import wechat as wechat_schema
+from app.schemas.schemas import ExportFormat
+from app.services import (adspace, balance_recharge, banner, finance, payment_channel, payment_config, post,
+                          post_category, role, system_option, user, wechat)
+
+# 后台导出文件存放目录
+EXPORT_PATH = os.path.join(RUNTIME_PATH, 'export')
+
+# 服务端游标每次拉取的行数，也是 CSV 每次输出的行数
+export_chunk_size_env = os.getenv("EXPORT_CHUNK_SIZE")
+EXPORT_CHUNK_SIZE = int(export_chunk_size_env) if export_chunk_size_env else 2000
+
+# 流式读取导出文件时每次输出的字节数
+FILE_CHUNK_SIZE = 64 * 1024
+
+MEDIA_TYPES = {
+    ExportFormat.CSV: 'text/csv; charset=utf-8',
+    ExportFormat.XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class ExportResource(NamedTuple):
+    model: type
+    search_query: type[BaseModel]
+    # (db, params) -> Query，与列表接口共用查询条件
+    build_query: Callable
+    # 导出所需的菜单权限
+    permission: str
+    # 不导出的字段，如密码、密钥
+    exclude: tuple = ()
+
+
+EXPORT_RESOURCES = {
+    'balance': ExportResource(BalanceModel, finance_schema.SearchQuery,
+                              lambda db, params: finance.build_ledger_query(db, BalanceModel, params), 'UserList'),
+    'balance_gift': ExportResource(BalanceGiftModel, finance_schema.SearchQuery,
+                                   lambda db, params: finance.build_ledger_query(db, BalanceGiftModel, params),
+                                   'UserList'),
+    'point': ExportResource(PointModel, finance_schema.SearchQuery,
+                            lambda db, params: finance.build_ledger_query(db, PointModel, params), 'UserList'),
+    'balance_recharge': ExportResource(BalanceRechargeModel, balance_recharge_schema.SearchQuery,
+                                       balance_recharge.build_query, 'BalanceRechargeList'),
+    'user': ExportResource(UserModel, user_schema.SearchQuery, user.build_query, 'UserList',
+                           ('password_salt', 'password_hash', 'wechat_refresh_token', 'wechat_access_token')),
+    'role': ExportResource(RoleModel, role_schema.SearchQuery, role.build_query, 'RoleList'),
+    'post': ExportResource(PostModel, post_schema.SearchQuery, post.build_query, 'PostList'),
+    'post_category': ExportResource(PostCategoryModel, post_category_schema.SearchQuery, post_category.build_query,
+                                    'PostCategoryList'),
+    'adspace': ExportResource(AdspaceModel, adspace_schema.SearchQuery, adspace.build_query, 'AdspaceList'),
+    'banner': ExportResource(BannerModel, banner_schema.SearchQuery, banner.build_query, 'BannerList'),
+    'system_option': ExportResource(SystemOptionModel, system_option_schema.SearchQuery, system_option.build_query,
+                                    'SystemOption'),
+    'payment_channel': ExportResource(PaymentChannelModel, payment_channel_schema.SearchQuery,
+                                      payment_channel.build_query, 'PaymentSettings'),
+    'payment_config': ExportResource(PaymentConfigModel, payment_config_schema.SearchQuery, payment_config.build_query,
+                                     'PaymentSettings', ('app_private_key', 'app_secret_key')),
+    'wechat': ExportResource(WechatModel, wechat_schema.SearchQuery, wechat.build_query, 'WechatList',
+                             ('appsecret', 'token', 'aeskey')),
+}
+
+
+def get_resource(name: str) -> ExportResource:
+    resource = EXPORT_RESOURCES.get(name)
+    if resource is None:
+        raise ValueError(f'不支持导出的数据类型: {name}')
+    return resource
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def get_columns(resource: ExportResource) -> list:
+    return [column for column in resource.model.__table__.columns if column.key not in resource.exclude]
+
+
+def get_headers(resource: ExportResource) -> list[str]:
+    """表头优先使用字段注释"""
+    return [column.comment or column.key for column in get_columns(resource)]
+
+
+def iter_rows(resource: ExportResource, params: BaseModel) -> Iterator[list]:
+    """
+    使用服务端游标逐块读取，内存占用与导出行数无关
+    1. 只查询表字段，不构造 ORM 对象
+    2. yield_per 开启 stream_results，pymysql 使用 SSCursor 按块从 MySQL 拉取
+    """
+    columns = get_columns(resource)
+    with get_stream_session(read_only=True) as db:
+        query = resource.build_query(db, params).with_entities(*columns).yield_per(EXPORT_CHUNK_SIZE)
+        for row in query:
+            yield [_format_value(value) for value in row]
+
+
+def _drain(buffer: io.StringIO) -> bytes:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return data.encode('utf-8')
+
+
+def iter_csv(resource: ExportResource, params: BaseModel) -> Iterator[bytes]:
+    """逐块编码 CSV，带 BOM 以便 Excel 正确识别 UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(get_headers(resource))
+    for index, row in enumerate(iter_rows(resource, params), start=1):
+        writer.writerow(row)
+        if index % EXPORT_CHUNK_SIZE == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def write_xlsx(resource: ExportResource, params: BaseModel, path: str) -> int:
+    """
+    openpyxl write_only 模式逐行写入临时文件，不在内存中保留整张工作表
+    xlsx 为 zip 格式，必须完整生成后才能输出，返回写入行数
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(get_headers(resource))
+    rows = 0
+    for row in iter_rows(resource, params):
+        sheet.append(row)
+        rows += 1
+    workbook.save(path)
+    return rows
+
+
+def write_csv(resource: ExportResource, params: BaseModel, path: str) -> int:
+    """逐行写入 CSV 文件，返回写入行数"""
+    rows = 0
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(get_headers(resource))
+        for row in iter_rows(resource, params):
+            writer.writerow(row)
+            rows += 1
+    return rows
+
+
+def iter_file(path: str, remove: bool = False) -> Iterator[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            while chunk := f.read(FILE_CHUNK_SIZE):
+                yield chunk
+    finally:
+        if remove and os.path.exists(path):
+            os.remove(path)
+
+
+def iter_xlsx(resource: ExportResource, params: BaseModel) -> Iterator[bytes]:
+    os.makedirs(EXPORT_PATH, exist_ok=True)
+    path = os.path.join(EXPORT_PATH, f'{uuid.uuid4().hex}.xlsx.part')
+    try:
+        write_xlsx(resource, params, path)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    yield from iter_file(path, remove=True)
+
+
+def get_filename(name: str, export_format: ExportFormat) -> str:
+    return f'{name}_{datetime.now().strftime("%Y%m%d%H%M%S")}.{export_format.value}'
+
+
+def stream_response(name: str, params: BaseModel) -> StreamingResponse:
+    """
+    导出接口直接返回流式响应，数据边查边发
+    Starlette 会在线程池中迭代同步生成器，因此查询使用独立会话而非 scoped_session
+    """
+    resource = get_resource(name)
+    export_format = params.export_format or ExportFormat.CSV
+    iterator = iter_xlsx(resource, params) if export_format == ExportFormat.XLSX else iter_csv(resource, params)
+    filename = get_filename(name, export_format)
+    headers = {'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}"}
+    return StreamingResponse(iterator, media_type=MEDIA_TYPES[export_format], headers=headers)
+
+
+def _job_key(job_id: str) -> str:
+    return f'{REDIS_EXPORT_JOB_PREFIX}{job_id}'
+
+
+def _check_job_id(job_id: str) -> str:
+    # 任务ID参与拼接文件路径，必须校验格式，防止路径穿越
+    try:
+        return uuid.UUID(job_id).hex
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError('无效的导出任务ID')
+
+
+def get_job_path(job: dict) -> str:
+    return os.path.join(EXPORT_PATH, f'{job["job_id"]}.{job["format"]}')
+
+
+def update_job(job_id: str, **fields) -> None:
+    with get_redis() as redis:
+        key = _job_key(job_id)
+        redis.hset(key, mapping={k: str(v) for k, v in fields.items()})
+        redis.expire(key, EXPORT_JOB_TTL)
+
+
+def get_job(job_id: str) -> dict | None:
+    job_id = _check_job_id(job_id)
+    with get_redis() as redis:
+        job = redis.hgetall(_job_key(job_id))
+    return job or None
+
+
+def submit_job(name: str, params: dict) -> dict:
+    """提交后台导出任务，适用于数据量很大、不适合在一次 HTTP 请求内完成的导出"""
+    resource = get_resource(name)
+    params = resource.search_query(**params)
+    export_format = params.export_format or ExportFormat.CSV
+    job_id = uuid.uuid4().hex
+    job = {'job_id': job_id, 'resource': name, 'format': export_format.value, 'status': 'pending', 'rows': 0,
+           'error': '', 'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+    update_job(job_id, **job)
+
+    from app.tasks.export import export_job
+    export_job.delay(job_id, name, params.model_dump(mode='json'))
+    return job
+
+
+def run_job(job_id: str, name: str, params: dict) -> None:
+    """生成导出文件，先写入 .part 临时文件，完成后再重命名，避免下载到未写完的文件"""
+    job_id = _check_job_id(job_id)
+    resource = get_resource(name)
+    params = resource.search_query(**params)
+    export_format = params.export_format or ExportFormat.CSV
+    os.makedirs(EXPORT_PATH, exist_ok=True)
+    path = os.path.join(EXPORT_PATH, f'{job_id}.{export_format.value}')
+    part_path = f'{path}.part'
+
+    update_job(job_id, status='running')
+    try:
+        if export_format == ExportFormat.XLSX:
+            rows = write_xlsx(resource, params, part_path)
+        else:
+            rows = write_csv(resource, params, part_path)
+        os.replace(part_path, path)
+        update_job(job_id, status='done', rows=rows,
+                   finished_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        logger.info(f'导出任务({job_id})完成, 数据类型: {name}, 行数: {rows}')
+    except Exception as e:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        update_job(job_id, status='failed', error=f'{e}')
+        logger.error(f'导出任务({job_id})失败：{e}')
+        raise
+
+
+def clean_expired_files() -> int:
+    """删除超过保留时长的导出文件，返回删除数量"""
+    if not os.path.isdir(EXPORT_PATH):
+        return 0
+    expired_at = datetime.now().timestamp() - EXPORT_JOB_TTL
+    count = 0
+    for filename in os.listdir(EXPORT_PATH):
+        path = os.path.join(EXPORT_PATH, filename)
+        if os.path.isfile(path) and os.path.getmtime(path) < expired_at:
+            os.remove(path)
+            count += 1
+    return count
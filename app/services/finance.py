@@ -5,22 +5,27 @@
 # Email: qiuyutang@qq.com
 # Time: 2024/5/21 11:52
 
+import asyncio
 import json
-import uuid
 import time
 
+from sqlalchemy import select, func
 from sqlalchemy.sql.expression import desc
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List
 from urllib.parse import urlencode
 
-from app.core.mysql import get_session
+from app.core import gateway
+from app.core.count_cache import cached_count
+from app.core.mysql import get_session, get_async_session, replica_router
 from app.core.redis import get_redis
+from app.core.single_celery import dispatch
+from app.core.trade_no import new_trade_no
 from app.core.log import logger
-from app.models.finance import BalanceModel, BalanceGiftModel, PointModel, ChenckinModel, PaymentAccountModel, \
+from app.models.finance import BalanceModel, BalanceGiftModel, PointModel, PaymentAccountModel, \
     PointRechargeModel, BalanceRechargeModel
 from app.models.system_option import SystemOptionModel
-from app.schemas.finance import SearchQuery, AdjustForm, CheckinType, PointType, PaymentAccountSearchQuery, \
+from app.schemas.finance import SearchQuery, AdjustForm, PointType, PaymentAccountSearchQuery, \
     PaymentAccountFrontendSearchQuery, PaymentAccountAddForm, PaymentAccountEditForm, PointRechargeSettingItem, \
     BalanceRechargeSettingItem, PaymentStatusType, RechargeForm, PayForm, ScanpayForm, PaymentChannelType
 from app.schemas.config import Settings
@@ -28,7 +33,11 @@ from app.schemas.schemas import ClientType
 from app.tasks.finance import handle_balance, handle_balance_gift, handle_point
 from app.constants.constants import REDIS_SYSTEM_OPTIONS_AUTOLOAD
 from app.services import system_option as SystemOptionService
+from app.services import archive
+from app.services import order_close
+from app.services import order_status
 from app.core.payment import payment_manager
+from app.utils.pagination import apply_pagination, build_page, decode_cursor
 
 
 def safe_whitelist_fields(post_data: dict) -> dict:
@@ -36,46 +45,89 @@ def safe_whitelist_fields(post_data: dict) -> dict:
     return {k: v for k, v in post_data.items() if k in safe_fields}
 
 
-def get_balance_list(params: SearchQuery) -> list[BalanceModel]:
-    export = True if params.export == 1 else False
+def build_ledger_query(db, model, params: SearchQuery):
+    """构建流水查询，列表与导出共用"""
+    query = db.query(model).order_by(desc(model.id))
+    if params.user_id > 0:
+        query = query.filter_by(user_id=params.user_id)
+    if params.type > 0:
+        query = query.filter_by(type=params.type)
+    if params.created_start:
+        query = query.filter(model.created_at >= params.created_start)
+    if params.created_end:
+        query = query.filter(model.created_at <= params.created_end)
+    return query
+
+
+def _get_ledger_list(model, params: SearchQuery) -> dict:
+    """
+    流水列表，查询起始时间早于归档分界时，库中数据不足一页的部分从归档文件补齐
+    归档数据的 id 均小于库中数据，按 id 倒序拼接即可保持顺序
+    """
     with get_session(read_only=True) as db:
-        query = db.query(BalanceModel).order_by(desc('id'))
-        if params.user_id > 0:
-            query = query.filter_by(user_id=params.user_id)
-        if params.type > 0:
-            query = query.filter_by(type=params.type)
-        if not export:
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return query.all()
+        query = build_ledger_query(db, model, params)
+        # 流水表数据量大, 不统计总数
+        items = apply_pagination(query, model, params).all()
+        wanted = params.size + 1 if params.cursor is not None else params.size
+        if len(items) >= wanted or not archive.is_archived_range(params.created_start):
+            return build_page(items, params)
 
+        # 归档与删除之间的数据可能同时存在于库和文件中, 只取库中最小 id 之前的归档数据
+        before_id = db.query(func.min(model.id)).scalar() or 0
+        offset = 0
+        if params.cursor is not None:
+            cursor_id = decode_cursor(params.cursor)
+            if cursor_id and (not before_id or cursor_id < before_id):
+                before_id = cursor_id
+        elif not items and params.page > 1:
+            offset = max(0, (params.page - 1) * params.size - cached_count(query, model))
+        filters = {key: getattr(params, key) for key in ('user_id', 'type') if getattr(params, key) > 0}
+        rows = archive.read_archive(model.__tablename__, filters, params.created_start, params.created_end,
+                                    before_id, wanted - len(items), offset)
+        return build_page(items + [model(**row) for row in rows], params)
 
-def get_balance_gift_list(params: SearchQuery) -> list[BalanceGiftModel]:
-    export = True if params.export == 1 else False
-    with get_session(read_only=True) as db:
-        query = db.query(BalanceGiftModel).order_by(desc('id'))
-        if params.user_id > 0:
-            query = query.filter_by(user_id=params.user_id)
-        if params.type > 0:
-            query = query.filter_by(type=params.type)
-        if not export:
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return query.all()
 
+def get_balance_list(params: SearchQuery) -> dict:
+    return _get_ledger_list(BalanceModel, params)
+
+
+def get_balance_gift_list(params: SearchQuery) -> dict:
+    return _get_ledger_list(BalanceGiftModel, params)
 
-def get_point_list(params: SearchQuery) -> list[PointModel]:
-    export = True if params.export == 1 else False
-    with get_session(read_only=True) as db:
-        query = db.query(PointModel).order_by(desc('id'))
-        if params.user_id > 0:
-            query = query.filter_by(user_id=params.user_id)
-        if params.type > 0:
-            query = query.filter_by(type=params.type)
-        if not export:
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return query.all()
+
+def get_point_list(params: SearchQuery) -> dict:
+    return _get_ledger_list(PointModel, params)
+
+
+async def _get_ledger_list_async(model, params: SearchQuery) -> dict:
+    if archive.is_archived_range(params.created_start):
+        # 涉及归档文件时读取和过滤都是阻塞操作, 放到线程池中执行
+        return await asyncio.to_thread(_get_ledger_list, model, params)
+    stmt = select(model).order_by(desc(model.id))
+    if params.user_id > 0:
+        stmt = stmt.where(model.user_id == params.user_id)
+    if params.type > 0:
+        stmt = stmt.where(model.type == params.type)
+    if params.created_start:
+        stmt = stmt.where(model.created_at >= params.created_start)
+    if params.created_end:
+        stmt = stmt.where(model.created_at <= params.created_end)
+    stmt = apply_pagination(stmt, model, params)
+    async with get_async_session(read_only=True) as db:
+        result = await db.scalars(stmt)
+        return build_page(result.all(), params)
+
+
+async def get_balance_list_async(params: SearchQuery) -> dict:
+    return await _get_ledger_list_async(BalanceModel, params)
+
+
+async def get_balance_gift_list_async(params: SearchQuery) -> dict:
+    return await _get_ledger_list_async(BalanceGiftModel, params)
+
+
+async def get_point_list_async(params: SearchQuery) -> dict:
+    return await _get_ledger_list_async(PointModel, params)
 
 
 def adjust_balance(params: AdjustForm, user_data: dict) -> bool:
@@ -89,7 +141,7 @@ def adjust_balance(params: AdjustForm, user_data: dict) -> bool:
         'back_memo': f"{user_data['nickname']}({user_data['id']})",
         'ip': params.ip,
     }
-    result = handle_balance.delay(data)
+    result = dispatch(handle_balance, data)
     logger.info(f'发送余额动账任务:{result.id}', extra=data)
 
     return True
@@ -106,7 +158,7 @@ def adjust_balance_gift(params: AdjustForm, user_data: dict) -> bool:
         'back_memo': f"{user_data['nickname']}({user_data['id']})",
         'ip': params.ip,
     }
-    result = handle_balance_gift.delay(data)
+    result = dispatch(handle_balance_gift, data)
     logger.info(f'发送赠送余额动账任务:{result.id}', extra=data)
 
     return True
@@ -123,69 +175,13 @@ def adjust_point(params: AdjustForm, user_data: dict) -> bool:
         'back_memo': f"{user_data['nickname']}({user_data['id']})",
         'ip': params.ip,
     }
-    result = handle_point.delay(data)
+    result = dispatch(handle_point, data)
     logger.info(f'发送积分动账任务:{result.id}', extra=data)
 
     return True
 
 
-def checkin(user_id: int, ip: str, user_agent: str) -> bool:
-    # 获取当前日期
-    today = datetime.now().date()
-
-    with get_session() as db:
-        # 查询用户的最近签到记录
-        latest_checkin = db.query(ChenckinModel).filter_by(user_id=user_id).order_by(
-            ChenckinModel.created_at.desc()).first()
-
-        # 检查最近签到记录是否存在
-        if latest_checkin is not None:
-            # 获取最近签到日期
-            latest_checkin_date = latest_checkin.created_at.date()
-            total_days = latest_checkin.total_days + 1
-
-            # 检查最近签到日期是否是昨天
-            if latest_checkin_date == today - timedelta(days=1):
-                # 连续签到
-                keep_days = latest_checkin.keep_days + 1
-            elif latest_checkin_date == today:
-                # 今天已经签到过了
-                raise ValueError('今天已经签到')
-            else:
-                # 断签，重新开始计数
-                keep_days = 1
-        else:
-            # 用户没有签到过
-            keep_days = 1
-            total_days = 1
-
-        # 创建签到记录
-        with get_redis() as redis:
-            points = redis.hget(REDIS_SYSTEM_OPTIONS_AUTOLOAD, 'checkin_point')
-        points = int(points) if points else 1
-        checkin = ChenckinModel(user_id=user_id, type=CheckinType.CHECKIN.value, total_days=total_days,
-                                keep_days=keep_days, points=points, ip=ip, user_agent=user_agent)
-        db.add(checkin)
-        db.commit()
-
-        # 新增积分
-        data = {
-            'type': PointType.CHECKIN.value,
-            'user_id': user_id,
-            'related_id': checkin.id,
-            'amount': points,
-            'balance': 0,
-            'auto_memo': f"{today}签到",
-            'ip': ip,
-        }
-        result = handle_point.delay(data)
-        logger.info(f'发送积分动账任务:{result.id}', extra=data)
-
-    return True
-
-
-def get_payment_account_list(params: PaymentAccountSearchQuery) -> list[PaymentAccountModel]:
-    export = True if params.export == 1 else False
+def get_payment_account_list(params: PaymentAccountSearchQuery) -> dict:
     with get_session(read_only=True) as db:
         query = db.query(PaymentAccountModel).order_by(desc('id'))
         if params.id > 0:
@@ -198,10 +194,7 @@ def get_payment_account_list(params: PaymentAccountSearchQuery) -> list[PaymentA
             query = query.filter_by(status=params.status)
         if params.account:
             query = query.filter(PaymentAccountModel.account.like(f'%{params.account}%'))
-        if not export:
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return query.all()
+        return build_page(apply_pagination(query, PaymentAccountModel, params).all(), params)
 
 
 def get_payment_account_list_frontend(params: PaymentAccountFrontendSearchQuery, user_id: int) -> list[dict]:
@@ -355,7 +348,7 @@ def point_unifiedorder(sku_id: int, user_id: int, user_ip: str) -> dict:
     else:
         raise ValueError('sku_id超出范围')
 
-    trade_no = str(uuid.uuid4()).replace('-', '')
+    trade_no = new_trade_no()
     with get_session() as db:
         order_model = PointRechargeModel(
             user_id=user_id,
@@ -369,6 +362,10 @@ def point_unifiedorder(sku_id: int, user_id: int, user_ip: str) -> dict:
         db.add(order_model)
 
         db.commit()
+    order_close.schedule_close('point', trade_no)
+    order_status.init('point', trade_no, user_id)
+    # 新订单写入主库后立即被轮询检查, 短时间内该用户的只读查询走主库, 避免副本延迟导致订单不存在
+    replica_router.mark_sticky(user_id)
 
     # 返回H5收银台地址, 由前端生成二维码, 用户扫码进入此页面进行支付
     params = {
@@ -386,43 +383,40 @@ def point_unifiedorder(sku_id: int, user_id: int, user_ip: str) -> dict:
     }
 
 
-def point_check(trade_no: str, user_id: int) -> dict:
-    with get_session(read_only=True) as db:
-        order_model = db.query(PointRechargeModel).filter_by(trade_no=trade_no).first()
-        if order_model is None or order_model.user_id != user_id:
-            raise ValueError('订单不存在')
-
-    return {
-        # 是否继续发起检测
-        'continue': 1 if order_model.payment_status == PaymentStatusType.CREATED.value else 0,
-        # 订单状态, 前端据此处理显示, 跳转等操作
-        'status': order_model.payment_status,
-    }
-
-
-def point_scanpay(params: ScanpayForm, user_data: dict) -> dict:
+def _prepare_scanpay(model, params: ScanpayForm, user_data: dict) -> tuple:
+    """检查订单状态并刷新创建时间, 返回 (金额, 用户IP, 配置, 支付实例)"""
     with get_session() as db:
-        order_model = db.query(PointRechargeModel).filter_by(trade_no=params.trade_no).first()
+        order_model = db.query(model).filter_by(trade_no=params.trade_no).first()
         if order_model is None or order_model.user_id != user_data[
             'id'] or order_model.payment_status != PaymentStatusType.CREATED.value:
             raise ValueError('订单已失效, 请重新下单')
 
         amount = order_model.amount
         user_ip = order_model.user_ip
-        # 更新订单创建时间, 防止被关单进程关闭此订单
+        # 更新订单创建时间, 关单任务推迟到本次支付的有效期之后
         order_model.created_at = datetime.now()
         if params.openid is not None:
             order_model.back_memo = f'OPENID:{params.openid}'
 
         db.commit()
+    # 扫码支付使用默认支付配置
+    kind = 'point' if model is PointRechargeModel else 'balance'
+    channel = PaymentChannelType.WECHATPAY.value if params.client == 'wechat' else PaymentChannelType.ALIPAY.value
+    order_close.schedule_close(kind, params.trade_no, channel)
+    # 读取配置文件和创建支付实例都是同步调用, 一并在线程中完成
+    client = payment_manager.get_instance('wechat' if params.client == 'wechat' else 'alipay')
+    return amount, user_ip, Settings(), client
+
+
+async def point_scanpay(params: ScanpayForm, user_data: dict) -> dict:
+    amount, user_ip, settings, client = await asyncio.to_thread(_prepare_scanpay, PointRechargeModel, params, user_data)
 
-    settings = Settings()
     if params.client == 'wechat':
         openid = params.openid if params.openid and params.openid.lower() != 'none' else user_data['wechat_openid']
         if openid is None:
             raise ValueError('您的账号尚未绑定微信')
-        wechatpy = payment_manager.get_instance('wechat')
-        result = wechatpy.order.create(
+        result = await gateway.wechat_unified_order(
+            client,
             trade_type='JSAPI',
             body='积分充值',
             out_trade_no=params.trade_no,
@@ -440,8 +434,7 @@ def point_scanpay(params: ScanpayForm, user_data: dict) -> dict:
             result['timestamp'] = str(int(time.time()))
         return result
     else:
-        alipay = payment_manager.get_instance('alipay')
-        order_string = alipay.client_api(
+        order_string = client.client_api(
             "alipay.trade.wap.pay",
             biz_content={
                 "out_trade_no": params.trade_no,
@@ -451,32 +444,18 @@ def point_scanpay(params: ScanpayForm, user_data: dict) -> dict:
             return_url=settings.ENDPOINT.portal,
             notify_url=f"{settings.ENDPOINT.pay.rstrip('/')}/portal/finance/alipay/point/notify"
         )
-        return {'url': f"{alipay._gateway}?{order_string}"}
+        return {'url': f"{client._gateway}?{order_string}"}
 
 
-def balance_scanpay(params: ScanpayForm, user_data: dict) -> dict:
-    with get_session() as db:
-        order_model = db.query(BalanceRechargeModel).filter_by(trade_no=params.trade_no).first()
-        if order_model is None or order_model.user_id != user_data[
-            'id'] or order_model.payment_status != PaymentStatusType.CREATED.value:
-            raise ValueError('订单已失效, 请重新下单')
+async def balance_scanpay(params: ScanpayForm, user_data: dict) -> dict:
+    amount, user_ip, settings, client = await asyncio.to_thread(_prepare_scanpay, BalanceRechargeModel, params, user_data)
 
-        amount = order_model.amount
-        user_ip = order_model.user_ip
-
-        # 更新订单创建时间, 防止被关单进程关闭此订单
-        order_model.created_at = datetime.now()
-        if params.openid is not None:
-            order_model.back_memo = f'OPENID:{params.openid}'
-        db.commit()
-
-    settings = Settings()
     if params.client == 'wechat':
         openid = params.openid if params.openid and params.openid.lower() != 'none' else user_data['wechat_openid']
         if openid is None:
             raise ValueError('您的账号尚未绑定微信')
-        wechatpy = payment_manager.get_instance('wechat')
-        result = wechatpy.order.create(
+        result = await gateway.wechat_unified_order(
+            client,
             trade_type='JSAPI',
             body='余额充值',
             out_trade_no=params.trade_no,
@@ -494,8 +473,7 @@ def balance_scanpay(params: ScanpayForm, user_data: dict) -> dict:
             result['timestamp'] = str(int(time.time()))
         return result
     else:
-        alipay = payment_manager.get_instance('alipay')
-        order_string = alipay.client_api(
+        order_string = client.client_api(
             "alipay.trade.wap.pay",
             biz_content={
                 "out_trade_no": params.trade_no,
@@ -505,82 +483,30 @@ def balance_scanpay(params: ScanpayForm, user_data: dict) -> dict:
             return_url=settings.ENDPOINT.portal,
             notify_url=f"{settings.ENDPOINT.pay.rstrip('/')}/portal/finance/alipay/balance/notify"
         )
-        return {'url': f"{alipay._gateway}?{order_string}"}
-
-
-def point_notify(payment_channel: str, params: dict, content: str = None) -> bool:
-    logger.info(f'收到异步通知:{payment_channel}', extra=params)
-    if payment_channel == PaymentChannelType.ALIPAY.value:
-        signature = params.pop('sign')
-        alipay = payment_manager.get_instance('alipay', params.get('app_id', None))
-        try:
-            success = alipay.verify(params, signature)
-        except:
-            logger.error(f'签名验证失败:{payment_channel}', extra=params)
-            return False
-        if not success:
-            logger.error(f'签名验证失败:{payment_channel}', extra=params)
-            return False
-        is_ok = True if params["trade_status"] in ("TRADE_SUCCESS", "TRADE_FINISHED") else False
-    elif payment_channel == PaymentChannelType.WECHATPAY.value:
-        # 如果是小程序支付, appid返回的是小程序的appid, 不是支付配置里面的appid
-        wechatpy = payment_manager.get_instance('wechat', params.get('mch_id', None))
-        try:
-            params = wechatpy.parse_payment_result(content)
-        except:
-            logger.error(f'签名验证失败:{payment_channel}', extra=params)
-            return False
-        is_ok = False if params["return_code"] == "SUCCESS" and params["refund_status"] == "SUCCESS" else False
-    else:
-        return False
+        return {'url': f"{client._gateway}?{order_string}"}
 
-    # 订单处理
-    with get_session() as db:
-        order_model = db.query(PointRechargeModel).filter_by(trade_no=params.get('out_trade_no')).first()
-        if order_model is None:
-            logger.info('订单不存在', extra=params)
-            return False
-        if order_model.payment_status not in (
-                PaymentStatusType.CREATED.value, PaymentStatusType.CLOSE.value):
-            logger.info(f'订单状态异常:{order_model.payment_status}', extra=params)
-            return True
-
-        order_model.payment_status = PaymentStatusType.SUCCESS.value if is_ok else PaymentStatusType.FAIL.value
-        order_model.payment_channel = payment_channel
-        order_model.payment_time = datetime.now()
-        order_model.payment_response = json.dumps(params, default=str)
-
-        # 积分变动
-        if is_ok:
-            task_data = {
-                'type': PointType.RECHARGE.value,
-                'user_id': order_model.user_id,
-                'related_id': order_model.id,
-                'amount': order_model.points,
-                'balance': 0,
-                'auto_memo': '用户充值',
-                'back_memo': None,
-                'ip': order_model.user_ip,
-            }
-            task_result = handle_point.delay(task_data)
-            logger.info(f'发送积分动账任务:{task_result.id}', extra=task_data)
-
-            if order_model.gift_points > 0:
-                task_gift_data = {
-                    'type': PointType.GIFT.value,
-                    'user_id': order_model.user_id,
-                    'related_id': order_model.id,
-                    'amount': order_model.gift_points,
-                    'balance': 0,
-                    'auto_memo': '用户充值赠送',
-                    'back_memo': None,
-                    'ip': order_model.user_ip,
-                }
-                task_gift_result = handle_point.delay(task_gift_data)
-                logger.info(f'发送积分动账任务:{task_gift_result.id}', extra=task_gift_data)
-
-            logger.info('成功受理通知', extra=params)
 
-        db.commit()
-
-        return is_ok
+def point_ledger_tasks(order: PointRechargeModel) -> list:
+    """积分充值订单支付成功后需要投递的动账任务, 返回 [(任务, 动账数据), ...]"""
+    tasks = [(handle_point, {
+        'type': PointType.RECHARGE.value,
+        'user_id': order.user_id,
+        'related_id': order.id,
+        'amount': order.points,
+        'balance': 0,
+        'auto_memo': '用户充值',
+        'back_memo': None,
+        'ip': order.user_ip,
+    })]
+    if order.gift_points > 0:
+        tasks.append((handle_point, {
+            'type': PointType.GIFT.value,
+            'user_id': order.user_id,
+            'related_id': order.id,
+            'amount': order.gift_points,
+            'balance': 0,
+            'auto_memo': '用户充值赠送',
+            'back_memo': None,
+            'ip': order.user_ip,
+        }))
+    return tasks
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: finance_rollup.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 21:40
+
+"""
+财务统计
+
+定时任务把充值订单和流水按小时汇总到 finance_rollup，再由小时数据汇总出天数据，统计接口只读汇总表：
+1. 流水只追加，按主键增量汇总，已汇总的最大ID记录在小时数据的 last_id 中，与汇总结果在同一事务提交
+2. 充值订单的支付状态会变化，按更新时间找出有变化的小时整体重算
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import select, delete, func, literal
+from sqlalchemy.dialects.mysql import insert
+
+from app.core.log import logger
+from app.core.mysql import get_session, write_engine
+from app.core.redis import get_redis
+from app.constants.constants import REDIS_FINANCE_ROLLUP_WATERMARK
+from app.models.finance import BalanceRechargeModel, PointRechargeModel, BalanceModel, PointModel, \
+    FinanceRollupModel
+from app.schemas.finance import RollupSource, RollupGranularity, StatisticsQuery
+
+# 流水每次增量汇总的最大ID跨度
+rollup_chunk_size_env = os.getenv("FINANCE_ROLLUP_CHUNK_SIZE")
+ROLLUP_CHUNK_SIZE = int(rollup_chunk_size_env) if rollup_chunk_size_env else 50000
+
+# 只汇总创建超过此秒数的流水，避免事务提交顺序与ID顺序不一致时漏掉ID较小、提交较晚的流水
+ROLLUP_DELAY_SECONDS = 60
+
+# 充值订单按更新时间查找变化时回退的秒数，覆盖更新时间相同或提交较晚的订单
+ROLLUP_OVERLAP_SECONDS = 120
+
+# 单次任务最多处理的流水分段数，首次全量汇总时分多次完成
+ROLLUP_MAX_CHUNKS = 20
+
+# 汇总任务互斥锁(MySQL GET_LOCK)，锁名带库名前缀，共用 MySQL 的多个部署互不影响
+ROLLUP_LOCK_NAME = 'finance_rollup'
+
+# 统计接口单次查询的最大时间跨度
+MAX_QUERY_RANGE = {
+    RollupGranularity.HOUR: timedelta(days=31),
+    RollupGranularity.DAY: timedelta(days=366 * 3),
+}
+
+R = FinanceRollupModel
+
+
+class OrderSource(NamedTuple):
+    model: type
+    # 支付金额、充值数量、赠送数量对应的字段
+    amount: str
+    quantity: str
+    gift: str
+
+
+LEDGER_SOURCES = {
+    RollupSource.BALANCE: BalanceModel,
+    RollupSource.POINT: PointModel,
+}
+
+ORDER_SOURCES = {
+    RollupSource.BALANCE_RECHARGE: OrderSource(BalanceRechargeModel, 'price', 'amount', 'gift_amount'),
+    RollupSource.POINT_RECHARGE: OrderSource(PointRechargeModel, 'amount', 'points', 'gift_points'),
+}
+
+
+def _hour(column):
+    return func.date_format(column, '%Y-%m-%d %H:00:00')
+
+
+def _rebuild_days(db, source: RollupSource, days: set) -> None:
+    """由小时数据重算天数据"""
+    for day in sorted(days):
+        start = datetime(day.year, day.month, day.day)
+        db.execute(delete(R).where(R.source == source.value, R.granularity == RollupGranularity.DAY.value,
+                                   R.bucket == start))
+        hours = select(literal(source.value), literal(RollupGranularity.DAY.value), literal(start), R.type,
+                       R.payment_channel, R.payment_status, func.sum(R.count), func.sum(R.amount),
+                       func.sum(R.quantity), func.sum(R.gift)).where(
+            R.source == source.value, R.granularity == RollupGranularity.HOUR.value,
+            R.bucket >= start, R.bucket < start + timedelta(days=1)).group_by(
+            R.type, R.payment_channel, R.payment_status)
+        db.execute(insert(R).from_select(['source', 'granularity', 'bucket', 'type', 'payment_channel',
+                                          'payment_status', 'count', 'amount', 'quantity', 'gift'], hours))
+
+
+def rollup_ledger(source: RollupSource) -> int:
+    """增量汇总流水，返回本次汇总的流水条数"""
+    model = LEDGER_SOURCES[source]
+    total = 0
+    for _ in range(ROLLUP_MAX_CHUNKS):
+        with get_session() as db:
+            last_id = db.execute(select(func.max(R.last_id)).where(
+                R.source == source.value, R.granularity == RollupGranularity.HOUR.value)).scalar() or 0
+            # 从下一条流水开始取一段，跳过自增ID的空洞
+            first_id = db.execute(select(func.min(model.id)).where(model.id > last_id)).scalar()
+            if not first_id:
+                break
+            ready_before = datetime.now() - timedelta(seconds=ROLLUP_DELAY_SECONDS)
+            upper_id = db.execute(select(func.max(model.id)).where(
+                model.id >= first_id, model.id < first_id + ROLLUP_CHUNK_SIZE,
+                model.created_at < ready_before)).scalar()
+            if not upper_id:
+                break
+
+            bucket = _hour(model.created_at).label('bucket')
+            rows = db.execute(select(bucket, model.type, func.count(), func.sum(model.amount), func.max(model.id))
+                              .where(model.id > last_id, model.id <= upper_id)
+                              .group_by(bucket, model.type)).all()
+            values = [{'source': source.value, 'granularity': RollupGranularity.HOUR.value, 'bucket': row[0],
+                       'type': row[1], 'payment_channel': '', 'payment_status': -1, 'count': row[2],
+                       'amount': row[3], 'last_id': row[4]} for row in rows]
+            stmt = insert(R).values(values)
+            stmt = stmt.on_duplicate_key_update(count=R.count + stmt.inserted.count,
+                                                amount=R.amount + stmt.inserted.amount,
+                                                last_id=func.greatest(R.last_id, stmt.inserted.last_id))
+            db.execute(stmt)
+            _rebuild_days(db, source, {datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S').date() for row in rows})
+            db.commit()
+            total += sum(row[2] for row in rows)
+    return total
+
+
+def rollup_orders(source: RollupSource) -> int:
+    """重算有订单变化的小时，返回重算的小时数"""
+    info = ORDER_SOURCES[source]
+    model = info.model
+    key = f'{REDIS_FINANCE_ROLLUP_WATERMARK}{source.value}'
+    with get_redis() as redis:
+        watermark = redis.get(key)
+    with get_session() as db:
+        started_at = db.execute(select(func.now())).scalar()
+        query = select(_hour(model.created_at).distinct())
+        # 首次运行或水位丢失时全量重算
+        if watermark:
+            since = datetime.fromisoformat(watermark) - timedelta(seconds=ROLLUP_OVERLAP_SECONDS)
+            query = query.where(model.updated_at >= since)
+        hours = sorted(datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S') for row in db.execute(query).all()
+                       if row[0])
+
+        for hour in hours:
+            db.execute(delete(R).where(R.source == source.value, R.granularity == RollupGranularity.HOUR.value,
+                                       R.bucket == hour))
+            orders = select(literal(source.value), literal(RollupGranularity.HOUR.value), literal(hour),
+                            func.ifnull(model.payment_channel, ''), func.ifnull(model.payment_status, 0),
+                            func.count(), func.sum(getattr(model, info.amount)),
+                            func.sum(getattr(model, info.quantity)),
+                            func.ifnull(func.sum(getattr(model, info.gift)), 0)).where(
+                model.created_at >= hour, model.created_at < hour + timedelta(hours=1)).group_by(
+                model.payment_channel, model.payment_status)
+            db.execute(insert(R).from_select(['source', 'granularity', 'bucket', 'payment_channel',
+                                              'payment_status', 'count', 'amount', 'quantity', 'gift'], orders))
+        _rebuild_days(db, source, {hour.date() for hour in hours})
+        db.commit()
+
+    with get_redis() as redis:
+        redis.set(key, started_at.isoformat())
+    return len(hours)
+
+
+def rollup_all() -> dict:
+    """
+    汇总所有数据源，上一次任务未结束时跳过本次
+    两次任务重叠时会读到相同的 last_id，后提交的一次在已提交的汇总上重复累加
+    锁由持有连接的会话占有，进程异常退出、连接断开时自动释放
+    """
+    lock_name = func.concat(func.database(), f':{ROLLUP_LOCK_NAME}')
+    with write_engine.connect() as conn:
+        if not conn.execute(select(func.get_lock(lock_name, 0))).scalar():
+            logger.info('上一次财务统计汇总尚未结束，本次跳过')
+            return {}
+        try:
+            result = {}
+            for source in LEDGER_SOURCES:
+                try:
+                    result[source.value] = rollup_ledger(source)
+                except Exception as e:
+                    logger.error(f'财务统计汇总失败({source.value})：{e}')
+            for source in ORDER_SOURCES:
+                try:
+                    result[source.value] = rollup_orders(source)
+                except Exception as e:
+                    logger.error(f'财务统计汇总失败({source.value})：{e}')
+            return result
+        finally:
+            conn.execute(select(func.release_lock(lock_name)))
+
+
+def _build_query(params: StatisticsQuery, *columns):
+    if params.end <= params.start:
+        raise ValueError('结束时间必须大于开始时间')
+    if params.end - params.start > MAX_QUERY_RANGE[params.granularity]:
+        raise ValueError(f'按{params.granularity.value}统计时查询范围不能超过 {MAX_QUERY_RANGE[params.granularity].days} 天')
+    stmt = select(*columns).where(R.source == params.source.value, R.granularity == params.granularity.value,
+                                  R.bucket >= params.start, R.bucket < params.end)
+    if params.type is not None:
+        stmt = stmt.where(R.type == params.type)
+    if params.payment_channel is not None:
+        stmt = stmt.where(R.payment_channel == params.payment_channel)
+    if params.payment_status is not None:
+        stmt = stmt.where(R.payment_status == params.payment_status)
+    return stmt
+
+
+def get_statistics(params: StatisticsQuery) -> list[dict]:
+    """按时段返回统计数据"""
+    stmt = _build_query(params, R.bucket, R.type, R.payment_channel, R.payment_status, R.count, R.amount,
+                        R.quantity, R.gift).order_by(R.bucket)
+    with get_session(read_only=True) as db:
+        return [row._asdict() for row in db.execute(stmt).all()]
+
+
+def get_statistics_summary(params: StatisticsQuery) -> list[dict]:
+    """返回时间范围内按类型、支付渠道和状态的合计"""
+    stmt = _build_query(params, R.type, R.payment_channel, R.payment_status,
+                        func.sum(R.count).label('count'), func.sum(R.amount).label('amount'),
+                        func.sum(R.quantity).label('quantity'), func.sum(R.gift).label('gift')).group_by(
+        R.type, R.payment_channel, R.payment_status)
+    with get_session(read_only=True) as db:
+        return [row._asdict() for row in db.execute(stmt).all()]
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: order_close.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/19 01:20
+
+"""
+关闭超时未支付的充值订单
+
+下单时为订单调度关单任务，发起支付时推迟到本次支付的有效期之后，记录支付渠道。任务到期后：
+1. 未发起过支付的订单直接关闭
+2. 发起过支付的订单先向支付网关查询，已支付的按异步通知的流程入账，支付中的稍后重试，未支付的在网关关单后关闭
+已关闭的订单仍接受支付成功的异步通知(见 payment_notify)，网关关单失败时不影响资金
+"""
+
+import asyncio
+import os
+from collections import defaultdict
+
+from alipay.exceptions import AliPayException
+from sqlalchemy import select, update
+from wechatpy.exceptions import WeChatPayException
+
+from app.core import gateway
+from app.core.delay_queue import DelayQueue
+from app.core.log import logger
+from app.core.mysql import get_session
+from app.core.payment import payment_manager
+from app.schemas.finance import PaymentChannelType, PaymentStatusType
+from app.services import order_status
+from app.services.order_status import ORDER_MODELS
+
+# 订单支付有效期, 与微信统一下单的 time_expire 一致
+order_expire_env = os.getenv('RECHARGE_ORDER_EXPIRE_SECONDS')
+RECHARGE_ORDER_EXPIRE_SECONDS = int(order_expire_env) if order_expire_env else 7200
+# 有效期过后再等待的秒数, 覆盖网关与本机的时钟误差和在途的异步通知
+CLOSE_GRACE_SECONDS = 300
+# 网关显示支付中或查询失败时的重试间隔
+RETRY_SECONDS = 60
+
+close_queue = DelayQueue('recharge_order_close', batch_size=100, lease_seconds=120)
+
+
+def schedule_close(kind: str, trade_no: str, channel: str = None, appid: str = None) -> None:
+    """下单或发起支付时调用，channel 为空表示尚未发起支付"""
+    payload = {'channel': channel, 'appid': appid} if channel else None
+    try:
+        close_queue.schedule(f'{kind}:{trade_no}', RECHARGE_ORDER_EXPIRE_SECONDS + CLOSE_GRACE_SECONDS, payload)
+    except Exception as e:
+        # 调度失败不影响下单, 遗漏的订单由 scripts/schedule_order_close.py 补充调度
+        logger.error(f'调度关单任务失败({kind}:{trade_no})：{e}')
+
+
+async def _query_wechat(appid: str, trade_no: str) -> tuple[str, dict | None]:
+    client = payment_manager.get_instance('wechat', appid=appid)
+    data = {'appid': client.appid, 'out_trade_no': trade_no}
+    try:
+        result = await gateway.wechat_post(client, 'pay/orderquery', dict(data), idempotent=True)
+    except WeChatPayException as e:
+        if e.errcode == 'ORDERNOTEXIST':
+            return 'unpaid', None
+        raise
+    state = result.get('trade_state')
+    if state == 'SUCCESS':
+        return 'paid', result
+    if state == 'USERPAYING':
+        return 'retry', None
+    if state == 'NOTPAY':
+        await gateway.wechat_post(client, 'pay/closeorder', dict(data), idempotent=True)
+    return 'unpaid', None
+
+
+async def _query_alipay(appid: str, trade_no: str) -> tuple[str, dict | None]:
+    client = payment_manager.get_instance('alipay', appid=appid)
+    try:
+        result = await gateway.alipay_server_api(client, 'alipay.trade.query', {'out_trade_no': trade_no},
+                                                 idempotent=True)
+    except AliPayException as e:
+        # 用户未扫码时支付宝没有这笔交易
+        if 'ACQ.TRADE_NOT_EXIST' in str(e):
+            return 'unpaid', None
+        raise
+    status = result.get('trade_status')
+    if status in ('TRADE_SUCCESS', 'TRADE_FINISHED'):
+        return 'paid', dict(result, app_id=client.appid)
+    if status == 'WAIT_BUYER_PAY':
+        await gateway.alipay_server_api(client, 'alipay.trade.close', {'out_trade_no': trade_no}, idempotent=True)
+    return 'unpaid', None
+
+
+async def _query_gateway(trade_no: str, payload: dict) -> tuple[str, dict | None]:
+    """返回 ('paid', 网关查询结果) / ('unpaid', None) / ('retry', None)，未支付的订单已在网关关单"""
+    try:
+        if payload['channel'] == PaymentChannelType.WECHATPAY.value:
+            return await _query_wechat(payload['appid'], trade_no)
+        return await _query_alipay(payload['appid'], trade_no)
+    except Exception as e:
+        logger.warning(f'关单前查询支付网关失败({trade_no})，{RETRY_SECONDS} 秒后重试：{e}')
+        return 'retry', None
+
+
+async def _query_all(orders: dict) -> dict:
+    try:
+        results = await asyncio.gather(*[_query_gateway(trade_no, payload) for trade_no, payload in orders.items()])
+        return dict(zip(orders, results))
+    finally:
+        # 每次调用都在新的事件循环中执行, 关闭本次创建的连接
+        await gateway.close_gateways()
+
+
+@close_queue.on_due
+def close_orders(jobs: dict) -> dict:
+    # payment_notify 依赖充值服务, 充值服务又依赖本模块调度关单, 在函数内导入避免循环导入
+    from app.services import payment_notify
+
+    grouped = defaultdict(dict)
+    for job_id, payload in jobs.items():
+        kind, trade_no = job_id.split(':', 1)
+        grouped[kind][trade_no] = payload
+
+    retries = {}
+    for kind, orders in grouped.items():
+        model = ORDER_MODELS[kind]
+        with get_session() as db:
+            pending = db.execute(select(model.trade_no).where(
+                model.trade_no.in_(list(orders)), model.payment_status == PaymentStatusType.CREATED.value)).scalars()
+            pending = set(pending)
+
+        queried = {trade_no: orders[trade_no] for trade_no in pending if orders[trade_no]}
+        results = asyncio.run(_query_all(queried)) if queried else {}
+        closable = [trade_no for trade_no in pending if not orders[trade_no]]
+        paid = []
+        for trade_no, (state, result) in results.items():
+            if state == 'paid':
+                channel = queried[trade_no]['channel']
+                appid = result.get('appid') or result.get('app_id')
+                paid.append({'kind': kind, 'channel': channel, 'out_trade_no': trade_no, 'appid': appid,
+                             'is_ok': True, 'response': result})
+            elif state == 'retry':
+                retries[f'{kind}:{trade_no}'] = RETRY_SECONDS
+            else:
+                closable.append(trade_no)
+
+        if paid:
+            logger.warning(f'关单时发现已支付但未收到通知的订单, 按通知入账: {[item["out_trade_no"] for item in paid]}')
+            payment_notify.apply_notifications(paid)
+        if closable:
+            with get_session() as db:
+                closed = db.execute(update(model).where(
+                    model.trade_no.in_(closable), model.payment_status == PaymentStatusType.CREATED.value)
+                                    .values(payment_status=PaymentStatusType.CLOSE.value)).rowcount
+                # 本事务关闭的订单仍持有行锁, 状态不会被并发的通知改变
+                rows = db.execute(select(model.trade_no, model.user_id).where(
+                    model.trade_no.in_(closable), model.payment_status == PaymentStatusType.CLOSE.value)).all()
+                db.commit()
+            order_status.publish(kind, [(row.trade_no, row.user_id, PaymentStatusType.CLOSE.value) for row in rows])
+            logger.info(f'关闭超时未支付订单({kind}): {closed} 个')
+    return retries
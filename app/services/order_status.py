@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: order_status.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/19 02:10
+
+"""
+充值订单支付状态推送
+
+收银台页面不再轮询数据库，改为等待订单状态变化：
+1. 订单状态保存在 Redis hash 中，下单时写入待支付状态，支付结果入账或关单提交后写入最终状态并发布到订单的频道
+2. 长轮询和 SSE 接口先订阅再读取状态，已是最终状态时直接返回，否则等待频道消息，超时后重新读取状态
+3. 每个进程只用一个连接按模式订阅所有订单频道，再分发给本进程中等待的请求，打开的收银台页面不占用 Redis 连接
+4. 状态不存在时(下单前已创建的订单、Redis 数据丢失)回源主库，只在状态不存在时写入，不会覆盖更新的状态
+"""
+
+import asyncio
+import json
+import os
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+import redis.asyncio
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.constants.constants import REDIS_ORDER_STATUS_PREFIX, REDIS_ORDER_STATUS_CHANNEL_PREFIX
+from app.core.log import logger
+from app.core.mysql import get_async_session
+from app.core.redis import REDIS_CONFIG, get_redis
+from app.models.finance import BalanceRechargeModel, PointRechargeModel
+from app.schemas.finance import PaymentStatusType
+
+# 订单类型 -> 订单模型
+ORDER_MODELS = {
+    'balance': BalanceRechargeModel,
+    'point': PointRechargeModel,
+}
+
+# 订单状态保留时长
+ORDER_STATUS_TTL = 86400
+# SSE 连接保活注释的发送间隔
+SSE_PING_SECONDS = 15
+# 读取订单状态使用的 Redis 连接数, 并发超过连接数时排队等待而不是报错
+status_pool_size_env = os.getenv('ORDER_STATUS_REDIS_POOL_SIZE')
+ORDER_STATUS_REDIS_POOL_SIZE = int(status_pool_size_env) if status_pool_size_env else 20
+
+# KEYS[1] 订单状态，ARGV 依次为用户ID、支付状态、过期秒数
+POPULATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'user_id', ARGV[1], 'status', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+status_pool = redis.asyncio.BlockingConnectionPool(max_connections=ORDER_STATUS_REDIS_POOL_SIZE, timeout=5,
+                                                   **REDIS_CONFIG)
+status_redis = redis.asyncio.Redis(connection_pool=status_pool)
+
+
+def _key(kind: str, trade_no: str) -> str:
+    return f'{REDIS_ORDER_STATUS_PREFIX}{kind}:{trade_no}'
+
+
+def _channel(kind: str, trade_no: str) -> str:
+    return f'{REDIS_ORDER_STATUS_CHANNEL_PREFIX}{kind}:{trade_no}'
+
+
+def _status(trade_no: str, status: int) -> dict:
+    return {
+        'trade_no': trade_no,
+        # 是否继续等待
+        'continue': 1 if status == PaymentStatusType.CREATED.value else 0,
+        # 订单状态, 前端据此处理显示, 跳转等操作
+        'status': status,
+    }
+
+
+def init(kind: str, trade_no: str, user_id: int) -> None:
+    """下单提交后写入待支付状态"""
+    try:
+        with get_redis() as redis:
+            redis.hset(_key(kind, trade_no), mapping={'user_id': user_id, 'status': PaymentStatusType.CREATED.value})
+            redis.expire(_key(kind, trade_no), ORDER_STATUS_TTL)
+    except Exception as e:
+        logger.error(f'写入订单状态失败({kind}:{trade_no})：{e}')
+
+
+def publish(kind: str, orders: list[tuple[str, int, int]]) -> None:
+    """订单状态变化提交后调用，orders 为 [(交易号, 用户ID, 支付状态), ...]"""
+    if not orders:
+        return
+    try:
+        with get_redis() as redis:
+            pipe = redis.pipeline(transaction=False)
+            for trade_no, user_id, status in orders:
+                pipe.hset(_key(kind, trade_no), mapping={'user_id': user_id, 'status': status})
+                pipe.expire(_key(kind, trade_no), ORDER_STATUS_TTL)
+                pipe.publish(_channel(kind, trade_no), json.dumps(_status(trade_no, status)))
+            pipe.execute()
+    except Exception as e:
+        logger.error(f'发布订单状态失败({kind})：{e}')
+
+
+class StatusHub:
+    """进程内的订单状态订阅，一个 Redis 连接按模式订阅所有订单频道"""
+
+    def __init__(self):
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._waiters = defaultdict(set)
+        self._task = None
+
+    def _ensure_listener(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            client = redis.asyncio.Redis(health_check_interval=30, **REDIS_CONFIG)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f'{REDIS_ORDER_STATUS_CHANNEL_PREFIX}*')
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    for future in self._waiters.get(message['channel'], ()):
+                        if not future.done():
+                            future.set_result(json.loads(message['data']))
+            except Exception as e:
+                # 断开期间发布的状态由等待超时后重新读取状态兜底
+                logger.warning(f'订单状态订阅断开, 1 秒后重连：{e}')
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+    @asynccontextmanager
+    async def subscribe(self, kind: str, trade_no: str):
+        """返回在订单状态发布时完成的 Future"""
+        self._ensure_listener()
+        channel = _channel(kind, trade_no)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[channel].add(future)
+        try:
+            yield future
+        finally:
+            self._waiters[channel].discard(future)
+            if not self._waiters[channel]:
+                del self._waiters[channel]
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._reset()
+
+
+hub = StatusHub()
+
+
+async def get_status(kind: str, trade_no: str, user_id: int) -> dict:
+    """读取订单支付状态，订单不存在或不属于当前用户时抛出 ValueError"""
+    cached = await status_redis.hgetall(_key(kind, trade_no))
+    if not cached:
+        model = ORDER_MODELS[kind]
+        # 走主库, 副本延迟可能读到已被覆盖的待支付状态
+        async with get_async_session() as db:
+            row = (await db.execute(select(model.user_id, model.payment_status)
+                                    .where(model.trade_no == trade_no))).first()
+        if row is None:
+            raise ValueError('订单不存在')
+        cached = {'user_id': row.user_id, 'status': row.payment_status}
+        await status_redis.eval(POPULATE_SCRIPT, 1, _key(kind, trade_no), row.user_id, row.payment_status,
+                                ORDER_STATUS_TTL)
+    if int(cached['user_id']) != user_id:
+        raise ValueError('订单不存在')
+    return _status(trade_no, int(cached['status']))
+
+
+async def wait_status(kind: str, trade_no: str, user_id: int, timeout: float) -> dict:
+    """长轮询：订单已是最终状态时立即返回，否则等待状态变化，最多等待 timeout 秒"""
+    async with hub.subscribe(kind, trade_no) as future:
+        status = await get_status(kind, trade_no, user_id)
+        if not status['continue']:
+            return status
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return await get_status(kind, trade_no, user_id)
+
+
+def _event(status: dict) -> str:
+    return f'event: status\ndata: {json.dumps(status)}\n\n'
+
+
+async def _events(kind: str, trade_no: str, user_id: int, timeout: float):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    async with hub.subscribe(kind, trade_no) as future:
+        status = await get_status(kind, trade_no, user_id)
+        yield _event(status)
+        if not status['continue']:
+            return
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                yield _event(await asyncio.wait_for(asyncio.shield(future), min(remaining, SSE_PING_SECONDS)))
+                return
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+        status = await get_status(kind, trade_no, user_id)
+        if not status['continue']:
+            yield _event(status)
+
+
+async def event_response(kind: str, trade_no: str, user_id: int, timeout: float) -> StreamingResponse:
+    """
+    SSE：先推送当前状态，状态变化时推送最终状态后结束，超过 timeout 秒仍未支付时结束，由浏览器自动重连
+    订单不存在时在响应开始前抛出 ValueError
+    """
+    await get_status(kind, trade_no, user_id)
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return StreamingResponse(_events(kind, trade_no, user_id, timeout), media_type='text/event-stream',
+                             headers=headers)
@@ -16,6 +16,7 @@ from app.models.payment_settings import PaymentChannelModel
 from app.schemas.payment_channel import PaymentChannelForm, SearchQuery
 from app.schemas.schemas import StatusType, MysqlBoolType
 from app.utils.helper import serialize_datetime
+from app.utils.pagination import paginate
 
 
 def get(id: int) -> PaymentChannelModel | None:
@@ -26,22 +27,22 @@ def get(id: int) -> PaymentChannelModel | None:
         return None
 
 
+def build_query(db, params: SearchQuery):
+    """构建支付渠道查询，列表与导出共用"""
+    query = db.query(PaymentChannelModel).order_by(desc('id'))
+    if params.key:
+        query = query.filter(PaymentChannelModel.key.like(f'%{params.key}%'))
+    if params.name:
+        query = query.filter(PaymentChannelModel.name.like(f'%{params.name}%'))
+    if isinstance(params.status, StatusType):
+        query = query.filter(PaymentChannelModel.status == params.status.value)
+    return query
+
+
 def lists(params: SearchQuery) -> dict:
-    total = -1
-    export = True if params.export == 1 else False
     with get_session(read_only=True) as db:
-        query = db.query(PaymentChannelModel).order_by(desc('id'))
-        if params.key:
-            query = query.filter(PaymentChannelModel.key.like(f'%{params.key}%'))
-        if params.name:
-            query = query.filter(PaymentChannelModel.name.like(f'%{params.name}%'))
-        if isinstance(params.status, StatusType):
-            query = query.filter(PaymentChannelModel.status == params.status.value)
-        if not export:
-            total = query.count()
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return {"total": total, "items": query.all()}
+        query = build_query(db, params)
+        return paginate(query, PaymentChannelModel, params)
 
 
 def add(params: PaymentChannelForm) -> None:
@@ -10,11 +10,13 @@ from sqlalchemy.sql.expression import asc, desc
 
 from app.constants.constants import REDIS_PAYMENT_CONFIG
 from app.core.mysql import get_session
+from app.core.payment import payment_manager
 from app.core.redis import get_redis
 from app.models.payment_settings import PaymentConfigModel, PaymentChannelModel
 from app.schemas.payment_config import PaymentConfigForm, PaymentConfigStatusForm, SearchQuery
 from app.schemas.schemas import StatusType, MysqlBoolType
 from app.utils.helper import serialize_datetime
+from app.utils.pagination import paginate
 
 
 def get(id: int) -> PaymentConfigModel | None:
@@ -25,22 +27,22 @@ def get(id: int) -> PaymentConfigModel | None:
         return None
 
 
+def build_query(db, params: SearchQuery):
+    """构建支付配置查询，列表与导出共用"""
+    query = db.query(PaymentConfigModel).order_by(desc('id'))
+    if isinstance(params.channel_id, int):
+        query = query.filter(PaymentConfigModel.channel_id == params.channel_id)
+    if isinstance(params.status, StatusType):
+        query = query.filter(PaymentConfigModel.status == params.status.value)
+    if params.name:
+        query = query.filter(PaymentConfigModel.name.like(f'%{params.name}%'))
+    return query
+
+
 def lists(params: SearchQuery) -> dict:
-    total = -1
-    export = True if params.export == 1 else False
     with get_session(read_only=True) as db:
-        query = db.query(PaymentConfigModel).order_by(desc('id'))
-        if isinstance(params.channel_id, int):
-            query = query.filter(PaymentConfigModel.channel_id == params.channel_id)
-        if isinstance(params.status, StatusType):
-            query = query.filter(PaymentConfigModel.status == params.status.value)
-        if params.name:
-            query = query.filter(PaymentConfigModel.name.like(f'%{params.name}%'))
-        if not export:
-            total = query.count()
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return {"total": total, "items": query.all()}
+        query = build_query(db, params)
+        return paginate(query, PaymentConfigModel, params)
 
 
 def add(params: PaymentConfigForm) -> None:
@@ -143,6 +145,8 @@ def update_cache(current_model: PaymentConfigModel, is_delete: bool = False) ->
                 redis.hset(REDIS_PAYMENT_CONFIG, params["miniappid"], cache_content)
         else:
             redis.hdel(REDIS_PAYMENT_CONFIG, current_model.appid)
+    # 已缓存的支付实例使用的是旧配置
+    payment_manager.invalidate()
 
 
 def rebuild_cache() -> None:
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: payment_notify.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/19 00:30
+
+"""
+支付异步通知
+
+支付网关在应答慢时会频繁重发通知，通知处理分为三个阶段，应答只等待第一阶段：
+1. 接收：在同一个 Lua 脚本中按商户订单号去重并把通知原文写入 Redis Stream，写入后即应答成功，
+   同一订单号内容相同的重复通知直接应答成功(Redis 需开启 AOF 持久化)
+2. 验签：由 app.notify_worker 批量读取，在进程池中验签(支付宝 RSA 验签占用 CPU)
+3. 入账：验签通过的通知按订单类型批量加锁读取订单，更新支付状态，每种订单一次提交，提交后投递动账任务
+   提交前把动账任务记录到 Redis，投递成功后删除，投递失败的由定时任务补投
+NOTIFY_PIPELINE=0(默认)时在请求中依次执行三个阶段，按处理结果应答
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import redis.asyncio
+from sqlalchemy import select
+
+from app.constants.constants import REDIS_NOTIFY_STREAM, REDIS_NOTIFY_SEEN_PREFIX, REDIS_NOTIFY_DISPATCH
+from app.core.log import logger
+from app.core.mysql import get_session
+from app.core.payment import payment_manager
+from app.core.redis import REDIS_CONFIG, get_redis
+from app.core.single_celery import app_single, dispatch
+from app.models.finance import BalanceRechargeModel, PointRechargeModel
+from app.schemas.finance import PaymentChannelType, PaymentStatusType
+from app.services import balance_recharge, finance, order_status
+
+# 异步通知流水线模式, 通知写入 Redis Stream 后立即应答, 由 app.notify_worker 验签入账
+NOTIFY_PIPELINE = os.getenv('NOTIFY_PIPELINE') == '1'
+# 每批最多处理的通知条数
+batch_size_env = os.getenv('NOTIFY_BATCH_SIZE')
+NOTIFY_BATCH_SIZE = int(batch_size_env) if batch_size_env else 200
+# 不足一批时最多等待的毫秒数
+batch_linger_env = os.getenv('NOTIFY_BATCH_LINGER_MS')
+NOTIFY_BATCH_LINGER_MS = int(batch_linger_env) if batch_linger_env else 50
+# 验签进程数
+verify_processes_env = os.getenv('NOTIFY_VERIFY_PROCESSES')
+NOTIFY_VERIFY_PROCESSES = int(verify_processes_env) if verify_processes_env else os.cpu_count() or 1
+# 去重记录保留秒数, 需覆盖支付网关的重发周期(支付宝约 25 小时)
+seen_ttl_env = os.getenv('NOTIFY_SEEN_TTL')
+NOTIFY_SEEN_TTL = int(seen_ttl_env) if seen_ttl_env else 172800
+# 接收通知使用的 Redis 连接数, 并发超过连接数时排队等待而不是报错
+redis_pool_size_env = os.getenv('NOTIFY_REDIS_POOL_SIZE')
+NOTIFY_REDIS_POOL_SIZE = int(redis_pool_size_env) if redis_pool_size_env else 50
+NOTIFY_STREAM_GROUP = 'payment_notify'
+# 待投递记录超过此秒数仍未删除时由定时任务补投, 需大于入账事务的最长耗时
+REDISPATCH_AFTER_SECONDS = 60
+
+# 订单类型 -> (订单模型, 生成动账任务的函数)
+ORDERS = {
+    'balance': (BalanceRechargeModel, balance_recharge.recharge_ledger_tasks),
+    'point': (PointRechargeModel, finance.point_ledger_tasks),
+}
+
+CHANNELS = (PaymentChannelType.WECHATPAY.value, PaymentChannelType.ALIPAY.value)
+
+# KEYS[1] 去重集合，KEYS[2] 通知流，ARGV 依次为通知摘要、去重记录保留秒数、通知原文
+# 写入时不裁剪通知流，由 worker 按已确认的位置裁剪，积压的通知不会被裁掉
+ACCEPT_SCRIPT = """
+if redis.call('SADD', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('XADD', KEYS[2], '*', 'data', ARGV[3])
+return 1
+"""
+
+# KEYS[1] 待投递记录，ARGV 依次为记录键、读取时的记录内容，内容未变时才删除，避免删掉重试时新写入的记录
+DISCARD_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+notify_pool = redis.asyncio.BlockingConnectionPool(max_connections=NOTIFY_REDIS_POOL_SIZE, timeout=5,
+                                                   **REDIS_CONFIG)
+accept_script = redis.asyncio.Redis(connection_pool=notify_pool).register_script(ACCEPT_SCRIPT)
+
+
+async def accept(kind: str, payment_channel: str, params: dict, content: str = None) -> bool:
+    """接收异步通知，返回是否应答成功，content 为微信通知的 XML 原文"""
+    out_trade_no = params.get('out_trade_no')
+    if kind not in ORDERS or payment_channel not in CHANNELS or not out_trade_no:
+        logger.error(f'无法识别的异步通知: {kind}/{payment_channel}', extra=params)
+        return False
+    logger.info(f'收到异步通知: {payment_channel}', extra=params)
+    record = {'kind': kind, 'channel': payment_channel, 'params': params, 'content': content,
+              'received_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+    if not NOTIFY_PIPELINE:
+        return await asyncio.to_thread(process, record)
+
+    digest = hashlib.sha1((content or json.dumps(params, sort_keys=True)).encode()).hexdigest()
+    added = await accept_script(keys=[f'{REDIS_NOTIFY_SEEN_PREFIX}{kind}:{out_trade_no}', REDIS_NOTIFY_STREAM],
+                                args=[digest, NOTIFY_SEEN_TTL, json.dumps(record, ensure_ascii=False)])
+    if not added:
+        logger.info(f'重复的异步通知, 本次忽略: {out_trade_no}')
+    return True
+
+
+def verify(record: dict, client=None) -> dict | None:
+    """
+    验证通知签名，返回订单号、支付结果等，验签失败时返回 None
+    client 为空时按通知中的 appid 获取支付实例，获取失败(如 Redis 不可用)时抛出异常，由调用方稍后重试
+    """
+    params = dict(record['params'])
+    if record['channel'] == PaymentChannelType.ALIPAY.value:
+        appid = params.get('app_id')
+        client = client or payment_manager.get_instance('alipay', appid=appid)
+        signature = params.pop('sign', None)
+        try:
+            success = bool(signature) and client.verify(params, signature)
+        except Exception:
+            success = False
+        is_ok = params.get('trade_status') in ('TRADE_SUCCESS', 'TRADE_FINISHED')
+    else:
+        # 如果是微信小程序支付, appid 返回的是小程序的 appid, 由于已经做了缓存适配，可以直接使用 appid 参数
+        appid = params.get('appid')
+        client = client or payment_manager.get_instance('wechat', appid=appid)
+        try:
+            params = client.parse_payment_result(record['content'])
+            success = True
+        except Exception:
+            success = False
+        is_ok = params.get('return_code') == 'SUCCESS' and params.get('result_code') == 'SUCCESS'
+    if not success:
+        return None
+    return {'kind': record['kind'], 'channel': record['channel'], 'out_trade_no': params.get('out_trade_no'),
+            'appid': appid, 'is_ok': is_ok, 'response': params}
+
+
+def apply_notifications(results: list[dict]) -> dict:
+    """
+    按验签结果批量更新订单并投递动账任务，返回 {(订单类型, 商户订单号): 订单是否存在}
+    只有待支付和已关闭的订单接受通知，重复通知及已处理的订单被忽略
+    """
+    found = {}
+    grouped = defaultdict(list)
+    for result in results:
+        grouped[result['kind']].append(result)
+
+    for kind, items in grouped.items():
+        model, ledger_tasks = ORDERS[kind]
+        with get_session() as db:
+            # 按交易号顺序加锁, 多个 worker 同时处理时不会交叉加锁
+            orders = {order.trade_no: order for order in db.execute(
+                select(model).where(model.trade_no.in_({item['out_trade_no'] for item in items}))
+                .order_by(model.trade_no).with_for_update()).scalars()}
+            tasks = {}
+            changed = []
+            for item in items:
+                order = orders.get(item['out_trade_no'])
+                found[(kind, item['out_trade_no'])] = order is not None
+                if order is None:
+                    logger.info('订单不存在', extra=item['response'])
+                    continue
+                if order.payment_status not in (PaymentStatusType.CREATED.value, PaymentStatusType.CLOSE.value):
+                    logger.info(f'订单状态异常: payment_status={order.payment_status}, 不接受异步通知',
+                                extra=item['response'])
+                    continue
+                order.payment_appid = item['appid']
+                order.payment_status = PaymentStatusType.SUCCESS.value if item['is_ok'] else \
+                    PaymentStatusType.FAIL.value
+                order.payment_channel = item['channel']
+                order.payment_time = datetime.now()
+                order.payment_response = json.dumps(item['response'], default=str)
+                changed.append((order.trade_no, order.user_id, order.payment_status))
+                if item['is_ok']:
+                    tasks[order.trade_no] = ledger_tasks(order)
+
+            # 提交前记录待投递的动账任务, 记录失败时不提交, 通知稍后重新处理
+            record_pending(kind, tasks)
+            db.commit()
+        # 提交后再投递动账, 投递失败的由 redispatch_pending 补投, 重复的动账由幂等键拦截
+        dispatch_pending(kind, tasks)
+        # 通知等待支付结果的收银台页面
+        order_status.publish(kind, changed)
+    return found
+
+
+def record_pending(kind: str, tasks: dict) -> None:
+    """记录待投递的动账任务，tasks 为 {商户订单号: [(任务, 动账数据), ...]}"""
+    if not tasks:
+        return
+    recorded_at = int(time.time())
+    with get_redis() as redis:
+        redis.hset(REDIS_NOTIFY_DISPATCH, mapping={
+            f'{kind}:{trade_no}': json.dumps({'at': recorded_at, 'tasks': [(task.name, data) for task, data in items]},
+                                             default=str)
+            for trade_no, items in tasks.items()})
+
+
+def dispatch_pending(kind: str, tasks: dict) -> None:
+    """投递动账任务并删除待投递记录，投递失败时保留记录等待补投"""
+    for trade_no, items in tasks.items():
+        try:
+            for task, data in items:
+                task_result = dispatch(task, data)
+                logger.info(f'发送动账任务: {task_result.id}', extra=data)
+            with get_redis() as redis:
+                redis.hdel(REDIS_NOTIFY_DISPATCH, f'{kind}:{trade_no}')
+        except Exception as e:
+            logger.error(f'动账任务投递失败, 等待补投({kind}:{trade_no})：{e}')
+
+
+def redispatch_pending(min_age: int = REDISPATCH_AFTER_SECONDS) -> int:
+    """
+    补投入账已提交但投递失败的动账任务，返回补投的订单数
+    订单仍为待支付或已关闭说明入账未提交，通知会重新处理，直接删除记录
+    """
+    with get_redis() as redis:
+        entries = redis.hgetall(REDIS_NOTIFY_DISPATCH)
+    deadline = time.time() - min_age
+    grouped = defaultdict(dict)
+    for key, value in entries.items():
+        if json.loads(value)['at'] > deadline:
+            continue
+        kind, trade_no = key.split(':', 1)
+        grouped[kind][trade_no] = value
+
+    count = 0
+    for kind, values in grouped.items():
+        model, _ = ORDERS[kind]
+        with get_session() as db:
+            uncommitted = set(db.execute(select(model.trade_no).where(
+                model.trade_no.in_(values.keys()),
+                model.payment_status.in_((PaymentStatusType.CREATED.value, PaymentStatusType.CLOSE.value)))).scalars())
+        with get_redis() as redis:
+            for trade_no in uncommitted:
+                redis.eval(DISCARD_SCRIPT, 1, REDIS_NOTIFY_DISPATCH, f'{kind}:{trade_no}', values[trade_no])
+        tasks = {trade_no: [(app_single.tasks[name], data) for name, data in json.loads(value)['tasks']]
+                 for trade_no, value in values.items() if trade_no not in uncommitted}
+        dispatch_pending(kind, tasks)
+        count += len(tasks)
+    return count
+
+
+def process(record: dict) -> bool:
+    """在当前进程中验签并入账，返回订单是否存在"""
+    result = verify(record)
+    if result is None:
+        logger.error(f'签名验证失败: {record["channel"]}', extra=record['params'])
+        return False
+    return apply_notifications([result])[(result['kind'], result['out_trade_no'])]
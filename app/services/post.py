@@ -11,6 +11,8 @@ from app.core.mysql import get_session
 from app.models.cms import PostModel
 from app.schemas.post import PostForm, SearchQuery
 from app.schemas.schemas import StatusType
+from app.utils import fulltext
+from app.utils.pagination import paginate
 
 
 def get(id: int) -> PostModel | None:
@@ -21,30 +23,30 @@ def get(id: int) -> PostModel | None:
         return None
 
 
+def build_query(db, params: SearchQuery):
+    """构建文章查询，列表与导出共用"""
+    query = db.query(PostModel).order_by(desc('id'))
+    if isinstance(params.id, int):
+        query = query.filter_by(id=params.id)
+    if isinstance(params.pid, int):
+        query = query.filter_by(pid=params.pid)
+    if isinstance(params.category_id, int):
+        query = query.filter_by(category_id=params.category_id)
+    if isinstance(params.user_id, int):
+        query = query.filter_by(user_id=params.user_id)
+    if isinstance(params.status, StatusType):
+        query = query.filter_by(status=params.status.value)
+    query = fulltext.apply_search(query, PostModel, [
+        (PostModel.title, params.title),
+        (PostModel.keywords, params.keywords),
+    ], params)
+    return query
+
+
 def lists(params: SearchQuery) -> dict:
-    total = -1
-    export = True if params.export == 1 else False
     with get_session(read_only=True) as db:
-        query = db.query(PostModel).order_by(desc('id'))
-        if isinstance(params.id, int):
-            query = query.filter_by(id=params.id)
-        if isinstance(params.pid, int):
-            query = query.filter_by(pid=params.pid)
-        if isinstance(params.category_id, int):
-            query = query.filter_by(category_id=params.category_id)
-        if isinstance(params.user_id, int):
-            query = query.filter_by(user_id=params.user_id)
-        if params.title:
-            query = query.filter(PostModel.title.like(f'%{params.title}%'))
-        if params.keywords:
-            query = query.filter(PostModel.keywords.like(f'%{params.keywords}%'))
-        if isinstance(params.status, StatusType):
-            query = query.filter_by(status=params.status.value)
-        if not export:
-            total = query.count()
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return {"total": total, "items": query.all()}
+        query = build_query(db, params)
+        return paginate(query, PostModel, params)
 
 
 def add(params: PostForm) -> None:
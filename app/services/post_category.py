@@ -11,6 +11,7 @@ from app.core.mysql import get_session
 from app.models.cms import PostCategoryModel
 from app.schemas.post_category import PostCategoryForm, SearchQuery
 from app.schemas.schemas import StatusType
+from app.utils.pagination import paginate
 
 
 def get(id: int) -> PostCategoryModel | None:
@@ -21,18 +22,18 @@ def get(id: int) -> PostCategoryModel | None:
         return None
 
 
+def build_query(db, params: SearchQuery):
+    """构建文章分类查询，列表与导出共用"""
+    query = db.query(PostCategoryModel).order_by(desc('id'))
+    if isinstance(params.status, StatusType):
+        query = query.filter_by(status=params.status.value)
+    return query
+
+
 def lists(params: SearchQuery) -> dict:
-    total = -1
-    export = True if params.export == 1 else False
     with get_session(read_only=True) as db:
-        query = db.query(PostCategoryModel).order_by(desc('id'))
-        if isinstance(params.status, StatusType):
-            query = query.filter_by(status=params.status.value)
-        if not export:
-            total = query.count()
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return {"total": total, "items": query.all()}
+        query = build_query(db, params)
+        return paginate(query, PostCategoryModel, params)
 
 
 def add(params: PostCategoryForm) -> None:
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: reconcile.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 22:10
+
+"""
+流水对账
+
+按主键顺序分段读取流水表，用 NumPy/pandas 向量化计算每个用户的累计动账，与每行记录的 balance 比对：
+1. 每个用户只报告第一条不一致的流水，之后的流水都会受其影响
+2. 全表扫描完成后，再用累计结果与钱包表比对
+3. 金额在 SQL 中放大为整数读取，避免 Decimal 对象和浮点误差
+4. 用户的累计值保存在以用户ID为下标的数组中，跨分段时无需查字典
+报告写入 runtime/reconcile/，不一致的流水另存为 CSV
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import select, func, cast, BigInteger
+
+from app.constants.constants import RUNTIME_PATH
+from app.core.log import logger
+from app.core.mysql import get_session, get_stream_session
+from app.models.finance import BalanceModel, BalanceGiftModel, PointModel, WalletModel
+from app.services import archive
+
+# 对账报告存放目录
+RECONCILE_PATH = os.path.join(RUNTIME_PATH, 'reconcile')
+
+# 每次从数据库拉取并向量化计算的行数
+reconcile_chunk_size_env = os.getenv("RECONCILE_CHUNK_SIZE")
+RECONCILE_CHUNK_SIZE = int(reconcile_chunk_size_env) if reconcile_chunk_size_env else 200000
+
+# 报告中最多列出的不一致用户数, 完整列表见 CSV
+REPORT_SAMPLE_SIZE = 100
+
+
+class Ledger(NamedTuple):
+    model: type
+    # 钱包表中对应的字段
+    wallet_field: str
+    # 金额放大倍数, DECIMAL(10, 4) 放大 10000 倍后为整数
+    scale: int
+
+
+LEDGERS = {
+    'balance': Ledger(BalanceModel, 'balance', 10000),
+    'balance_gift': Ledger(BalanceGiftModel, 'balance_gift', 10000),
+    'point': Ledger(PointModel, 'point', 1),
+}
+
+
+def _scaled(column, scale: int):
+    return cast(column * scale, BigInteger) if scale != 1 else column
+
+
+class _UserState:
+    """以用户ID为下标保存累计值，用户ID超出数组长度时扩容"""
+
+    def __init__(self, size: int):
+        import numpy as np
+
+        self.expected = np.zeros(size + 1, dtype=np.int64)
+        self.seen = np.zeros(size + 1, dtype=bool)
+        self.flagged = np.zeros(size + 1, dtype=bool)
+
+    def ensure(self, max_user_id: int) -> None:
+        import numpy as np
+
+        if max_user_id < len(self.seen):
+            return
+        extra = max(max_user_id + 1, len(self.seen) * 2) - len(self.seen)
+        self.expected = np.concatenate([self.expected, np.zeros(extra, dtype=np.int64)])
+        self.seen = np.concatenate([self.seen, np.zeros(extra, dtype=bool)])
+        self.flagged = np.concatenate([self.flagged, np.zeros(extra, dtype=bool)])
+
+
+def _check_chunk(df, state: _UserState, trust_first_row: bool):
+    """校验一段按 id 升序排列的流水，返回本段中各用户第一条不一致的流水"""
+    import numpy as np
+
+    uid = df['user_id'].to_numpy()
+    state.ensure(int(uid.max()))
+
+    grouped = df.groupby('user_id', sort=False)
+    # 之前分段出现过的用户从累计值继续，首次出现的用户从 0 开始，不能从头对账时信任第一条流水
+    if trust_first_row:
+        initial = (grouped['balance'].transform('first') - grouped['amount'].transform('first')).to_numpy()
+    else:
+        initial = np.zeros(len(df), dtype=np.int64)
+    base = np.where(state.seen[uid], state.expected[uid], initial)
+    expected = base + grouped['amount'].cumsum().to_numpy()
+
+    mismatch = (expected != df['balance'].to_numpy()) & ~state.flagged[uid]
+    divergent = df[mismatch].assign(expected=expected[mismatch]).drop_duplicates('user_id')
+    state.flagged[divergent['user_id'].to_numpy()] = True
+
+    last = ~df['user_id'].duplicated(keep='last').to_numpy()
+    state.expected[uid[last]] = expected[last]
+    state.seen[uid[last]] = True
+    return divergent
+
+
+def _check_wallets(ledger: Ledger, state: _UserState, max_user_id: int, scanned_at: datetime,
+                   trust_first_row: bool):
+    """
+    用流水累计结果与钱包表比对，跳过扫描开始后钱包有变化的用户
+    信任第一条流水时，库中没有流水的用户无法核对，只比对有流水的用户
+    """
+    import numpy as np
+    import pandas as pd
+
+    with get_session(read_only=True) as db:
+        rows = db.execute(select(WalletModel.user_id, _scaled(getattr(WalletModel, ledger.wallet_field), ledger.scale))
+                          .where(WalletModel.user_id <= max_user_id, WalletModel.updated_at < scanned_at)).all()
+        changed = db.execute(select(WalletModel.user_id).where(WalletModel.updated_at >= scanned_at)).scalars().all()
+    wallet = pd.DataFrame(rows, columns=['user_id', 'wallet'], dtype=np.int64)
+    seen_users = np.flatnonzero(state.seen)
+    expected = pd.DataFrame({'user_id': seen_users, 'expected': state.expected[seen_users]})
+    expected = expected[~expected['user_id'].isin(changed)]
+    merged = expected.merge(wallet, on='user_id', how='left' if trust_first_row else 'outer').fillna(0)
+    return merged[merged['expected'] != merged['wallet']].copy()
+
+
+def reconcile(name: str, trust_first_row: bool = None) -> dict:
+    """
+    对账一种流水，返回报告摘要
+    trust_first_row 为 None 时，流水表已有归档(早期数据不在库中)则信任每个用户在库中的第一条流水
+    """
+    import numpy as np
+    import pandas as pd
+
+    ledger = LEDGERS[name]
+    model = ledger.model
+    table = model.__tablename__
+    if trust_first_row is None:
+        trust_first_row = archive.has_archive(table)
+
+    started = time.perf_counter()
+    with get_session(read_only=True) as db:
+        max_id, max_user_id, db_now = db.execute(select(func.max(model.id), func.max(model.user_id),
+                                                        func.now())).one()
+    state = _UserState(max_user_id or 0)
+
+    stmt = select(model.id, model.user_id, _scaled(model.amount, ledger.scale),
+                  _scaled(model.balance, ledger.scale)).where(model.id <= (max_id or 0)).order_by(model.id)
+    columns = ['id', 'user_id', 'amount', 'balance']
+    rows = 0
+    divergent = []
+    with get_stream_session(read_only=True) as db:
+        result = db.execute(stmt.execution_options(yield_per=RECONCILE_CHUNK_SIZE))
+        for chunk in result.partitions():
+            df = pd.DataFrame(chunk, columns=columns, dtype=np.int64)
+            found = _check_chunk(df, state, trust_first_row)
+            if len(found):
+                divergent.append(found)
+            rows += len(df)
+    divergent = pd.concat(divergent) if divergent else pd.DataFrame(columns=columns + ['expected'])
+    wallets = _check_wallets(ledger, state, max_user_id or 0, db_now, trust_first_row)
+
+    os.makedirs(RECONCILE_PATH, exist_ok=True)
+    prefix = os.path.join(RECONCILE_PATH, f'{table}_{datetime.now():%Y%m%d%H%M%S}')
+    for frame in (divergent, wallets):
+        for column in ('amount', 'balance', 'expected', 'wallet'):
+            if column in frame:
+                frame[column] = frame[column] / ledger.scale
+    divergent.to_csv(f'{prefix}_rows.csv', index=False)
+    wallets.to_csv(f'{prefix}_wallets.csv', index=False)
+
+    report = {
+        'table': table,
+        'rows': rows,
+        'users': int(state.seen.sum()),
+        'max_id': max_id,
+        'trust_first_row': trust_first_row,
+        'divergent_users': len(divergent),
+        'wallet_mismatches': len(wallets),
+        'seconds': round(time.perf_counter() - started, 2),
+        'divergent_sample': json.loads(divergent.head(REPORT_SAMPLE_SIZE).to_json(orient='records')),
+        'wallet_sample': json.loads(wallets.head(REPORT_SAMPLE_SIZE).to_json(orient='records')),
+    }
+    with open(f'{prefix}.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    log = logger.warning if report['divergent_users'] or report['wallet_mismatches'] else logger.info
+    log(f'{table} 对账完成: {rows} 行, 流水不一致用户 {report["divergent_users"]} 个, '
+        f'钱包不一致用户 {report["wallet_mismatches"]} 个, 耗时 {report["seconds"]} 秒, 报告: {prefix}.json')
+    return report
@@ -9,33 +9,30 @@
 from sqlalchemy import text
 from sqlalchemy.sql.expression import desc
 
+from app.core import lookup
 from app.core.mysql import get_session
 from app.models.user import RoleModel
 from app.schemas.role import RoleForm, SearchQuery
+from app.utils.pagination import paginate
 
 
 def get(id: int) -> RoleModel | None:
     with get_session(read_only=True) as db:
-        role = db.query(RoleModel).filter(RoleModel.id == id).first()
+        return lookup.role_by_id.first(db, id)
 
-    if role is not None:
-        return role
 
-    return None
+def build_query(db, params: SearchQuery):
+    """构建角色查询，列表与导出共用"""
+    query = db.query(RoleModel).order_by(desc('id'))
+    if params.name:
+        query = query.filter(RoleModel.name.like(f'%{params.name}%'))
+    return query
 
 
 def lists(params: SearchQuery) -> dict:
-    total = -1
-    export = True if params.export == 1 else False
     with get_session(read_only=True) as db:
-        query = db.query(RoleModel).order_by(desc('id'))
-        if params.name:
-            query = query.filter(RoleModel.name.like(f'%{params.name}%'))
-        if not export:
-            total = query.count()
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return {"total": total, "items": query.all()}
+        query = build_query(db, params)
+        return paginate(query, RoleModel, params)
 
 
 def add(params: RoleForm) -> None:
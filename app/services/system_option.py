@@ -10,10 +10,12 @@ import json
 from sqlalchemy.sql.expression import desc
 
 from app.constants.constants import REDIS_SYSTEM_OPTIONS_AUTOLOAD
+from app.core import lookup
 from app.core.mysql import get_session
 from app.core.redis import get_redis
 from app.models.system_option import SystemOptionModel
 from app.schemas.system_option import SystemOptionForm, SystemOptionItem, SearchQuery
+from app.utils.pagination import paginate
 
 
 def get(id: int) -> SystemOptionModel | None:
@@ -35,33 +37,29 @@ def get_from_cache(option_name: str) -> SystemOptionItem:
 
 def get_by_name(option_name: str) -> SystemOptionModel | None:
     with get_session(read_only=True) as db:
-        current_model = db.query(SystemOptionModel).filter(
-            SystemOptionModel.option_name == option_name).first()
-        if current_model is not None:
-            return current_model
-        return None
+        return lookup.system_option_by_name.first(db, option_name)
+
+
+def build_query(db, params: SearchQuery):
+    """构建系统选项查询，列表与导出共用"""
+    query = db.query(SystemOptionModel).order_by(desc('id'))
+    if params.option_name:
+        query = query.filter(
+            SystemOptionModel.option_name.like(f'%{params.option_name}%'))
+    if params.memo:
+        query = query.filter(
+            SystemOptionModel.memo.like(f'%{params.memo}%'))
+    if params.locked in (0, 1):
+        query = query.filter(SystemOptionModel.lock == params.locked)
+    if params.public in (0, 1):
+        query = query.filter(SystemOptionModel.public == params.public)
+    return query
 
 
 def lists(params: SearchQuery) -> dict:
-    total = -1
-    export = True if params.export == 1 else False
     with get_session(read_only=True) as db:
-        query = db.query(SystemOptionModel).order_by(desc('id'))
-        if params.option_name:
-            query = query.filter(
-                SystemOptionModel.option_name.like(f'%{params.option_name}%'))
-        if params.memo:
-            query = query.filter(
-                SystemOptionModel.memo.like(f'%{params.memo}%'))
-        if params.locked in (0, 1):
-            query = query.filter(SystemOptionModel.lock == params.locked)
-        if params.public in (0, 1):
-            query = query.filter(SystemOptionModel.public == params.public)
-        if not export:
-            total = query.count()
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return {"total": total, "items": query.all()}
+        query = build_query(db, params)
+        return paginate(query, SystemOptionModel, params)
 
 
 def add(params: SystemOptionForm) -> None:
@@ -9,13 +9,16 @@ import datetime
 import secrets
 import time
 
-from sqlalchemy.sql.expression import desc, or_
+from sqlalchemy.sql.expression import desc
 
-from app.core.mysql import get_session
+from app.core import lookup
+from app.core.mysql import get_session, get_async_session
 from app.core.security import encode_password
 from app.models.user import UserModel
 from app.schemas.schemas import StatusType
 from app.schemas.user import GenderType, JoinFromType, UserForm, SearchQuery, SimpleSearchQuery
+from app.utils import fulltext
+from app.utils.pagination import paginate
 
 
 def safe_whitelist_fields(user_data: dict) -> dict:
@@ -25,53 +28,55 @@ def safe_whitelist_fields(user_data: dict) -> dict:
     return {k: v for k, v in user_data.items() if k in safe_fields}
 
 
-def get(id: int) -> UserModel | None:
+def get(id: int, result_type: lookup.ResultType = lookup.ResultType.MODEL) -> UserModel | None:
     with get_session(read_only=True) as db:
-        current_model = db.query(UserModel).filter(UserModel.id == id).first()
-        if current_model is not None:
-            return current_model
-        return None
+        return lookup.user_by_id.first(db, id, result_type)
+
+
+async def get_async(id: int, result_type: lookup.ResultType = lookup.ResultType.MODEL) -> UserModel | None:
+    async with get_async_session(read_only=True) as db:
+        return await lookup.user_by_id.first_async(db, id, result_type)
+
+
+def build_query(db, params: SearchQuery):
+    """构建用户查询，列表与导出共用"""
+    query = db.query(UserModel).order_by(desc('id'))
+    if isinstance(params.id, int):
+        query = query.filter_by(id=params.id)
+    if isinstance(params.pid, int):
+        query = query.filter_by(pid=params.pid)
+    if isinstance(params.role_id, int):
+        query = query.filter_by(role_id=params.role_id)
+    if isinstance(params.status, int):
+        query = query.filter_by(status=params.status)
+    # 手机号和邮箱按子串匹配, 全文检索会把邮箱中的 @ 等字符当作分隔符
+    if params.phone:
+        query = query.filter(UserModel.phone.like(f'%{params.phone}%'))
+    if params.email:
+        query = query.filter(UserModel.email.like(f'%{params.email}%'))
+    return fulltext.apply_search(query, UserModel, [(UserModel.nickname, params.nickname)], params)
 
 
 def lists(params: SearchQuery) -> dict:
-    total = -1
-    export = True if params.export == 1 else False
     with get_session(read_only=True) as db:
-        query = db.query(UserModel).order_by(desc('id'))
-        if params.nickname:
-            query = query.filter(
-                UserModel.nickname.like(f'%{params.nickname}%'))
-        if params.phone:
-            query = query.filter(UserModel.phone.like(f'%{params.phone}%'))
-        if params.email:
-            query = query.filter(UserModel.email.like(f'%{params.email}%'))
-        if isinstance(params.id, int):
-            query = query.filter_by(id=params.id)
-        if isinstance(params.pid, int):
-            query = query.filter_by(pid=params.pid)
-        if isinstance(params.role_id, int):
-            query = query.filter_by(role_id=params.role_id)
-        if isinstance(params.status, int):
-            query = query.filter_by(status=params.status)
-        if not export:
-            total = query.count()
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return {"total": total, "items": query.all()}
+        query = build_query(db, params)
+        return paginate(query, UserModel, params, estimate=True)
 
 
 def simple_lists(params: SimpleSearchQuery) -> dict:
     with get_session(read_only=True) as db:
         query = db.query(UserModel.id, UserModel.nickname, UserModel.phone, UserModel.email).order_by(desc('id'))
-        if params.keyword.isnumeric():
-            query = query.filter(or_(
-                UserModel.id == params.keyword,
-                UserModel.phone.like(f'%{params.keyword}%')
-            ))
+        keyword = str(params.keyword)
+        items = []
+        if keyword.isnumeric():
+            # ID 精确匹配与手机号查询分开执行，OR 条件会导致主键也无法使用
+            items = query.filter(UserModel.id == int(keyword)).all()
+            query = query.filter(UserModel.phone.like(f'%{keyword}%'))
+            if items:
+                query = query.filter(UserModel.id != items[0].id)
         else:
-            query = query.filter(UserModel.nickname.like(f'%{params.keyword}%'))
-        query.offset(0).limit(params.limit)
-        items = query.all()
+            query = fulltext.apply_search(query, UserModel, [(UserModel.nickname, keyword)])
+        items += query.limit(params.limit - len(items)).all()
         return {"total": len(items), "items": items}
 
 
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: wallet.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 22:50
+
+"""
+用户余额缓存
+
+每个用户一个 Redis hash，保存余额、赠送余额、积分及钱包版本号：
+1. 动账任务提交后把事务内读到的钱包写入缓存(write-through)，写入失败时删除缓存
+2. 写入前比较版本号，只有比缓存更新的钱包才会覆盖，并发写入与回源时旧值不会覆盖新值
+3. 缓存未命中时只允许一个请求回源主库，其他请求短暂等待缓存，超时后直接读主库
+"""
+
+import time
+import uuid
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from app.constants.constants import REDIS_USER_BALANCES_PREFIX, REDIS_USER_BALANCES_LOCK_PREFIX, \
+    REDIS_USER_BALANCES_TTL
+from app.core.log import logger
+from app.core.mysql import get_session
+from app.core.redis import get_redis
+from app.models.finance import WalletModel
+
+# 回源锁的过期毫秒数
+LOCK_TTL_MS = 3000
+# 未抢到回源锁时等待缓存的次数及间隔
+WAIT_TIMES = 20
+WAIT_INTERVAL = 0.05
+
+# KEYS[1] 缓存 key，ARGV 依次为版本号、余额、赠送余额、积分、过期秒数
+CACHE_SCRIPT = """
+local version = tonumber(redis.call('HGET', KEYS[1], 'version') or '-1')
+if version >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'version', ARGV[1], 'balance', ARGV[2], 'balance_gift', ARGV[3], 'point', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+EMPTY_WALLET = {'balance': Decimal('0'), 'balance_gift': Decimal('0'), 'point': 0, 'version': 0}
+
+
+def load_wallets(db, user_ids) -> list[dict]:
+    """读取钱包快照，动账任务在提交前调用，读到的是本事务锁定的最新值"""
+    rows = db.execute(select(WalletModel.user_id, WalletModel.balance, WalletModel.balance_gift,
+                             WalletModel.point, WalletModel.version)
+                      .where(WalletModel.user_id.in_(list(user_ids)))).all()
+    return [row._asdict() for row in rows]
+
+
+def cache_balances(wallets: list[dict]) -> None:
+    """把已提交的钱包快照写入缓存，写入失败时删除缓存，下次读取回源"""
+    if not wallets:
+        return
+    try:
+        with get_redis() as redis:
+            script = redis.register_script(CACHE_SCRIPT)
+            pipe = redis.pipeline(transaction=False)
+            for wallet in wallets:
+                script(keys=[f'{REDIS_USER_BALANCES_PREFIX}{wallet["user_id"]}'],
+                       args=[wallet['version'], str(wallet['balance']), str(wallet['balance_gift']),
+                             wallet['point'], REDIS_USER_BALANCES_TTL], client=pipe)
+            pipe.execute()
+    except Exception as e:
+        logger.error(f'写入余额缓存失败：{e}')
+        invalidate_balances([wallet['user_id'] for wallet in wallets])
+
+
+def invalidate_balances(user_ids) -> None:
+    try:
+        with get_redis() as redis:
+            redis.delete(*[f'{REDIS_USER_BALANCES_PREFIX}{user_id}' for user_id in user_ids])
+    except Exception as e:
+        logger.error(f'删除余额缓存失败：{e}')
+
+
+def _decode(cached: dict) -> dict:
+    return {'balance': Decimal(cached['balance']), 'balance_gift': Decimal(cached['balance_gift']),
+            'point': int(cached['point']), 'version': int(cached['version'])}
+
+
+def _load_from_db(user_id: int) -> dict:
+    # 走主库，副本延迟可能读到比缓存更旧的钱包
+    with get_session() as db:
+        wallets = load_wallets(db, [user_id])
+    return wallets[0] if wallets else dict(EMPTY_WALLET, user_id=user_id)
+
+
+def get_balances(user_id: int) -> dict:
+    """获取用户的余额、赠送余额和积分，优先读缓存"""
+    key = f'{REDIS_USER_BALANCES_PREFIX}{user_id}'
+    with get_redis() as redis:
+        cached = redis.hgetall(key)
+        if cached:
+            return _decode(cached)
+
+        lock_key = f'{REDIS_USER_BALANCES_LOCK_PREFIX}{user_id}'
+        token = uuid.uuid4().hex
+        if redis.set(lock_key, token, nx=True, px=LOCK_TTL_MS):
+            try:
+                wallet = _load_from_db(user_id)
+                # 回源期间若有动账写入了更新的版本，脚本会放弃本次写入
+                cache_balances([wallet])
+            finally:
+                redis.eval(UNLOCK_SCRIPT, 1, lock_key, token)
+            return {k: v for k, v in wallet.items() if k != 'user_id'}
+
+        # 其他请求正在回源，等待其写入缓存
+        for _ in range(WAIT_TIMES):
+            time.sleep(WAIT_INTERVAL)
+            cached = redis.hgetall(key)
+            if cached:
+                return _decode(cached)
+
+    logger.warning(f'等待余额缓存超时({user_id})，直接读取数据库')
+    wallet = _load_from_db(user_id)
+    return {k: v for k, v in wallet.items() if k != 'user_id'}
@@ -16,6 +16,7 @@ from app.models.wechat import WechatModel
 from app.schemas.schemas import StatusType
 from app.schemas.wechat import WechatType, WechatForm, SearchQuery
 from app.utils.helper import serialize_datetime
+from app.utils.pagination import paginate
 
 
 def get(id: int) -> WechatModel | None:
@@ -27,25 +28,25 @@ def get(id: int) -> WechatModel | None:
         return None
 
 
+def build_query(db, params: SearchQuery):
+    """构建微信媒体平台查询，列表与导出共用"""
+    query = db.query(WechatModel).order_by(desc('id'))
+    if params.appid:
+        query = query.filter(
+            WechatModel.appid.like(f'%{params.appid}%'))
+    if params.appname:
+        query = query.filter(
+            WechatModel.appname.like(f'%{params.appname}%'))
+    if isinstance(params.type, WechatType):
+        query = query.filter(
+            WechatModel.type == params.type.value)
+    return query
+
+
 def lists(params: SearchQuery) -> dict:
-    total = -1
-    export = True if params.export == 1 else False
     with get_session(read_only=True) as db:
-        query = db.query(WechatModel).order_by(desc('id'))
-        if params.appid:
-            query = query.filter(
-                WechatModel.appid.like(f'%{params.appid}%'))
-        if params.appname:
-            query = query.filter(
-                WechatModel.appname.like(f'%{params.appname}%'))
-        if isinstance(params.type, WechatType):
-            query = query.filter(
-                WechatModel.type == params.type.value)
-        if not export:
-            total = query.count()
-            offset = (params.page - 1) * params.size
-            query = query.offset(offset).limit(params.size)
-        return {"total": total, "items": query.all()}
+        query = build_query(db, params)
+        return paginate(query, WechatModel, params)
 
 
 def add(params: WechatForm) -> None:
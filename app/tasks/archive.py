@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: archive.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 21:00
+
+from app.core.celery import app
+from app.core.log import logger
+from app.services import archive
+
+
+@app.task
+def archive_tables():
+    result = archive.archive_all()
+    logger.info(f'归档完成: {result}')
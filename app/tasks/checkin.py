@@ -0,0 +1,17 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: checkin.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 23:10
+
+from app.core.celery import app
+from app.core.log import logger
+from app.services import checkin
+
+
+@app.task
+def flush_checkins():
+    count = checkin.flush_pending()
+    if count:
+        logger.info(f'签到记录写库完成: {count} 条')
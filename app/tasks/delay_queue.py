@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: delay_queue.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/19 01:20
+
+from app.core import delay_queue
+from app.core.celery import app
+from app.core.log import logger
+# 导入注册了延迟队列的模块
+from app.services import order_close  # noqa: F401
+
+# 单次任务处理到期任务的最长秒数, 小于定时间隔以免多次执行重叠
+RUN_SECONDS = 4
+
+
+@app.task
+def run_delay_queues():
+    for name, count in delay_queue.run_all(max_seconds=RUN_SECONDS).items():
+        if count:
+            logger.info(f'延迟任务处理完成({name}): {count} 个')
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: export.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 14:30
+
+from app.core.celery import app
+from app.core.log import logger
+from app.services import export
+
+
+@app.task
+def export_job(job_id: str, resource: str, params: dict):
+    export.run_job(job_id, resource, params)
+
+
+@app.task
+def clean_export_files():
+    count = export.clean_expired_files()
+    logger.info(f'清理过期导出文件 {count} 个')
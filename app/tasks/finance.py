@@ -5,11 +5,32 @@
 # Email: qiuyutang@qq.com
 # Time: 2024/5/24 16:43
 
+from sqlalchemy.exc import IntegrityError
+
 from app.core.single_celery import app_single
 from app.core.mysql import get_session
 from app.schemas.finance import BalanceType, PointType
-from app.models.finance import BalanceModel, BalanceGiftModel, PointModel
+from app.models.finance import BalanceModel, BalanceGiftModel, PointModel, WalletModel
 from app.core.log import logger
+from app.services import wallet
+
+# 与订单、签到等记录一一对应的动账类型, 同一用户同一类型同一 related_id 只能入账一次
+IDEMPOTENT_TYPES = {
+    BalanceModel: {BalanceType.RECHARGE.value, BalanceType.REFUND.value},
+    BalanceGiftModel: {BalanceType.GIFT.value, BalanceType.REFUND.value},
+    PointModel: {PointType.RECHARGE.value, PointType.GIFT.value, PointType.CHECKIN.value},
+}
+
+
+def with_idempotent_id(model, data: dict) -> dict:
+    """设置流水的幂等关联ID, 重复入账由 (user_id, type, idempotent_id) 唯一键拦截"""
+    data['idempotent_id'] = data['related_id'] if data['type'] in IDEMPOTENT_TYPES[model] else None
+    return data
+
+
+def is_duplicate_key(e: IntegrityError) -> bool:
+    """MySQL 1062: Duplicate entry"""
+    return bool(e.orig and e.orig.args and e.orig.args[0] == 1062)
 
 
 # 余额处理任务
@@ -18,21 +39,21 @@ def handle_balance(data: dict):
     task_id = handle_balance.request.id
     try:
         with get_session() as db:
-            if data['type'] == BalanceType.RECHARGE.value:
-                result = db.query(BalanceModel).filter(BalanceModel.user_id == data['user_id'],
-                                                       BalanceModel.related_id == data['related_id']).first()
-                if result:
-                    logger.info(f'当前余额动账({task_id})已处理过, 本次忽略', extra=data)
-                    return
-
-            # 余额动账
-            last = db.query(BalanceModel).filter(BalanceModel.user_id == data['user_id']).order_by(
-                BalanceModel.id.desc()).first()
-            balance = last.balance if last is not None else 0
-            data['balance'] = balance + data['amount']
-
-            db.add(BalanceModel(**data))
-            db.commit()
+            # 余额动账, 先锁定钱包行使同一用户的动账排队执行, 流水记录动账后的余额
+            data['balance'] = WalletModel.increase(db, data['user_id'], 'balance', data['amount'])
+            wallets = wallet.load_wallets(db, [data['user_id']])
+            db.add(BalanceModel(**with_idempotent_id(BalanceModel, data)))
+            try:
+                db.commit()
+            except IntegrityError as e:
+                # 唯一键冲突说明已入账, 回滚本次钱包更新
+                db.rollback()
+                if not is_duplicate_key(e):
+                    raise
+                logger.info(f'当前余额动账({task_id})已处理过, 本次忽略', extra=data)
+                return
+            # 提交后写入余额缓存
+            wallet.cache_balances(wallets)
             logger.info(f'余额动账成功({task_id})', extra=data)
     except Exception as e:
         # 处理异常情况
@@ -48,21 +69,21 @@ def handle_balance_gift(data: dict):
     task_id = handle_balance.request.id
     try:
         with get_session() as db:
-            if data['type'] == BalanceType.GIFT.value:
-                result = db.query(BalanceGiftModel).filter(BalanceGiftModel.user_id == data['user_id'],
-                                                           BalanceGiftModel.related_id == data['related_id']).first()
-                if result:
-                    logger.info(f'当前赠送余额动账({task_id})已处理过, 本次忽略', extra=data)
-                    return
-
-            # 赠送余额动账
-            last = db.query(BalanceGiftModel).filter(BalanceGiftModel.user_id == data['user_id']).order_by(
-                BalanceGiftModel.id.desc()).first()
-            balance = last.balance if last is not None else 0
-            data['balance'] = balance + data['amount']
-
-            db.add(BalanceGiftModel(**data))
-            db.commit()
+            # 赠送余额动账, 先锁定钱包行使同一用户的动账排队执行, 流水记录动账后的赠送余额
+            data['balance'] = WalletModel.increase(db, data['user_id'], 'balance_gift', data['amount'])
+            wallets = wallet.load_wallets(db, [data['user_id']])
+            db.add(BalanceGiftModel(**with_idempotent_id(BalanceGiftModel, data)))
+            try:
+                db.commit()
+            except IntegrityError as e:
+                # 唯一键冲突说明已入账, 回滚本次钱包更新
+                db.rollback()
+                if not is_duplicate_key(e):
+                    raise
+                logger.info(f'当前赠送余额动账({task_id})已处理过, 本次忽略', extra=data)
+                return
+            # 提交后写入余额缓存
+            wallet.cache_balances(wallets)
             logger.info(f'赠送余额动账成功({task_id})', extra=data)
     except Exception as e:
         # 处理异常情况
@@ -78,21 +99,21 @@ def handle_point(data: dict):
     task_id = handle_point.request.id
     try:
         with get_session() as db:
-            if data['type'] == PointType.RECHARGE.value:
-                result = db.query(PointModel).filter(PointModel.user_id == data['user_id'],
-                                                     PointModel.related_id == data['related_id']).first()
-                if result:
-                    logger.info(f'当前积分动账({task_id})已处理过, 本次忽略', extra=data)
-                    return
-
-            # 积分动账
-            last = db.query(PointModel).filter(PointModel.user_id == data['user_id']).order_by(
-                PointModel.id.desc()).first()
-            balance = last.balance if last is not None else 0
-            data['balance'] = balance + data['amount']
-
-            db.add(PointModel(**data))
-            db.commit()
+            # 积分动账, 先锁定钱包行使同一用户的动账排队执行, 流水记录动账后的积分
+            data['balance'] = WalletModel.increase(db, data['user_id'], 'point', data['amount'])
+            wallets = wallet.load_wallets(db, [data['user_id']])
+            db.add(PointModel(**with_idempotent_id(PointModel, data)))
+            try:
+                db.commit()
+            except IntegrityError as e:
+                # 唯一键冲突说明已入账, 回滚本次钱包更新
+                db.rollback()
+                if not is_duplicate_key(e):
+                    raise
+                logger.info(f'当前积分动账({task_id})已处理过, 本次忽略', extra=data)
+                return
+            # 提交后写入余额缓存
+            wallet.cache_balances(wallets)
             logger.info(f'积分动账成功({task_id})', extra=data)
     except Exception as e:
         # 处理异常情况
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: finance_batch.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 20:10
+
+"""
+动账批处理
+
+FINANCE_BATCH=1 时动账任务写入各分区的 Redis Stream，由本模块的 worker 攒批处理：
+1. 每次最多读取 FINANCE_BATCH_SIZE 条，或等待 FINANCE_BATCH_LINGER_MS 毫秒
+2. 批内按幂等键去重，按用户汇总，每个用户每种账户只做一次钱包原子更新，在内存中推算每条流水的动账后余额
+   提交后把批内用户的钱包写入余额缓存
+3. 每种流水一次多行 INSERT，整批一次提交，与库中已入账的动账冲突时整批回滚
+4. 整批失败时逐条重试，成功的逐条确认(XACK)，失败的留在待处理列表中稍后重试，超过次数转入死信
+5. 写入时不裁剪消息流，由 worker 定时删除已确认的消息
+"""
+
+import json
+import socket
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from redis.exceptions import ResponseError
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.constants.constants import REDIS_FINANCE_STREAM_PREFIX
+from app.core.log import logger
+from app.core.mysql import get_session
+from app.core.redis import get_redis, trim_acked, STREAM_TRIM_SECONDS
+from app.core.single_celery import (FINANCE_BATCH_SIZE, FINANCE_BATCH_LINGER_MS, FINANCE_STREAM_GROUP,
+                                    get_finance_stream)
+from app.models.finance import BalanceModel, BalanceGiftModel, PointModel, WalletModel
+from app.services import wallet
+from app.tasks.finance import with_idempotent_id, is_duplicate_key
+
+# 单条动账最多尝试次数，超过后转入死信流
+MAX_ATTEMPTS = 5
+# 失败的动账至少间隔此毫秒数后再重试
+RETRY_IDLE_MS = 5000
+DEAD_LETTER_STREAM = f'{REDIS_FINANCE_STREAM_PREFIX}dead'
+
+# 任务名 -> (流水模型, 钱包字段, 金额类型)
+LEDGERS = {
+    'handle_balance': (BalanceModel, 'balance', Decimal),
+    'handle_balance_gift': (BalanceGiftModel, 'balance_gift', Decimal),
+    'handle_point': (PointModel, 'point', int),
+}
+
+
+def apply_entries(db, task: str, entries: list[dict]) -> int:
+    """
+    在当前事务中写入同一种流水，返回写入条数(批内重复的动账被忽略)，由调用方提交
+    entries 需按投递顺序排列，同一用户的动账后余额按此顺序推算
+    与库中已入账的动账重复时由唯一键拦截，抛出 IntegrityError
+    """
+    model, field, amount_type = LEDGERS[task]
+
+    seen = set()
+    accepted = []
+    for data in entries:
+        data = with_idempotent_id(model, dict(data))
+        if data['idempotent_id'] is not None:
+            key = (data['user_id'], data['type'], data['idempotent_id'])
+            if key in seen:
+                logger.info('当前动账已处理过, 本次忽略', extra=data)
+                continue
+            seen.add(key)
+        # 消息中的金额为字符串, 经 Decimal 转换避免浮点误差
+        accepted.append(dict(data, amount=amount_type(Decimal(str(data['amount'])))))
+    if not accepted:
+        return 0
+
+    totals = defaultdict(amount_type)
+    for data in accepted:
+        totals[data['user_id']] += data['amount']
+    # 按用户ID顺序加锁，避免与其他事务交叉加锁导致死锁
+    running = {}
+    for user_id in sorted(totals):
+        balance = WalletModel.increase(db, user_id, field, totals[user_id])
+        running[user_id] = balance - totals[user_id]
+    for data in accepted:
+        running[data['user_id']] += data['amount']
+        data['balance'] = running[data['user_id']]
+
+    columns = [c.key for c in model.__table__.columns if c.key in accepted[0]]
+    db.execute(insert(model), [{key: data.get(key) for key in columns} for data in accepted])
+    return len(accepted)
+
+
+def apply_batch(items: list[tuple[str, str, dict]]) -> int:
+    """
+    items 为 [(消息ID, 任务名, 动账数据), ...]，整批一个事务
+    单条动账已入账时视为成功返回 0，多条时唯一键冲突向上抛出，由调用方逐条重试
+    """
+    grouped = defaultdict(list)
+    for _, task, data in items:
+        grouped[task].append(data)
+    with get_session() as db:
+        try:
+            count = sum(apply_entries(db, task, entries) for task, entries in grouped.items())
+            wallets = wallet.load_wallets(db, {data['user_id'] for _, _, data in items})
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            if len(items) > 1 or not is_duplicate_key(e):
+                raise
+            logger.info(f'当前动账({items[0][0]})已处理过, 本次忽略', extra=items[0][2])
+            return 0
+    # 提交后写入余额缓存
+    wallet.cache_balances(wallets)
+    return count
+
+
+class LedgerBatchWorker:
+    """消费单个分区的动账流，每个分区只能运行一个实例以保证同一用户的动账顺序"""
+
+    def __init__(self, queue: str, batch_size: int = FINANCE_BATCH_SIZE, linger_ms: int = FINANCE_BATCH_LINGER_MS):
+        self.stream = get_finance_stream(queue)
+        self.batch_size = batch_size
+        self.linger_ms = linger_ms
+        self.consumer = f'{queue}@{socket.gethostname()}'
+
+    def ensure_group(self, redis) -> None:
+        try:
+            redis.xgroup_create(self.stream, FINANCE_STREAM_GROUP, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def _decode(self, redis, messages) -> list[tuple[str, str, dict]]:
+        items = []
+        for message_id, fields in messages:
+            if fields:
+                items.append((message_id, fields['task'], json.loads(fields['data'])))
+                continue
+            # 待确认的消息内容已被删除(例如被 XTRIM/XDEL 误删)，动账无法恢复，转入死信流等待人工处理
+            logger.error(f'动账消息({message_id})内容已被删除，无法入账，已转入死信流 {DEAD_LETTER_STREAM}')
+            redis.xadd(DEAD_LETTER_STREAM, {'stream': self.stream, 'id': message_id, 'error': '消息内容已被删除'})
+            redis.xack(self.stream, FINANCE_STREAM_GROUP, message_id)
+        return items
+
+    def read(self, redis) -> list[tuple[str, str, dict]]:
+        """最多读取 batch_size 条，不足时在 linger_ms 内继续等待"""
+        # 优先重试空闲超时的失败消息(含崩溃前未确认的消息)
+        _, claimed, *_ = redis.xautoclaim(self.stream, FINANCE_STREAM_GROUP, self.consumer,
+                                          min_idle_time=RETRY_IDLE_MS, start_id='0-0', count=self.batch_size)
+        items = self._decode(redis, claimed)
+        deadline = time.monotonic() + self.linger_ms / 1000
+        while len(items) < self.batch_size:
+            block = int((deadline - time.monotonic()) * 1000)
+            if block <= 0:
+                break
+            result = redis.xreadgroup(FINANCE_STREAM_GROUP, self.consumer, {self.stream: '>'},
+                                      count=self.batch_size - len(items), block=block)
+            if not result:
+                break
+            items += self._decode(redis, result[0][1])
+        return items
+
+    def process(self, redis, items: list[tuple[str, str, dict]]) -> None:
+        try:
+            count = apply_batch(items)
+            redis.xack(self.stream, FINANCE_STREAM_GROUP, *[message_id for message_id, _, _ in items])
+            logger.info(f'批量动账成功({self.stream}), 消息 {len(items)} 条, 写入流水 {count} 条')
+            return
+        except Exception as e:
+            logger.error(f'批量动账失败({self.stream})，改为逐条处理：{e}')
+
+        # 逐条处理，隔离失败的动账
+        for item in items:
+            message_id, task, data = item
+            try:
+                apply_batch([item])
+                redis.xack(self.stream, FINANCE_STREAM_GROUP, message_id)
+            except Exception as e:
+                logger.error(f'动账失败({message_id})：{e}', extra=data)
+                self.dead_letter_if_exhausted(redis, item, e)
+
+    def dead_letter_if_exhausted(self, redis, item: tuple[str, str, dict], error: Exception) -> None:
+        message_id, task, data = item
+        pending = redis.xpending_range(self.stream, FINANCE_STREAM_GROUP, min=message_id, max=message_id, count=1)
+        if pending and pending[0]['times_delivered'] >= MAX_ATTEMPTS:
+            redis.xadd(DEAD_LETTER_STREAM, {'stream': self.stream, 'id': message_id, 'task': task,
+                                            'data': json.dumps(data, default=str), 'error': str(error)})
+            redis.xack(self.stream, FINANCE_STREAM_GROUP, message_id)
+            logger.error(f'动账({message_id})重试 {MAX_ATTEMPTS} 次仍失败，已转入死信流 {DEAD_LETTER_STREAM}', extra=data)
+
+    def run(self) -> None:
+        logger.info(f'批量动账 worker 启动: {self.stream}, batch_size={self.batch_size}, linger_ms={self.linger_ms}')
+        trimmed_at = time.monotonic()
+        with get_redis() as redis:
+            self.ensure_group(redis)
+            while True:
+                try:
+                    items = self.read(redis)
+                    if items:
+                        self.process(redis, items)
+                    if time.monotonic() - trimmed_at >= STREAM_TRIM_SECONDS:
+                        trimmed_at = time.monotonic()
+                        trim_acked(redis, self.stream, FINANCE_STREAM_GROUP)
+                except Exception as e:
+                    logger.error(f'批量动账 worker 异常({self.stream})：{e}')
+                    time.sleep(1)
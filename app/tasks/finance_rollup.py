@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: finance_rollup.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 21:40
+
+from app.core.celery import app
+from app.core.log import logger
+from app.services import finance_rollup
+
+
+@app.task
+def rollup_finance():
+    result = finance_rollup.rollup_all()
+    logger.info(f'财务统计汇总完成: {result}')
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: payment_notify.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/19 00:30
+
+"""
+支付异步通知流水线 worker
+
+NOTIFY_PIPELINE=1 时接收到的通知写入 Redis Stream，由本模块的 worker 处理：
+1. 每次最多读取 NOTIFY_BATCH_SIZE 条，或等待 NOTIFY_BATCH_LINGER_MS 毫秒
+2. 整批交给进程池验签，等待验签结果的同时读取下一批，入账与下一批的验签并行
+3. 验签通过的通知整批入账，失败时逐条重试；验签失败的通知转入死信流，处理失败超过次数的同样转入死信流
+4. 定期按已确认的位置裁剪通知流
+入账后投递失败的动账任务由定时任务 redispatch_ledger_tasks 补投
+可以同时运行多个 worker，订单更新加行锁并检查支付状态，同一通知被处理多次也只入账一次
+"""
+
+import json
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from redis.exceptions import ResponseError
+
+from app.constants.constants import REDIS_NOTIFY_STREAM, REDIS_NOTIFY_DEAD_STREAM
+from app.core.celery import app
+from app.core.log import logger
+from app.core.redis import get_redis, trim_acked, STREAM_TRIM_SECONDS
+from app.services.payment_notify import (NOTIFY_BATCH_SIZE, NOTIFY_BATCH_LINGER_MS, NOTIFY_VERIFY_PROCESSES,
+                                         NOTIFY_STREAM_GROUP, verify, apply_notifications, redispatch_pending)
+
+# 单条通知最多尝试次数，超过后转入死信流
+MAX_ATTEMPTS = 5
+# 处理失败的通知至少间隔此毫秒数后再重试
+RETRY_IDLE_MS = 5000
+
+
+def verify_safely(record: dict) -> tuple[str, dict | None]:
+    """在验签进程中执行，异常转为返回值，避免一条通知的异常影响整批"""
+    try:
+        return 'ok', verify(record)
+    except Exception as e:
+        return 'error', repr(e)
+
+
+class NotifyWorker:
+    def __init__(self, batch_size: int = NOTIFY_BATCH_SIZE, linger_ms: int = NOTIFY_BATCH_LINGER_MS,
+                 processes: int = NOTIFY_VERIFY_PROCESSES):
+        self.batch_size = batch_size
+        self.linger_ms = linger_ms
+        self.processes = processes
+        self.consumer = f'{socket.gethostname()}:{os.getpid()}'
+        self.executor = ProcessPoolExecutor(max_workers=processes)
+
+    @staticmethod
+    def ensure_group(redis) -> None:
+        try:
+            redis.xgroup_create(REDIS_NOTIFY_STREAM, NOTIFY_STREAM_GROUP, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def _decode(self, redis, messages) -> list[tuple[str, dict]]:
+        items = []
+        for message_id, fields in messages:
+            if fields:
+                items.append((message_id, json.loads(fields['data'])))
+                continue
+            # 待确认的通知内容已被删除(例如被 XTRIM/XDEL 误删)，转入死信流，需按支付平台记录人工核对
+            logger.error(f'异步通知({message_id})内容已被删除，无法入账，已转入死信流 {REDIS_NOTIFY_DEAD_STREAM}')
+            redis.xadd(REDIS_NOTIFY_DEAD_STREAM, {'id': message_id, 'error': '通知内容已被删除'})
+            redis.xack(REDIS_NOTIFY_STREAM, NOTIFY_STREAM_GROUP, message_id)
+        return items
+
+    def read(self, redis) -> list[tuple[str, dict]]:
+        """最多读取 batch_size 条，不足时在 linger_ms 内继续等待"""
+        # 优先重试空闲超时的失败通知(含其他 worker 崩溃前未确认的通知)
+        _, claimed, *_ = redis.xautoclaim(REDIS_NOTIFY_STREAM, NOTIFY_STREAM_GROUP, self.consumer,
+                                          min_idle_time=RETRY_IDLE_MS, start_id='0-0', count=self.batch_size)
+        items = self._decode(redis, claimed)
+        deadline = time.monotonic() + self.linger_ms / 1000
+        while len(items) < self.batch_size:
+            block = int((deadline - time.monotonic()) * 1000)
+            if block <= 0:
+                break
+            result = redis.xreadgroup(NOTIFY_STREAM_GROUP, self.consumer, {REDIS_NOTIFY_STREAM: '>'},
+                                      count=self.batch_size - len(items), block=block)
+            if not result:
+                break
+            items += self._decode(redis, result[0][1])
+        return items
+
+    def submit(self, items: list[tuple[str, dict]]):
+        """提交验签，立即返回按顺序产出验签结果的迭代器"""
+        chunksize = max(1, len(items) // (self.processes * 4))
+        return self.executor.map(verify_safely, [record for _, record in items], chunksize=chunksize)
+
+    def process(self, redis, items: list[tuple[str, dict]], verified) -> None:
+        acked = []
+        valid = []
+        for (message_id, record), (status, result) in zip(items, verified):
+            if status == 'error':
+                logger.error(f'异步通知验签异常({message_id})：{result}', extra=record['params'])
+                self.dead_letter_if_exhausted(redis, message_id, record, result)
+            elif result is None:
+                logger.error(f'签名验证失败: {record["channel"]}', extra=record['params'])
+                self.dead_letter(redis, message_id, record, '签名验证失败')
+            else:
+                valid.append((message_id, record, result))
+
+        try:
+            apply_notifications([result for _, _, result in valid])
+            acked += [message_id for message_id, _, _ in valid]
+            logger.info(f'批量处理异步通知成功, 通知 {len(items)} 条, 验签通过 {len(valid)} 条')
+        except Exception as e:
+            logger.error(f'批量处理异步通知失败，改为逐条处理：{e}')
+            for message_id, record, result in valid:
+                try:
+                    apply_notifications([result])
+                    acked.append(message_id)
+                except Exception as e:
+                    logger.error(f'异步通知处理失败({message_id})：{e}', extra=record['params'])
+                    self.dead_letter_if_exhausted(redis, message_id, record, str(e))
+        if acked:
+            redis.xack(REDIS_NOTIFY_STREAM, NOTIFY_STREAM_GROUP, *acked)
+
+    @staticmethod
+    def dead_letter(redis, message_id: str, record: dict, error: str) -> None:
+        redis.xadd(REDIS_NOTIFY_DEAD_STREAM, {'id': message_id, 'data': json.dumps(record, ensure_ascii=False),
+                                              'error': error})
+        redis.xack(REDIS_NOTIFY_STREAM, NOTIFY_STREAM_GROUP, message_id)
+
+    def dead_letter_if_exhausted(self, redis, message_id: str, record: dict, error: str) -> None:
+        pending = redis.xpending_range(REDIS_NOTIFY_STREAM, NOTIFY_STREAM_GROUP, min=message_id, max=message_id,
+                                       count=1)
+        if pending and pending[0]['times_delivered'] >= MAX_ATTEMPTS:
+            self.dead_letter(redis, message_id, record, error)
+            logger.error(f'异步通知({message_id})重试 {MAX_ATTEMPTS} 次仍失败，已转入死信流 {REDIS_NOTIFY_DEAD_STREAM}',
+                         extra=record['params'])
+
+    def run(self) -> None:
+        logger.info(f'异步通知 worker 启动: {self.consumer}, batch_size={self.batch_size}, '
+                    f'linger_ms={self.linger_ms}, processes={self.processes}')
+        with get_redis() as redis:
+            self.ensure_group(redis)
+            verifying = None
+            trimmed_at = time.monotonic()
+            while True:
+                try:
+                    items = self.read(redis)
+                    batch = (items, self.submit(items)) if items else None
+                    if verifying:
+                        self.process(redis, *verifying)
+                    verifying = batch
+                    if time.monotonic() - trimmed_at >= STREAM_TRIM_SECONDS:
+                        trimmed_at = time.monotonic()
+                        trim_acked(redis, REDIS_NOTIFY_STREAM, NOTIFY_STREAM_GROUP)
+                except Exception as e:
+                    # 未确认的通知留在待处理列表中, 空闲超时后重新读取
+                    logger.error(f'异步通知 worker 异常：{e}')
+                    verifying = None
+                    time.sleep(1)
+
+
+@app.task
+def redispatch_ledger_tasks():
+    count = redispatch_pending()
+    if count:
+        logger.info(f'补投动账任务完成: {count} 个订单')
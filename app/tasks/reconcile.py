@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: reconcile.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 22:10
+
+from app.core.celery import app
+from app.core.log import logger
+from app.services import reconcile
+
+
+@app.task
+def reconcile_ledgers(names: list = None):
+    for name in names or reconcile.LEDGERS:
+        try:
+            reconcile.reconcile(name)
+        except Exception as e:
+            logger.error(f'流水对账失败({name})：{e}')
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: fulltext.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 17:00
+
+import os
+import re
+
+from sqlalchemy import desc
+from sqlalchemy.dialects.mysql import match
+
+from app.schemas.schemas import PaginationParams
+
+# 与 MySQL ngram_token_size 保持一致，短于此长度的关键字无法命中全文索引
+ngram_token_size_env = os.getenv("FULLTEXT_NGRAM_TOKEN_SIZE")
+NGRAM_TOKEN_SIZE = int(ngram_token_size_env) if ngram_token_size_env else 2
+
+# BOOLEAN MODE 中的运算符，用户输入中的这些字符按普通分隔符处理
+_boolean_operators = re.compile(r'[+\-<>()~*"@]')
+
+
+def to_phrase(keyword: str) -> str:
+    """
+    转换为 BOOLEAN MODE 短语查询
+    ngram 解析器会将短语拆分为连续的 ngram 序列匹配，接近 LIKE '%keyword%'，但有两点不同：
+    1. 运算符字符被替换为空格，不能用于搜索邮箱等包含这些字符的完整值
+    2. 索引须在关闭停用词(innodb_ft_enable_stopword=OFF)时创建，否则包含停用词的词元不会被索引
+    """
+    keyword = ' '.join(_boolean_operators.sub(' ', keyword).split())
+    return f'"{keyword}"' if keyword else ''
+
+
+def condition(column, keyword: str):
+    """
+    返回 (过滤条件, 相关度表达式)
+    关键字过短无法使用全文索引时退回 LIKE，相关度表达式为 None
+    """
+    phrase = to_phrase(keyword)
+    if len(phrase) - 2 < NGRAM_TOKEN_SIZE:
+        return column.like(f'%{keyword}%'), None
+    expression = match(column, against=phrase).in_boolean_mode()
+    return expression, expression
+
+
+def apply_search(query, model, fields: list[tuple], params: PaginationParams = None):
+    """
+    为查询追加全文检索条件, fields 为 [(字段, 关键字), ...], 关键字为空时忽略
+    页码分页时按相关度排序, 相关度相同按 id 倒序
+    游标分页依赖 id 倒序, 此时不按相关度排序
+    """
+    scores = []
+    for column, keyword in fields:
+        if not keyword:
+            continue
+        where, score = condition(column, keyword)
+        query = query.filter(where)
+        if score is not None:
+            scores.append(score)
+    if scores and (params is None or params.cursor is None):
+        query = query.order_by(None).order_by(desc(sum(scores[1:], scores[0])), desc(model.id))
+    return query
@@ -5,23 +5,13 @@
 # Email: qiuyutang@qq.com
 # Time: 2024/5/29 13:30
 
-import os
+import time
 
-import pymysql
-from dotenv import load_dotenv
 from loguru import logger
+from sqlalchemy.exc import SQLAlchemyError
 
-load_dotenv()
-
-# 配置 MySQL 连接参数
-MYSQL_CONFIG = {
-    'host': os.getenv("DB_HOST"),
-    'port': int(os.getenv("DB_PORT")),
-    'user': os.getenv("DB_USER"),
-    'password': os.getenv("DB_PWD"),
-    'database': os.getenv("DB_NAME"),
-    'charset': os.getenv("DB_CHARSET"),
-}
+from app.core.mysql import get_session
+from app.models.cms import CityModel
 
 
 def init_city():
@@ -35968,32 +35958,21 @@ def init_city():
         }
     ]
 
-    connection = pymysql.connect(**MYSQL_CONFIG)
-
+    start = time.perf_counter()
     try:
-        sql = '''INSERT INTO cms_city (id, pid, name, level, pinyin, prefix, weight, is_hot) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        '''
-        with connection.cursor() as cursor:
-            cursor.execute('truncate table cms_city')
-            logger.success(f'清空城市表成功！')
-
-            # 导入到数据库表
-            for city in cities:
-                cursor.execute(sql, (
-                    city['id'], city['pid'], city['name'], city['level'], city['pinyin'], city['prefix'],
-                    city['weight'], city['is_hot']))
+        with get_session() as db:
+            # 按 ID 写入或更新，可重复执行
+            CityModel.bulk_upsert(db, cities, chunk_size=2000)
+            # 删除数据集之外的旧数据
+            db.query(CityModel).filter(CityModel.id.notin_([city['id'] for city in cities])).delete(
+                synchronize_session=False)
+            db.commit()
 
-        connection.commit()
+        logger.success(f'初始化城市成功！共 {len(cities)} 条, 耗时 {time.perf_counter() - start:.3f} 秒')
 
-        logger.success('初始化城市成功！')
-
-    except pymysql.MySQLError as e:
+    except SQLAlchemyError as e:
         logger.error(f'Database error: {e}')
 
-    finally:
-        connection.close()
-
 
 if __name__ == "__main__":
     init_city()
@@ -5,24 +5,11 @@
 # Email: easelify@gmail.com
 # Time: 2024/05/17 09:39
 
-import os
-
-import pymysql
-from dotenv import load_dotenv
 from loguru import logger
+from sqlalchemy.exc import SQLAlchemyError
 
-load_dotenv()
-
-# 配置 MySQL 连接参数
-MYSQL_CONFIG = {
-    'host': os.getenv("DB_HOST"),
-    'port': int(os.getenv("DB_PORT")),
-    'user': os.getenv("DB_USER"),
-    'password': os.getenv("DB_PWD"),
-    'database': os.getenv("DB_NAME"),
-    'charset': os.getenv("DB_CHARSET"),
-    'cursorclass': pymysql.cursors.DictCursor
-}
+from app.core.mysql import get_session
+from app.models.user import PermissionModel
 
 
 def init_permissions():
@@ -129,49 +116,50 @@ def init_permissions():
                     'name': '缓存管理',
                     'component_name': 'CacheList',
                 },
+                {
+                    'name': '系统监控',
+                    'component_name': 'SystemMonitor',
+                },
+            ]
+        },
+        {
+            'name': '数据统计',
+            'component_name': 'Statistics',
+            'children': [
+                {
+                    'name': '财务统计',
+                    'component_name': 'FinanceStatistics',
+                },
             ]
         },
     ]
 
-    connection = pymysql.connect(**MYSQL_CONFIG)
-
-    try:
-        i = 0
-        pid = 0
-        sql = 'INSERT INTO user_permission (pid, name, component_name, asc_sort_order) VALUES (%s, %s, %s, %s)'
-        with connection.cursor() as cursor:
-            cursor.execute('truncate table user_permission')
-            logger.success(f'清空权限表成功！')
+    # 按原先清空后顺序插入的规则生成固定 ID，上级菜单 ID 即其写入顺序
+    rows = []
+    for menu in menus:
+        pid = len(rows) + 1
+        asc_sort_order = pid * 1000
+        rows.append({'id': pid, 'pid': 0, 'name': menu['name'], 'component_name': menu['component_name'],
+                     'asc_sort_order': asc_sort_order})
+        logger.info(f'{menu["name"]}')
 
-            for menu in menus:
-                asc_sort_order = (i + 1) * 1000
-                val = (0, menu['name'], menu['component_name'], asc_sort_order)
-                cursor.execute(sql, val)
-                asc_sort_order += 1
-                i += 1
-                pid = i
-                logger.info(f'{menu["name"]}')
+        for j, submenu in enumerate(menu['children']):
+            rows.append({'id': len(rows) + 1, 'pid': pid, 'name': submenu['name'],
+                         'component_name': submenu['component_name'], 'asc_sort_order': asc_sort_order + 1 + j})
+            logger.info(f'\t{submenu["name"]}')
 
-                j = 0
-                for submenu in menu['children']:
-                    asc_sort_order_sub = asc_sort_order + j
-                    val = (
-                        pid, submenu['name'], submenu['component_name'], asc_sort_order_sub)
-                    cursor.execute(sql, val)
-                    j += 1
-                    logger.info(f'\t{submenu["name"]}')
-                i += j
-
-        connection.commit()
+    try:
+        with get_session() as db:
+            PermissionModel.bulk_upsert(db, rows)
+            # 删除已下线的菜单
+            db.query(PermissionModel).filter(PermissionModel.id > len(rows)).delete(synchronize_session=False)
+            db.commit()
 
         logger.success('初始化权限成功！')
 
-    except pymysql.MySQLError as e:
+    except SQLAlchemyError as e:
         logger.error(f'Database error: {e}')
 
-    finally:
-        connection.close()
-
 
 if __name__ == "__main__":
     init_permissions()
@@ -5,81 +5,36 @@
 # Email: easelify@gmail.com
 # Time: 2024/05/18 20:27
 
-import hashlib
 import json
-import os
-import secrets
 
-import pymysql
-from dotenv import load_dotenv
 from loguru import logger
+from sqlalchemy.exc import SQLAlchemyError
 
-load_dotenv()
+from app.core.mysql import get_session
+from app.models.user import RoleModel, PermissionModel
 
-# 配置 MySQL 连接参数
-MYSQL_CONFIG = {
-    'host': os.getenv("DB_HOST"),
-    'port': int(os.getenv("DB_PORT")),
-    'user': os.getenv("DB_USER"),
-    'password': os.getenv("DB_PWD"),
-    'database': os.getenv("DB_NAME"),
-    'charset': os.getenv("DB_CHARSET"),
-    'cursorclass': pymysql.cursors.DictCursor
-}
-
-connection = pymysql.connect(**MYSQL_CONFIG)
-
-
-def encode_password(pwd: str, salt: str) -> str:
-    sha_signature = hashlib.sha256(
-        f'{pwd[::-1]}{salt[::-1]}'.encode()).hexdigest()
-    return sha_signature
-
-
-def has_role() -> bool:
-    try:
-        sql = 'select count(1) as "total" from user_role'
-        with connection.cursor() as cursor:
-            cursor.execute(sql)
-            result = cursor.fetchone()
-            if result is None:
-                return False
-            if result['total'] > 0:
-                logger.info(f'发现 {result["total"]} 个角色！')
-                return True
-            return False
-    except pymysql.MySQLError as e:
-        logger.error(f'Database error: {e}')
+SUPER_ADMIN_ROLE = '超级管理员'
 
 
 def init_role():
+    """初始化超级管理员角色，已存在时同步为最新的全部权限，可重复执行"""
     try:
-        with connection.cursor() as cursor:
-            sql = 'select component_name from user_permission where component_name is not null order by asc_sort_order asc'
-            cursor.execute(sql)
-            result = cursor.fetchall()
+        with get_session() as db:
+            result = db.query(PermissionModel.component_name).filter(
+                PermissionModel.component_name.isnot(None)).order_by(PermissionModel.asc_sort_order.asc()).all()
             if not result:
                 logger.warning('请先初始化权限')
                 return
 
-            components = [row['component_name'] for row in result]
-            sql = 'insert into user_role (name, permissions) values (%s, %s)'
-            val = ("超级管理员", json.dumps(components))
-            cursor.execute(sql, val)
-        connection.commit()
+            components = [row.component_name for row in result]
+            # 角色名称为唯一索引，冲突时只更新权限列表
+            RoleModel.bulk_upsert(db, [{'name': SUPER_ADMIN_ROLE, 'permissions': json.dumps(components)}],
+                                  update_fields=['permissions'])
+            db.commit()
         logger.success(f'初始化角色成功！')
-    except pymysql.MySQLError as e:
+    except SQLAlchemyError as e:
         logger.error(f'Database error: {e}')
 
 
 if __name__ == "__main__":
-    password_text = secrets.token_urlsafe(6)
-    password_salt = secrets.token_urlsafe(32)
-    password_hash = encode_password(password_text, password_salt)
-    if has_role():
-        logger.info('系统中已存在角色, 初始化终止!')
-        exit(0)
-
     init_role()
-
-    connection.close()
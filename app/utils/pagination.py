@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: pagination.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 11:20
+
+import base64
+
+from app.core.count_cache import cached_count, estimated_count
+from app.schemas.schemas import PaginationParams
+
+
+def encode_cursor(last_id: int) -> str:
+    """将上一页最后一条记录的 id 编码为不透明游标"""
+    return base64.urlsafe_b64encode(f'id:{last_id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> int:
+    """解码游标，空字符串表示游标分页的第一页，返回 0"""
+    if not cursor:
+        return 0
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        prefix, last_id = base64.urlsafe_b64decode(cursor + padding).decode().split(':')
+        if prefix != 'id':
+            raise ValueError(prefix)
+        return int(last_id)
+    except Exception:
+        raise ValueError('无效的分页游标')
+
+
+def apply_pagination(query, model, params: PaginationParams):
+    """
+    为 Query / Select 追加分页条件，查询必须已按 id 倒序排列
+    1. 导出由 app.services.export 流式输出，未注册导出的列表不支持导出
+    2. 游标模式按 id < 游标 过滤，避免深分页时 MySQL 扫描并丢弃 offset 行
+    3. 默认使用页码分页
+    """
+    if params.export == 1:
+        raise ValueError('当前列表不支持导出')
+    if params.cursor is not None:
+        last_id = decode_cursor(params.cursor)
+        if last_id > 0:
+            query = query.filter(model.id < last_id)
+        # 多取一条用于判断是否还有下一页
+        return query.limit(params.size + 1)
+    return query.offset((params.page - 1) * params.size).limit(params.size)
+
+
+def build_page(items: list, params: PaginationParams, total: int = -1) -> dict:
+    """构造列表响应，游标模式下返回 next_cursor，没有下一页时为 None"""
+    next_cursor = None
+    if params.cursor is not None and len(items) > params.size:
+        items = items[:params.size]
+        next_cursor = encode_cursor(items[-1].id)
+    return {"total": total, "items": items, "next_cursor": next_cursor}
+
+
+def paginate(query, model, params: PaginationParams, estimate: bool = False) -> dict:
+    """
+    同步 Query 分页，仅页码模式统计总数，游标模式 total 为 -1
+    总数走短时缓存，estimate=True 时无过滤条件的查询使用 InnoDB 统计信息返回近似总数，适用于大表
+    """
+    paged = apply_pagination(query, model, params)
+    total = -1
+    if params.cursor is None:
+        total = estimated_count(query, model) if estimate else cached_count(query, model)
+    return build_page(paged.all(), params, total)
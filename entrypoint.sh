@@ -3,4 +3,17 @@
 # 使用独立容器运行 Celery, 详见 Dockerfile.celery
 celery -A app.celery_worker worker --loglevel=info &
 celery -A app.celery_worker beat -s --loglevel=info &
-celery -A app.celery_single_worker worker --loglevel=info
+
+# 动账队列按用户分区, 每个分区一个单并发 worker, 分区 0 同时消费旧的 single_worker_queue
+i=0
+while [ "$i" -lt "${FINANCE_PARTITIONS:-1}" ]; do
+  queues="single_worker_queue_$i"
+  [ "$i" -eq 0 ] && queues="$queues,single_worker_queue"
+  celery -A app.celery_single_worker worker -Q "$queues" -n "finance$i@%h" --loglevel=info &
+  # 批量动账模式下每个分区再启动一个攒批 worker, Celery worker 继续消费切换前积压的任务
+  [ "${FINANCE_BATCH:-0}" = "1" ] && python -m app.finance_batch_worker --partition "$i" &
+  i=$((i + 1))
+done
+# 支付异步通知流水线模式下启动通知 worker, 验签在其进程池中进行
+[ "${NOTIFY_PIPELINE:-0}" = "1" ] && python -m app.notify_worker &
+wait
@@ -14,6 +14,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
+from app.core.gateway import close_gateways
+from app.core.mysql import dispose_async_engines
+from app.core.pool_monitor import pool_monitor, POOL_LEAK_SECONDS
+from app.core.sql_profiler import SQLProfilerMiddleware
+from app.services import order_status
 
 load_dotenv()
 RUNTIME_MODE = os.getenv("RUNTIME_MODE")
@@ -32,7 +37,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-SQL-Count", "X-SQL-Time-Ms", "X-SQL-Max-Repeat"],
 )
+# 请求级 SQL 统计，最后注册使其位于最外层
+app.add_middleware(SQLProfilerMiddleware)
 
 # 创建运行时目录
 runtime_path = "./runtime"
@@ -40,6 +48,8 @@ if not os.path.exists(runtime_path):
     os.mkdir(runtime_path)
 
 scheduler = BackgroundScheduler()
+# 定时检查借出超时未归还的数据库连接，输出借出时的调用堆栈
+scheduler.add_job(pool_monitor.report_leaks, IntervalTrigger(seconds=POOL_LEAK_SECONDS), id='mysql_pool_leak_check')
 scheduler.start()
 
 
@@ -49,5 +59,8 @@ def startup_event():
 
 
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
     scheduler.shutdown()
+    await close_gateways()
+    await order_status.hub.close()
+    await dispose_async_engines()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: bench_db_async.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 10:00
+
+"""
+同步 / 异步数据库读取吞吐对比
+
+同步路径使用固定大小线程池模拟 Starlette 线程池（默认 40），异步路径在单个事件循环内以相同服务并发执行。
+用法：python scripts/bench_db_async.py --user-id 1 --requests 5000 --concurrency 500
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app.schemas.finance import SearchQuery
+from app.services import finance, user
+
+
+def bench_sync(user_id: int, requests: int, threads: int) -> float:
+    params = SearchQuery(user_id=user_id, page=1, size=10, export=0)
+
+    def work(i: int):
+        if i % 2:
+            user.get(user_id)
+        else:
+            finance.get_balance_list(params)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(work, range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+async def bench_async(user_id: int, requests: int, concurrency: int) -> float:
+    params = SearchQuery(user_id=user_id, page=1, size=10, export=0)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def work(i: int):
+        async with semaphore:
+            if i % 2:
+                await user.get_async(user_id)
+            else:
+                await finance.get_balance_list_async(params)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(work(i) for i in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='同步/异步数据库读取吞吐对比')
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=40, help='同步线程池大小，对应 Starlette 默认值')
+    parser.add_argument('--concurrency', type=int, default=500, help='异步并发请求数')
+    args = parser.parse_args()
+
+    sync_qps = bench_sync(args.user_id, args.requests, args.threads)
+    print(f'sync  (threads={args.threads}): {sync_qps:.1f} req/s')
+    async_qps = asyncio.run(bench_async(args.user_id, args.requests, args.concurrency))
+    print(f'async (concurrency={args.concurrency}): {async_qps:.1f} req/s')
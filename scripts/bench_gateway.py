@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: bench_gateway.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 23:40
+
+"""
+支付网关调用压测：SDK 同步调用(线程池) 与 app.core.gateway 异步调用对比
+
+先启动桩服务：python scripts/stub_gateway.py --port 9100 --latency-ms 100
+再运行：python scripts/bench_gateway.py --url http://127.0.0.1:9100 --requests 2000 --concurrency 100 --channel wechat
+同步模式的线程数与并发数相同，模拟线程池中每个请求占用一个线程等待网关响应。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from Cryptodome.PublicKey import RSA
+
+STUB_PUBLIC_KEY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'runtime',
+                               'stub_gateway', 'alipay_public.pem')
+
+
+def make_wechat(url: str):
+    from wechatpy import WeChatPay
+
+    client = WeChatPay(appid='wxstub', api_key='stub', mch_id='10000100')
+    client.API_BASE_URL = f"{url.rstrip('/')}/"
+    return client
+
+
+def make_alipay(url: str):
+    from alipay import AliPay
+
+    with open(STUB_PUBLIC_KEY) as f:
+        public_key = f.read()
+    client = AliPay(appid='2021000000000000', app_notify_url=None,
+                    app_private_key_string=RSA.generate(2048).export_key().decode(),
+                    alipay_public_key_string=public_key, sign_type='RSA2')
+    client._gateway = f"{url.rstrip('/')}/gateway.do"
+    return client
+
+
+def sync_call(channel: str, client) -> None:
+    trade_no = uuid.uuid4().hex
+    if channel == 'wechat':
+        client.order.create(trade_type='JSAPI', body='压测', out_trade_no=trade_no, total_fee=1,
+                            client_ip='127.0.0.1', notify_url='http://127.0.0.1/notify', user_id='openid')
+    else:
+        client.server_api('alipay.trade.refund', biz_content={'out_trade_no': trade_no, 'refund_amount': '0.01'})
+
+
+async def async_call(channel: str, client) -> None:
+    from app.core import gateway
+
+    trade_no = uuid.uuid4().hex
+    if channel == 'wechat':
+        await gateway.wechat_unified_order(client, trade_type='JSAPI', body='压测', out_trade_no=trade_no,
+                                           total_fee=1, spbill_create_ip='127.0.0.1',
+                                           notify_url='http://127.0.0.1/notify', openid='openid')
+    else:
+        await gateway.alipay_server_api(client, 'alipay.trade.refund', idempotent=True,
+                                        biz_content={'out_trade_no': trade_no, 'refund_amount': '0.01'})
+
+
+def report(name: str, latencies: list, errors: int, seconds: float) -> None:
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+    print(f'{name:<6} {len(latencies) / seconds:>10.1f} req/s  p50 {p50:>8.1f} ms  p99 {p99:>8.1f} ms  '
+          f'失败 {errors}')
+
+
+def timed(func):
+    started = time.perf_counter()
+    try:
+        func()
+        return time.perf_counter() - started
+    except Exception:
+        return None
+
+
+def bench_sync(channel: str, client, total: int, concurrency: int) -> None:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: timed(lambda: sync_call(channel, client)), range(total)))
+    latencies = [r for r in results if r is not None]
+    report('sync', latencies, total - len(latencies), time.perf_counter() - started)
+
+
+async def bench_async(channel: str, client, total: int, concurrency: int) -> None:
+    from app.core import gateway
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await async_call(channel, client)
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(total)])
+    report('async', latencies, errors, time.perf_counter() - started)
+    await gateway.close_gateways()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='支付网关调用压测')
+    parser.add_argument('--url', default='http://127.0.0.1:9100', help='桩服务地址')
+    parser.add_argument('--channel', choices=['wechat', 'alipay'], default='wechat')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both')
+    args = parser.parse_args()
+
+    # 网关配置在导入 app.core.gateway 时读取
+    os.environ['WECHATPAY_GATEWAY_URL'] = args.url
+    os.environ['ALIPAY_GATEWAY_URL'] = args.url
+    os.environ.setdefault('WECHATPAY_GATEWAY_CONCURRENCY', str(args.concurrency))
+    os.environ.setdefault('ALIPAY_GATEWAY_CONCURRENCY', str(args.concurrency))
+
+    client = make_wechat(args.url) if args.channel == 'wechat' else make_alipay(args.url)
+    print(f'{args.channel}: {args.requests} 个请求, 并发 {args.concurrency}')
+    if args.mode in ('sync', 'both'):
+        bench_sync(args.channel, client, args.requests, args.concurrency)
+    if args.mode in ('async', 'both'):
+        asyncio.run(bench_async(args.channel, client, args.requests, args.concurrency))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: bench_ledger_batch.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 20:10
+
+"""
+不同批大小下的动账吞吐(条/秒)
+
+批大小为 1 时相当于逐条处理：每条一次钱包更新、一次插入、一次提交。
+使用大号测试用户ID写入积分流水，结束后删除测试流水和钱包行，请勿在生产库运行。
+用法：python scripts/bench_ledger_batch.py --entries 2000 --users 50 --sizes 1,10,50,200,500
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from sqlalchemy import delete
+
+from app.core.mysql import get_session
+from app.models.finance import PointModel, WalletModel
+from app.schemas.finance import PointType
+from app.tasks.finance_batch import apply_batch
+
+BENCH_USER_ID = 900_000_000
+BENCH_MEMO = 'bench_ledger_batch'
+
+
+def make_items(entries: int, users: int) -> list:
+    return [(str(i), 'handle_point', {
+        'type': PointType.ADD.value,
+        'user_id': BENCH_USER_ID + random.randrange(users),
+        'related_id': i,
+        'amount': random.randint(1, 10),
+        'balance': 0,
+        'auto_memo': BENCH_MEMO,
+        'ip': '127.0.0.1',
+    }) for i in range(entries)]
+
+
+def bench(items: list, size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(items), size):
+        apply_batch(items[i:i + size])
+    return len(items) / (time.perf_counter() - start)
+
+
+def cleanup(users: int) -> None:
+    with get_session() as db:
+        db.execute(delete(PointModel).where(PointModel.auto_memo == BENCH_MEMO))
+        db.execute(delete(WalletModel).where(WalletModel.user_id.between(BENCH_USER_ID, BENCH_USER_ID + users)))
+        db.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='不同批大小下的动账吞吐')
+    parser.add_argument('--entries', type=int, default=2000, help='每种批大小写入的流水条数')
+    parser.add_argument('--users', type=int, default=50, help='测试用户数')
+    parser.add_argument('--sizes', default='1,10,50,200,500', help='批大小, 逗号分隔')
+    args = parser.parse_args()
+
+    items = make_items(args.entries, args.users)
+    try:
+        baseline = None
+        for size in [int(size) for size in args.sizes.split(',')]:
+            rate = bench(items, size)
+            baseline = baseline or rate
+            print(f'batch_size={size:<6} {rate:>10.0f} 条/秒  {rate / baseline:>6.2f}x')
+    finally:
+        cleanup(args.users)
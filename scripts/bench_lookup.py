@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: bench_lookup.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 18:40
+
+"""
+热点单行查询单次耗时对比
+
+在同一个会话内重复执行，排除连接获取的影响，只比较语句构造、编译缓存与结果装配的开销。
+--no-db 时只统计构造语句并生成编译缓存键的耗时，不需要数据库。
+用法：python scripts/bench_lookup.py --user-id 1 --rounds 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app.core import lookup
+from app.core.mysql import get_session
+from app.models.user import UserModel
+
+
+def timeit(func, rounds: int) -> float:
+    """返回单次调用耗时(微秒)"""
+    for _ in range(min(rounds, 100)):
+        func()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1_000_000
+
+
+def bench_db(user_id: int, rounds: int) -> dict:
+    with get_session(read_only=True) as db:
+        cases = {
+            'db.query().filter().first()': lambda: db.query(UserModel).filter(UserModel.id == user_id).first(),
+            'lookup model': lambda: lookup.user_by_id.first(db, user_id),
+            'lookup row': lambda: lookup.user_by_id.first(db, user_id, lookup.ResultType.ROW),
+            'lookup dict': lambda: lookup.user_by_id.first(db, user_id, lookup.ResultType.DICT),
+        }
+        result = {}
+        for name, func in cases.items():
+            result[name] = timeit(func, rounds)
+            # 清空身份映射，避免 ORM 路径命中已加载实例
+            db.expunge_all()
+        return result
+
+
+def bench_no_db(user_id: int, rounds: int) -> dict:
+    from sqlalchemy.orm import Session
+
+    session = Session()
+    cases = {
+        'db.query().filter() 构造+缓存键': lambda: session.query(UserModel).filter(
+            UserModel.id == user_id).limit(1).statement._generate_cache_key(),
+        'lookup 预构造语句 缓存键': lambda: lookup.user_by_id._model_stmt._generate_cache_key(),
+    }
+    return {name: timeit(func, rounds) for name, func in cases.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='热点单行查询单次耗时对比')
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument('--rounds', type=int, default=5000)
+    parser.add_argument('--no-db', action='store_true', help='只比较语句构造开销，不连接数据库')
+    args = parser.parse_args()
+
+    result = bench_no_db(args.user_id, args.rounds) if args.no_db else bench_db(args.user_id, args.rounds)
+    baseline = next(iter(result.values()))
+    for name, cost in result.items():
+        print(f'{name:<36} {cost:>10.1f} us/op  {baseline / cost:>5.2f}x')
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: bench_notify.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/19 00:30
+
+"""
+支付异步通知压测
+
+verify: 本地对比逐条验签与进程池验签的吞吐，不依赖 Redis 和数据库
+    python scripts/bench_notify.py verify --notifications 20000 --processes 4
+replay: 按指定速率向运行中的应用重放通知，统计应答延迟和失败数，每个订单号重复发送 --repeat 次模拟网关重发
+    应用需设置 NOTIFY_PIPELINE=1 并启动 python -m app.notify_worker
+    python scripts/bench_notify.py replay --url http://127.0.0.1:8000 --rate 5000 --notifications 50000
+    --channel alipay 时使用 --alipay-private-key 签名，需与支付配置中的支付宝公钥配对，否则通知会因验签失败转入死信流；
+    --channel wechatpay 时使用 --wechat-key 签名，--appid 需为已配置的 appid
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlencode
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from Cryptodome.PublicKey import RSA
+from wechatpy.pay.utils import calculate_signature, dict_to_xml
+
+from app.services.payment_notify import verify
+
+BALANCE_NOTIFY_PATH = '/api/v1/frontend/balance_recharges/{channel}/notify'
+
+# 验签进程中的支付宝客户端, 由 init_verifier 创建
+verifier = None
+
+
+def make_alipay(private_key: str, public_key: str):
+    from alipay import AliPay
+
+    return AliPay(appid='2021000000000000', app_notify_url=None, app_private_key_string=private_key,
+                  alipay_public_key_string=public_key, sign_type='RSA2')
+
+
+def alipay_notification(client, appid: str, trade_no: str) -> dict:
+    params = {
+        'app_id': appid,
+        'notify_id': uuid.uuid4().hex,
+        'notify_time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'notify_type': 'trade_status_sync',
+        'out_trade_no': trade_no,
+        'trade_no': uuid.uuid4().hex,
+        'trade_status': 'TRADE_SUCCESS',
+        'total_amount': '0.01',
+        'charset': 'utf-8',
+        'version': '1.0',
+    }
+    unsigned = '&'.join(f'{k}={v}' for k, v in client._ordered_data(params))
+    return dict(params, sign=client._sign(unsigned), sign_type='RSA2')
+
+
+def wechat_notification(appid: str, api_key: str, trade_no: str) -> str:
+    params = {
+        'appid': appid,
+        'mch_id': '10000100',
+        'nonce_str': uuid.uuid4().hex,
+        'result_code': 'SUCCESS',
+        'return_code': 'SUCCESS',
+        'out_trade_no': trade_no,
+        'transaction_id': uuid.uuid4().hex,
+        'total_fee': '1',
+        'time_end': time.strftime('%Y%m%d%H%M%S'),
+    }
+    return dict_to_xml(params, calculate_signature(params, api_key))
+
+
+def init_verifier(private_key: str, public_key: str) -> None:
+    global verifier
+    verifier = make_alipay(private_key, public_key)
+
+
+def verify_one(record: dict) -> bool:
+    return verify(record, verifier) is not None
+
+
+def bench_verify(total: int, processes: int) -> None:
+    key = RSA.generate(2048)
+    private_key, public_key = key.export_key().decode(), key.publickey().export_key().decode()
+    client = make_alipay(private_key, public_key)
+    records = [{'kind': 'balance', 'channel': 'alipay', 'content': None,
+                'params': alipay_notification(client, client.appid, uuid.uuid4().hex)} for _ in range(total)]
+
+    init_verifier(private_key, public_key)
+    started = time.perf_counter()
+    assert all(verify_one(record) for record in records)
+    serial = total / (time.perf_counter() - started)
+    print(f'逐条验签      {serial:>10.0f} 条/秒')
+
+    with ProcessPoolExecutor(processes, initializer=init_verifier, initargs=(private_key, public_key)) as executor:
+        # 预热, 排除进程启动时间
+        list(executor.map(verify_one, records[:processes * 10]))
+        started = time.perf_counter()
+        assert all(executor.map(verify_one, records, chunksize=max(1, total // (processes * 4))))
+        pooled = total / (time.perf_counter() - started)
+    print(f'进程池验签({processes}) {pooled:>10.0f} 条/秒  {pooled / serial:>6.2f}x')
+
+
+async def bench_replay(args) -> None:
+    import httpx
+
+    if args.channel == 'alipay':
+        with open(args.alipay_private_key) as f:
+            private_key = f.read()
+        client = make_alipay(private_key, RSA.import_key(private_key).publickey().export_key().decode())
+
+    # 每个订单号的通知生成一次, 重发时内容相同, 与支付网关的重发一致
+    bodies = []
+    for _ in range(max(1, args.notifications // args.repeat)):
+        trade_no = uuid.uuid4().hex
+        if args.channel == 'alipay':
+            body = urlencode(alipay_notification(client, args.appid or client.appid, trade_no))
+        else:
+            body = wechat_notification(args.appid or 'wxstub', args.wechat_key, trade_no)
+        bodies += [body] * args.repeat
+    random.shuffle(bodies)
+
+    url = f"{args.url.rstrip('/')}{BALANCE_NOTIFY_PATH.format(channel=args.channel)}"
+    content_type = 'application/x-www-form-urlencoded' if args.channel == 'alipay' else 'text/xml'
+    success_text = 'success' if args.channel == 'alipay' else 'SUCCESS'
+    latencies = []
+    failures = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30, headers={'Content-Type': content_type}) as http:
+        async def send(body: str):
+            nonlocal failures
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await http.post(url, content=body.encode())
+                    if success_text not in response.text:
+                        failures += 1
+                        return
+                    latencies.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    failures += 1
+
+        started = time.perf_counter()
+        tasks = []
+        for i, body in enumerate(bodies):
+            # 按固定速率发出请求, 应用处理不过来时请求在客户端排队, 体现为延迟上升
+            delay = started + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(body)))
+        await asyncio.gather(*tasks)
+        seconds = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+    print(f'{len(bodies)} 条通知, 订单 {len(bodies) // args.repeat} 个, 目标速率 {args.rate}/秒')
+    print(f'应答 {len(latencies) / seconds:>8.0f} 条/秒  p50 {p50:>7.1f} ms  p99 {p99:>7.1f} ms  失败 {failures}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='支付异步通知压测')
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    verify_parser = subparsers.add_parser('verify', help='对比逐条验签与进程池验签')
+    verify_parser.add_argument('--notifications', type=int, default=20000)
+    verify_parser.add_argument('--processes', type=int, default=os.cpu_count())
+
+    replay_parser = subparsers.add_parser('replay', help='向运行中的应用重放通知')
+    replay_parser.add_argument('--url', default='http://127.0.0.1:8000')
+    replay_parser.add_argument('--channel', choices=['alipay', 'wechatpay'], default='alipay')
+    replay_parser.add_argument('--notifications', type=int, default=50000)
+    replay_parser.add_argument('--repeat', type=int, default=3, help='每个订单号的通知次数')
+    replay_parser.add_argument('--rate', type=int, default=5000, help='每秒发送的通知数')
+    replay_parser.add_argument('--concurrency', type=int, default=200)
+    replay_parser.add_argument('--appid', default=None)
+    replay_parser.add_argument('--alipay-private-key', help='签名使用的 PEM 私钥文件')
+    replay_parser.add_argument('--wechat-key', default='stub', help='签名使用的微信 API 密钥')
+    args = parser.parse_args()
+
+    if args.mode == 'verify':
+        bench_verify(args.notifications, args.processes)
+    else:
+        if args.channel == 'alipay' and not args.alipay_private_key:
+            parser.error('--channel alipay 需要 --alipay-private-key')
+        asyncio.run(bench_replay(args))
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: bench_trade_no.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/19 03:00
+
+"""
+交易号生成器检查与插入压测
+
+collide: 多个进程(spawn 与 fork 各一组)、每个进程多个线程同时生成交易号，检查全局唯一、线程内递增和长度不超过 32 位，
+    不依赖 Redis 和数据库
+    python scripts/bench_trade_no.py collide --processes 8 --threads 4 --count 50000
+insert: 在临时表(与充值订单表相同的 String(32) 唯一索引)中分别按 uuid4 和新交易号插入，
+    统计插入速度和索引大小，结束后删除临时表，请勿在生产库运行
+    python scripts/bench_trade_no.py insert --rows 1000000 --batch 1000
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app.core.trade_no import new_trade_no
+
+BENCH_TABLE = 'bench_trade_no'
+
+
+def generate(threads: int, count: int) -> list:
+    """在当前进程中用多个线程生成交易号，返回各线程按生成顺序的结果"""
+    results = [[] for _ in range(threads)]
+
+    def run(result: list):
+        for _ in range(count):
+            result.append(new_trade_no())
+
+    workers = [threading.Thread(target=run, args=(result,)) for result in results]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def check(name: str, batches: list) -> bool:
+    ids = [trade_no for batch in batches for trade_no in batch]
+    ok = True
+    duplicated = len(ids) - len(set(ids))
+    if duplicated:
+        print(f'[{name}] 重复 {duplicated} 个')
+        ok = False
+    if max(len(trade_no) for trade_no in ids) > 32:
+        print(f'[{name}] 长度超过 32 位')
+        ok = False
+    for batch in batches:
+        if any(a >= b for a, b in zip(batch, batch[1:])):
+            print(f'[{name}] 同一线程内未严格递增')
+            ok = False
+            break
+    workers = {trade_no[17:25] for trade_no in ids}
+    print(f'[{name}] {len(ids)} 个交易号, 进程号 {len(workers)} 个, 示例 {ids[0]}')
+    return ok
+
+
+def bench_collide(processes: int, threads: int, count: int) -> bool:
+    ok = True
+    for method in ('spawn', 'fork'):
+        if method not in multiprocessing.get_all_start_methods():
+            continue
+        if method == 'fork':
+            # 父进程先生成, 检查 fork 后子进程不会沿用父进程的进程号和序号
+            new_trade_no()
+        context = multiprocessing.get_context(method)
+        started = time.perf_counter()
+        with context.Pool(processes) as pool:
+            results = pool.starmap(generate, [(threads, count)] * processes)
+        seconds = time.perf_counter() - started
+        batches = [batch for result in results for batch in result]
+        ok = check(method, batches) and ok
+        print(f'[{method}] {processes} 进程 x {threads} 线程, 耗时 {seconds:.2f} 秒')
+    return ok
+
+
+def bench_insert(rows: int, batch: int) -> None:
+    from sqlalchemy import Column, Integer, MetaData, String, Table, insert, text
+
+    from app.core.mysql import write_engine
+
+    metadata = MetaData()
+    table = Table(BENCH_TABLE, metadata,
+                  Column('id', Integer, primary_key=True, autoincrement=True),
+                  Column('trade_no', String(32), nullable=False, unique=True, index=True),
+                  mysql_engine='InnoDB')
+    generators = {
+        'uuid4': lambda: str(uuid.uuid4()).replace('-', ''),
+        'trade_no': new_trade_no,
+    }
+    try:
+        for name, make in generators.items():
+            metadata.drop_all(write_engine)
+            metadata.create_all(write_engine)
+            started = time.perf_counter()
+            with write_engine.connect() as conn:
+                for i in range(0, rows, batch):
+                    conn.execute(insert(table), [{'trade_no': make()} for _ in range(min(batch, rows - i))])
+                    conn.commit()
+                seconds = time.perf_counter() - started
+                conn.execute(text(f'ANALYZE TABLE {BENCH_TABLE}'))
+                index_length = conn.execute(text(
+                    'SELECT INDEX_LENGTH FROM information_schema.TABLES '
+                    'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name'), {'name': BENCH_TABLE}).scalar()
+            print(f'{name:<10} {rows / seconds:>10.0f} 行/秒  二级索引 {index_length / 1024 / 1024:>8.1f} MB')
+    finally:
+        metadata.drop_all(write_engine)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='交易号生成器检查与插入压测')
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    collide_parser = subparsers.add_parser('collide', help='多进程多线程生成交易号并检查唯一性')
+    collide_parser.add_argument('--processes', type=int, default=8)
+    collide_parser.add_argument('--threads', type=int, default=4)
+    collide_parser.add_argument('--count', type=int, default=50000, help='每个线程生成的交易号数')
+
+    insert_parser = subparsers.add_parser('insert', help='对比 uuid4 与新交易号的插入速度和索引大小')
+    insert_parser.add_argument('--rows', type=int, default=1000000)
+    insert_parser.add_argument('--batch', type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.mode == 'collide':
+        sys.exit(0 if bench_collide(args.processes, args.threads, args.count) else 1)
+    bench_insert(args.rows, args.batch)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: finance_partitions.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 19:40
+
+"""
+动账队列分区工具
+
+查看各分区队列积压：python scripts/finance_partitions.py
+预估调整分区数后需要迁移的用户比例：python scripts/finance_partitions.py --preview 8 --users 100000
+"""
+
+import argparse
+import os
+import sys
+
+import redis
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app.core.single_celery import FINANCE_PARTITIONS, FINANCE_QUEUE_PREFIX, HashRing, finance_ring, redis_url
+
+
+def show_backlog() -> None:
+    client = redis.Redis.from_url(redis_url, decode_responses=True)
+    queues = sorted(set(client.scan_iter(f'{FINANCE_QUEUE_PREFIX}*')) |
+                    {f'{FINANCE_QUEUE_PREFIX}{i}' for i in range(FINANCE_PARTITIONS)} | {'single_worker_queue'})
+    print(f'当前分区数: {FINANCE_PARTITIONS}')
+    for queue in queues:
+        if client.type(queue) in ('list', 'none'):
+            print(f'{queue:<32} {client.llen(queue):>8}')
+
+
+def preview(partitions: int, users: int) -> None:
+    ring = HashRing([f'{FINANCE_QUEUE_PREFIX}{i}' for i in range(partitions)])
+    counts = {}
+    moved = 0
+    for user_id in range(1, users + 1):
+        queue = ring.get(user_id)
+        counts[queue] = counts.get(queue, 0) + 1
+        if queue != finance_ring.get(user_id):
+            moved += 1
+    print(f'分区数 {FINANCE_PARTITIONS} -> {partitions}, 迁移用户 {moved}/{users} ({moved / users:.1%})')
+    for queue in sorted(counts):
+        print(f'{queue:<32} {counts[queue]:>8}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='动账队列分区工具')
+    parser.add_argument('--preview', type=int, help='预估调整后的分区数')
+    parser.add_argument('--users', type=int, default=100000, help='用于预估的用户ID数量')
+    args = parser.parse_args()
+
+    if args.preview:
+        preview(args.preview, args.users)
+    else:
+        show_backlog()
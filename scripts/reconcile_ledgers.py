@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: reconcile_ledgers.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 22:10
+
+"""
+流水对账
+
+逐行核对流水的 balance 是否等于该用户此前动账的累计值，并与钱包表比对，报告写入 runtime/reconcile/
+用法：python scripts/reconcile_ledgers.py balance point
+     python scripts/reconcile_ledgers.py balance --trust-first-row
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app.services.reconcile import LEDGERS, REPORT_SAMPLE_SIZE, reconcile
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='流水对账')
+    parser.add_argument('ledgers', nargs='*', choices=list(LEDGERS), help='流水类型, 默认全部')
+    parser.add_argument('--trust-first-row', action='store_true', default=None,
+                        help='以每个用户在库中的第一条流水为起点, 默认在流水已归档时开启')
+    args = parser.parse_args()
+
+    exit_code = 0
+    for name in args.ledgers or LEDGERS:
+        report = reconcile(name, args.trust_first_row)
+        summary = {k: v for k, v in report.items() if not k.endswith('_sample')}
+        print(json.dumps(summary, ensure_ascii=False))
+        if report['divergent_users'] or report['wallet_mismatches']:
+            exit_code = 1
+            print(f'不一致用户(最多 {REPORT_SAMPLE_SIZE} 个)：')
+            print(json.dumps(report['divergent_sample'], ensure_ascii=False, indent=2))
+    sys.exit(exit_code)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: schedule_order_close.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/19 01:20
+
+"""
+为未支付的充值订单补充调度关单任务
+
+上线延迟队列关单前创建的订单，或下单时调度失败的订单，没有关单任务，需运行一次本脚本。
+已调度的订单只会推迟不会提前。补充调度的订单没有记录支付渠道，到期后直接关单，关单后仍接受支付成功的通知。
+用法：python scripts/schedule_order_close.py
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from sqlalchemy import select
+
+from app.core.mysql import get_session
+from app.schemas.finance import PaymentStatusType
+from app.services.order_close import ORDER_MODELS, RECHARGE_ORDER_EXPIRE_SECONDS, CLOSE_GRACE_SECONDS, close_queue
+
+
+def schedule(kind: str, batch_size: int) -> int:
+    model = ORDER_MODELS[kind]
+    last_id = 0
+    total = 0
+    while True:
+        with get_session(read_only=True) as db:
+            rows = db.execute(select(model.id, model.trade_no, model.created_at).where(
+                model.id > last_id, model.payment_status == PaymentStatusType.CREATED.value)
+                              .order_by(model.id).limit(batch_size)).all()
+        if not rows:
+            return total
+        now = datetime.now()
+        close_queue.schedule_many({
+            f'{kind}:{row.trade_no}': max(0, RECHARGE_ORDER_EXPIRE_SECONDS + CLOSE_GRACE_SECONDS - (
+                    now - row.created_at).total_seconds()) for row in rows}, only_later=True)
+        total += len(rows)
+        last_id = rows[-1].id
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='为未支付的充值订单补充调度关单任务')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    for kind in ORDER_MODELS:
+        print(f'{kind}: 已调度 {schedule(kind, args.batch_size)} 个订单')
+    print(f'关单队列长度: {close_queue.size()}')
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# File: stub_gateway.py
+# Author: Super Junior
+# Email: easelify@gmail.com
+# Time: 2026/10/18 23:40
+
+"""
+本地支付网关桩服务，用于测试和压测 app.core.gateway
+
+模拟微信统一下单(POST /pay/unifiedorder)和支付宝服务端接口(GET /gateway.do)，可设置响应延迟和 5xx 比例。
+支付宝响应使用启动时生成的 RSA 密钥签名，公钥写入 runtime/stub_gateway/alipay_public.pem，
+客户端以此作为支付宝公钥即可通过验签。
+
+启动：python scripts/stub_gateway.py --port 9100 --latency-ms 100 --error-rate 0.01
+应用指向桩服务：WECHATPAY_GATEWAY_URL=http://127.0.0.1:9100 ALIPAY_GATEWAY_URL=http://127.0.0.1:9100
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import uuid
+
+import uvicorn
+import xmltodict
+from Cryptodome.Hash import SHA256
+from Cryptodome.PublicKey import RSA
+from Cryptodome.Signature import PKCS1_v1_5
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, Response
+from wechatpy.pay.utils import calculate_signature, dict_to_xml
+
+STUB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'runtime', 'stub_gateway')
+ALIPAY_PUBLIC_KEY_FILE = os.path.join(STUB_PATH, 'alipay_public.pem')
+
+app = FastAPI()
+options = argparse.Namespace(latency_ms=0, error_rate=0.0, wechat_key='stub')
+alipay_key = RSA.generate(2048)
+stats = {'requests': 0, 'errors': 0}
+
+
+async def simulate() -> Response | None:
+    """模拟网关延迟, 按比例返回 503"""
+    stats['requests'] += 1
+    if options.latency_ms:
+        await asyncio.sleep(options.latency_ms / 1000)
+    if random.random() < options.error_rate:
+        stats['errors'] += 1
+        return PlainTextResponse('Service Unavailable', status_code=503)
+    return None
+
+
+@app.post('/pay/unifiedorder')
+@app.post('/sandboxnew/pay/unifiedorder')
+async def wechat_unified_order(request: Request):
+    error = await simulate()
+    if error:
+        return error
+    data = xmltodict.parse(await request.body())['xml']
+    result = {
+        'return_code': 'SUCCESS',
+        'return_msg': 'OK',
+        'result_code': 'SUCCESS',
+        'appid': data.get('appid'),
+        'mch_id': data.get('mch_id'),
+        'nonce_str': uuid.uuid4().hex,
+        'trade_type': data.get('trade_type'),
+        'prepay_id': f'wx{uuid.uuid4().hex}',
+    }
+    result = {key: value for key, value in result.items() if value is not None}
+    return Response(dict_to_xml(result, calculate_signature(result, options.wechat_key)), media_type='text/xml')
+
+
+@app.get('/gateway.do')
+async def alipay_gateway(request: Request):
+    error = await simulate()
+    if error:
+        return error
+    params = dict(request.query_params)
+    method = params.get('method', '')
+    biz_content = json.loads(params.get('biz_content') or '{}')
+    content = {'code': '10000', 'msg': 'Success', 'out_trade_no': biz_content.get('out_trade_no'),
+               'trade_no': uuid.uuid4().hex, 'fund_change': 'Y', 'refund_fee': biz_content.get('refund_amount')}
+    content = json.dumps(content, ensure_ascii=False, separators=(',', ':'))
+    sign = base64.b64encode(PKCS1_v1_5.new(alipay_key).sign(SHA256.new(content.encode()))).decode()
+    body = f'{{"{method.replace(".", "_")}_response":{content},"sign":"{sign}"}}'
+    return Response(body, media_type='application/json')
+
+
+@app.get('/stats')
+async def get_stats():
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地支付网关桩服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--latency-ms', type=int, default=100, help='每个请求的模拟延迟(毫秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的比例')
+    parser.add_argument('--wechat-key', default='stub', help='微信响应签名使用的 API 密钥')
+    parsed = parser.parse_args()
+    vars(options).update(latency_ms=parsed.latency_ms, error_rate=parsed.error_rate, wechat_key=parsed.wechat_key)
+
+    os.makedirs(STUB_PATH, exist_ok=True)
+    with open(ALIPAY_PUBLIC_KEY_FILE, 'wb') as f:
+        f.write(alipay_key.publickey().export_key())
+    print(f'支付宝公钥: {ALIPAY_PUBLIC_KEY_FILE}')
+    uvicorn.run(app, host=parsed.host, port=parsed.port, log_level='warning')
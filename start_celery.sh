@@ -1,6 +1,18 @@
 #!/bin/bash
 
 source .venv/bin/activate
-celery -A app.celery_single_worker worker --loglevel=info &
+# 动账队列按用户分区, 每个分区一个单并发 worker, 分区 0 同时消费旧的 single_worker_queue
+FINANCE_PARTITIONS=${FINANCE_PARTITIONS:-$(grep -E '^FINANCE_PARTITIONS=' .env 2>/dev/null | cut -d= -f2)}
+FINANCE_BATCH=${FINANCE_BATCH:-$(grep -E '^FINANCE_BATCH=' .env 2>/dev/null | cut -d= -f2)}
+for ((i = 0; i < ${FINANCE_PARTITIONS:-1}; i++)); do
+  queues="single_worker_queue_$i"
+  [ "$i" -eq 0 ] && queues="$queues,single_worker_queue"
+  celery -A app.celery_single_worker worker -Q "$queues" -n "finance$i@%h" --loglevel=info &
+  # 批量动账模式下每个分区再启动一个攒批 worker, Celery worker 继续消费切换前积压的任务
+  [ "${FINANCE_BATCH:-0}" = "1" ] && python -m app.finance_batch_worker --partition "$i" &
+done
+# 支付异步通知流水线模式下启动通知 worker, 验签在其进程池中进行
+NOTIFY_PIPELINE=${NOTIFY_PIPELINE:-$(grep -E '^NOTIFY_PIPELINE=' .env 2>/dev/null | cut -d= -f2)}
+[ "${NOTIFY_PIPELINE:-0}" = "1" ] && python -m app.notify_worker &
 celery -A app.celery_worker worker --loglevel=info &
 celery -A app.celery_worker beat -s --loglevel=info &